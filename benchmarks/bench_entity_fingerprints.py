@@ -0,0 +1,69 @@
+"""
+Benchmark :func:`zmon_cli.client.compare_entities` against the previous JSON round-trip comparison.
+
+Usage: python benchmarks/bench_entity_fingerprints.py [COUNT]
+"""
+import json
+import sys
+import timeit
+
+from datetime import datetime
+
+from zmon_cli import client
+
+
+def round_trip_compare(e1, e2):
+    # comparison used before entity fingerprints
+    e1_copy = e1.copy()
+    e1_copy.pop('last_modified', None)
+
+    e2_copy = e2.copy()
+    e2_copy.pop('last_modified', None)
+
+    return (json.loads(json.dumps(e1_copy, cls=client.JSONDateEncoder)) ==
+            json.loads(json.dumps(e2_copy, cls=client.JSONDateEncoder)))
+
+
+def entity(i):
+    return {
+        'id': 'host-{}'.format(i),
+        'type': 'host',
+        'team': 'team-{}'.format(i % 10),
+        'ip': '10.0.{}.{}'.format(i % 256, i % 7),
+        'port': i,
+        'tags': ['a', 'b', str(i)],
+        'nested': {'k': i, 'v': [1, 2, {'x': 'y'}]},
+        'created': datetime(2020, 1, 1),
+        'last_modified': '2020-01-01 00:00:00.000',
+    }
+
+
+def best(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(count):
+    local = [entity(i) for i in range(count)]
+    # same entities, keys in reverse order
+    remote = [dict(reversed(list(entity(i).items()))) for i in range(count)]
+    pairs = list(zip(local, remote))
+
+    assert all(client.compare_entities(e1, e2) for e1, e2 in pairs)
+
+    def three_passes_memoized():
+        fingerprints = client.EntityFingerprints()
+        for _ in range(3):
+            for e1, e2 in pairs:
+                client.compare_entities(e1, e2, fingerprint=fingerprints)
+
+    old = best(lambda: [round_trip_compare(e1, e2) for e1, e2 in pairs])
+    new = best(lambda: [client.compare_entities(e1, e2) for e1, e2 in pairs])
+    print('{:<28} old {:.3f}s  new {:.3f}s'.format('one pass', old, new))
+
+    old = best(lambda: [round_trip_compare(e1, e2) for _ in range(3) for e1, e2 in pairs])
+    new = best(three_passes_memoized)
+    print('{:<28} old {:.3f}s  new {:.3f}s'.format('three passes, memoized', old, new))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,45 @@
+"""
+Benchmark :func:`zmon_cli.client.get_valid_entity_ids` against calling :func:`zmon_cli.client.get_valid_entity_id`
+for every ID.
+
+Usage: python benchmarks/bench_entity_ids.py [COUNT]
+"""
+import random
+import string
+import sys
+import timeit
+
+from zmon_cli import client
+
+
+def dirty_ids(count):
+    rnd = random.Random(1)
+    chars = string.ascii_letters + string.digits + '-_.:[]() /@#'
+    return ['{}-{}'.format(''.join(rnd.choice(chars) for _ in range(20)), i) for i in range(count)]
+
+
+def valid_ids(count):
+    return ['host-{}.example.org:{}'.format(i, i % 100) for i in range(count)]
+
+
+def best(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(count):
+    cases = (
+        ('{}k dirty IDs'.format(count // 1000), dirty_ids(count)),
+        ('{}k already valid IDs'.format(count // 1000), valid_ids(count)),
+    )
+
+    for name, ids in cases:
+        assert client.get_valid_entity_ids(ids).ids == [client.get_valid_entity_id(e) for e in ids]
+
+        old = best(lambda: [client.get_valid_entity_id(e) for e in ids])
+        new = best(lambda: client.get_valid_entity_ids(ids))
+
+        print('{:<24} old {:.3f}s  batch {:.3f}s'.format(name, old, new))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
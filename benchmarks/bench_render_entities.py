@@ -0,0 +1,101 @@
+"""
+Benchmark :func:`zmon_cli.output.render_entities` against the previous implementation, printing to ``os.devnull``.
+
+Most of the full rendering time is spent in ``clickclick.print_table``, which neither implementation controls, so the
+time without it is reported as well.
+
+Usage: python benchmarks/bench_render_entities.py [COUNT]
+"""
+import calendar
+import contextlib
+import os
+import sys
+import time
+
+from clickclick import OutputFormat, print_table
+
+import zmon_cli.output as zmon_output
+from zmon_cli.output import render_entities, LAST_MODIFIED_FMT
+
+
+def old_render_entities(entities, output, table=print_table):
+    # rendering used before the fast path, modifies the entities
+    rows = []
+    for e in entities:
+        row = e
+        s = sorted(e.keys())
+
+        key_values = []
+
+        for k in s:
+            if k not in ('id', 'type'):
+                if k == 'last_modified':
+                    row['last_modified_time'] = calendar.timegm(
+                        time.strptime(row.pop('last_modified'), LAST_MODIFIED_FMT))
+                else:
+                    key_values.append('{}={}'.format(k, e[k]))
+
+        row['data'] = ' '.join(key_values)
+        rows.append(row)
+
+    rows.sort(key=lambda r: (r['last_modified_time'], r['id'], r['type']))
+
+    with OutputFormat(output):
+        table('id type last_modified_time data'.split(),
+              rows, titles={'last_modified_time': 'Modified'})
+
+
+def entities(count):
+    return [{
+        'id': 'host-{}'.format(i),
+        'type': 'host',
+        'team': 'team-{}'.format(i % 10),
+        'ip': '10.0.{}.{}'.format(i % 256, i % 7),
+        'last_modified': '2020-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.{:03d}'.format(
+            i % 12 + 1, i % 28 + 1, i % 24, i % 60, (i * 7) % 60, i % 1000),
+    } for i in range(count)]
+
+
+def best(func, count, repeat=3):
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            # the old implementation modifies the entities, render fresh ones every time
+            data = entities(count)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                func(data)
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def skip_table(cols, rows, **kwargs):
+    pass
+
+
+@contextlib.contextmanager
+def without_print_table():
+    zmon_output.print_table = skip_table
+    try:
+        yield
+    finally:
+        zmon_output.print_table = print_table
+
+
+def main(count):
+    cases = (
+        ('before', lambda data, table: old_render_entities(data, 'text', table=table)),
+        ('after', lambda data, table: render_entities(data, 'text')),
+        ('after, --limit 50', lambda data, table: render_entities(data, 'text', limit=50)),
+    )
+
+    for name, func in cases:
+        total = best(lambda data: func(data, print_table), count)
+        with without_print_table():
+            rows = best(lambda data: func(data, skip_table), count)
+
+        print('{:<20} {:.2f}s  without print_table {:.3f}s'.format(name, total, rows))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -13,8 +13,8 @@ import setuptools
 from setuptools.command.test import test as TestCommand
 from setuptools import setup
 
-if sys.version_info < (3, 4, 0):
-    sys.stderr.write('FATAL: ZMON CLI needs to be run with Python 3.4+\n')
+if sys.version_info < (3, 5, 0):
+    sys.stderr.write('FATAL: ZMON CLI needs to be run with Python 3.5+\n')
     sys.exit(1)
 __location__ = os.path.join(os.getcwd(), os.path.dirname(inspect.getfile(inspect.currentframe())))
 
@@ -44,7 +44,6 @@ CLASSIFIERS = [
     'Environment :: Console',
     'Development Status :: 4 - Beta',
     'Programming Language :: Python',
-    'Programming Language :: Python :: 3.4',
     'Programming Language :: Python :: 3.5',
     'Programming Language :: Python :: Implementation :: CPython',
     'Operating System :: POSIX :: Linux',
@@ -56,6 +55,13 @@ CLASSIFIERS = [
 
 CONSOLE_SCRIPTS = ['zmon = zmon_cli.main:main']
 
+EXTRAS_REQUIRE = {
+    # vectorized evaluation of alert conditions in ``zmon alert-definitions what-if``
+    'fast': ['numpy'],
+    # zmon_cli.async_client.AsyncZmon
+    'async': ['aiohttp'],
+}
+
 
 class PyTest(TestCommand):
 
@@ -136,6 +142,7 @@ def setup_package():
         test_suite='tests',
         packages=setuptools.find_packages(exclude=['tests', 'tests.*']),
         install_requires=get_install_requirements('requirements.txt'),
+        extras_require=EXTRAS_REQUIRE,
         setup_requires=['flake8'],
         cmdclass=cmdclass,
         tests_require=['pytest-cov', 'pytest'],
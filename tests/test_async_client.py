@@ -0,0 +1,190 @@
+import asyncio
+import json
+
+import pytest
+import requests
+
+from zmon_cli.client import Zmon, ZmonArgumentError
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from aiohttp import web  # noqa
+from aiohttp.test_utils import TestServer  # noqa
+
+from zmon_cli.async_client import AsyncZmon, gather_bulk  # noqa
+
+
+TOKEN = '123'
+
+CHECKS = [{'id': 10, 'name': 'check-10', 'owning_team': 'zmon', 'interval': 60}]
+ALERTS = [{'id': 1, 'name': 'alert-1', 'team': 'zmon', 'check_definition_id': 10}]
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def make_app(state):
+    async def active_checks(request):
+        return web.json_response({'check_definitions': CHECKS})
+
+    async def active_alerts(request):
+        return web.json_response({'alert_definitions': ALERTS})
+
+    async def entities(request):
+        state['query'] = request.query.get('query')
+        state['auth'] = request.headers.get('Authorization')
+        return web.json_response([{'id': 'e-1', 'type': 'instance'}])
+
+    async def put_entity(request):
+        state['entity'] = await request.json()
+        return web.Response(text='')
+
+    async def delete_entity(request):
+        return web.Response(text='1')
+
+    async def alert_data(request):
+        state['active'] += 1
+        state['max_active'] = max(state['max_active'], state['active'])
+        await asyncio.sleep(0.02)
+        state['active'] -= 1
+        return web.json_response([{'entity': 'e-1', 'results': [{'value': int(request.match_info['id'])}]}])
+
+    async def check_definition(request):
+        return web.Response(text='')
+
+    async def status(request):
+        return web.Response(status=503, text='unavailable')
+
+    async def search(request):
+        return web.json_response(dict(request.query))
+
+    app = web.Application()
+    app.router.add_get('/api/v1/checks/all-active-check-definitions/', active_checks)
+    app.router.add_get('/api/v1/checks/all-active-alert-definitions/', active_alerts)
+    app.router.add_get('/api/v1/entities/', entities)
+    app.router.add_put('/api/v1/entities', put_entity)
+    app.router.add_delete('/api/v1/entities/{id}/', delete_entity)
+    app.router.add_get('/api/v1/status/alert/{id}/all-entities/', alert_data)
+    app.router.add_get('/api/v1/check-definitions/{id}/', check_definition)
+    app.router.add_get('/api/v1/status/', status)
+    app.router.add_get('/api/v1/quick-search/', search)
+    return app
+
+
+def with_server(test):
+    state = {'active': 0, 'max_active': 0}
+
+    async def main():
+        server = TestServer(make_app(state))
+        await server.start_server()
+        try:
+            await test(str(server.make_url('/')), state)
+        finally:
+            await server.close()
+
+    run(main())
+
+
+def test_async_zmon_requests():
+    async def test(url, state):
+        async with AsyncZmon(url, token=TOKEN) as zmon:
+            assert zmon.endpoint('entities') == url + 'api/v1/entities/'
+            assert zmon.alert_details_url({'id': 1}) == Zmon(url).alert_details_url({'id': 1})
+
+            assert await zmon.get_entities({'type': 'instance'}) == [{'id': 'e-1', 'type': 'instance'}]
+            assert json.loads(state['query']) == {'type': 'instance'}
+            assert state['auth'] == 'Bearer 123'
+
+            resp = await zmon.add_entity({'id': 'e-2', 'type': 'instance'})
+            assert resp.status_code == 200
+            assert state['entity'] == {'id': 'e-2', 'type': 'instance'}
+
+            assert await zmon.delete_entity('e-2') is True
+
+            alerts = await zmon.get_alert_definitions_with_checks()
+            assert alerts[0]['check_name'] == 'check-10'
+
+            assert await zmon.get_check_definitions("owning_team == 'stups'") == []
+
+            assert await zmon.search('q', limit=5, teams=['a', 'b']) == {'query': 'q', 'limit': '5', 'teams': 'a,b'}
+
+    with_server(test)
+
+
+def test_async_zmon_errors():
+    async def test(url, state):
+        async with AsyncZmon(url, token=TOKEN) as zmon:
+            with pytest.raises(requests.HTTPError) as e:
+                await zmon.status()
+            assert e.value.response.status_code == 503
+
+            with pytest.raises(requests.HTTPError) as e:
+                await zmon.get_check_definition(1)
+            assert e.value.response.status_code == 404
+
+            with pytest.raises(ZmonArgumentError):
+                await zmon.add_entity({'id': 'e-1'})
+
+            with pytest.raises(ZmonArgumentError):
+                await zmon.create_alert_definition({'check_definition_id': 10})
+
+            with pytest.raises(ZmonArgumentError):
+                await zmon.search('q', teams='zmon')
+
+    with_server(test)
+
+
+def test_async_zmon_connection_limit():
+    async def test(url, state):
+        async with AsyncZmon(url, token=TOKEN, max_connections=3) as zmon:
+            data = await asyncio.gather(*(zmon.get_alert_data(i) for i in range(20)))
+
+        assert [d[0]['results'][0]['value'] for d in data] == list(range(20))
+        assert state['max_active'] == 3
+
+    with_server(test)
+
+
+def test_async_zmon_sync_entities():
+    async def test(url, state):
+        async with AsyncZmon(url, token=TOKEN) as zmon:
+            report = await zmon.sync_entities([{'id': 'e-2'}], 'instance', delete=True, dry_run=True)
+            assert (report.created, report.deleted) == (['e-2'], ['e-1'])
+            assert 'entity' not in state
+
+            report = await zmon.sync_entities([{'id': 'e-2'}, {'id': 'e-1'}], 'instance', delete=True,
+                                              concurrency=2)
+            assert (report.created, report.unchanged, report.deleted) == (['e-2'], ['e-1'], [])
+            assert state['entity'] == {'id': 'e-2', 'type': 'instance'}
+
+            with pytest.raises(ZmonArgumentError):
+                await zmon.sync_entities([{'id': 'e-1', 'type': 'host'}], 'instance')
+
+    with_server(test)
+
+
+def test_async_zmon_configure_pool():
+    async def test(url, state):
+        async with AsyncZmon(url, token=TOKEN, max_connections=2) as zmon:
+            session = zmon.session
+
+            await zmon.ensure_pool_size(1)
+            assert zmon.session is session
+
+            await zmon.ensure_pool_size(4)
+            assert zmon.max_connections == 4
+            assert zmon.session is not session
+            assert zmon.session.connector.limit == 4
+
+            results = await gather_bulk(zmon.get_alert_data, [1, 2, 'x'], concurrency=2)
+
+        assert [r.result[0]['results'][0]['value'] for r in results[:2]] == [1, 2]
+        assert results[2].error is not None
+        assert state['max_active'] <= 2
+
+    with_server(test)
@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+
+import pytest
+import requests
+
+from zmon_cli import bulk
+from zmon_cli.bulk import AIMDLimit, BulkSummary, TokenBucket, client_wait, is_overload_error, note_overload, run_bulk
+
+
+def test_run_bulk_results():
+    def square(x):
+        if x == 3:
+            raise ValueError('three')
+        return x * x
+
+    results = {r.item: r for r in run_bulk(square, range(6), concurrency=4)}
+
+    assert sorted(results) == list(range(6))
+    assert results[4].result == 16
+    assert results[4].error is None
+    assert isinstance(results[3].error, ValueError)
+
+
+def test_run_bulk_bounded_window():
+    consumed = []
+    in_flight = []
+    lock = threading.Lock()
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    def work(x):
+        with lock:
+            in_flight.append(len(consumed) - x)
+        return x
+
+    assert len(list(run_bulk(work, items(), concurrency=2))) == 100
+
+    # generator is never read further ahead than the in-flight window
+    assert max(in_flight) <= 4
+
+
+def test_bulk_summary():
+    summary = BulkSummary()
+    summary.add('a')
+    summary.add('b', RuntimeError('failed'))
+
+    assert summary.total == 2
+    assert summary.succeeded == 1
+    assert summary.failures[0][0] == 'b'
+    assert summary.throughput > 0
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def http_error(status):
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(response=resp)
+
+
+@pytest.mark.parametrize('e,expected', [
+    (http_error(429), True),
+    (http_error(503), True),
+    (http_error(400), False),
+    (requests.ConnectionError(), True),
+    (requests.Timeout(), True),
+    (ValueError(), False),
+])
+def test_is_overload_error(e, expected):
+    assert is_overload_error(e) is expected
+
+
+def test_token_bucket(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(bulk, 'time', fake)
+
+    bucket = TokenBucket(10, burst=2)
+
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, pytest.approx(0.1), pytest.approx(0.1)]
+
+    fake.now += 1
+    assert bucket.acquire() == 0
+
+    bucket.pause(5)
+    assert bucket.acquire() == pytest.approx(5)
+
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_aimd_limit():
+    limit = AIMDLimit(4)
+    assert limit.current == 1
+
+    limit.record(0.1)
+    limit.record(0.1)
+    limit.record(0.1)
+    assert limit.current == 3
+
+    for _ in range(10):
+        limit.record(0.1)
+    assert limit.current == 4
+
+    # errors not caused by overload leave the limit unchanged
+    limit.record(0.1, error=http_error(400))
+    assert limit.current == 4
+
+    limit.record(0.1, error=http_error(429))
+    assert limit.current == 2
+
+    # outcomes of calls in flight during the decrease are ignored
+    limit.record(0.1, error=http_error(503))
+    assert limit.current == 2
+
+    limit.record(0.1, error=http_error(503))
+    assert limit.current == 1
+
+    for _ in range(8):
+        limit.record(1.0)
+    assert limit.current == 1
+
+
+def test_aimd_limit_latency():
+    limit = AIMDLimit(16, initial=8)
+
+    for _ in range(8):
+        limit.record(0.1)
+    assert limit.current == 9
+
+    while limit.latency <= 0.2:
+        limit.record(1.0)
+    assert limit.current == 4
+
+
+def test_aimd_limit_noisy_latency():
+    rnd = random.Random(1)
+
+    # a single fast call does not become the baseline for the rest of the run
+    limit = AIMDLimit(32)
+    limit.record(0.001)
+    for _ in range(5000):
+        limit.record(rnd.uniform(0.02, 0.03))
+    assert limit.current == 32
+
+    limit = AIMDLimit(32)
+    for _ in range(1000):
+        limit.record(rnd.uniform(0.01, 0.045))
+    assert limit.current == 32
+
+    # a sudden latency increase is still an overload
+    for _ in range(5):
+        limit.record(0.3)
+    assert limit.current == 16
+
+
+def test_run_bulk_adaptive():
+    active = []
+    lock = threading.Lock()
+    in_flight = [0]
+
+    def work(x):
+        with lock:
+            in_flight[0] += 1
+            active.append(in_flight[0])
+        time.sleep(0.002)
+        with lock:
+            in_flight[0] -= 1
+        if x in (30, 31):
+            raise http_error(429)
+        return x
+
+    results = list(run_bulk(work, range(60), concurrency=4, adaptive=True))
+
+    assert sorted(r.item for r in results) == list(range(60))
+    assert sorted(r.item for r in results if r.error is not None) == [30, 31]
+    # starts with a single call in flight
+    assert active[0] == 1
+    assert max(active) <= 4
+
+
+def test_run_bulk_adaptive_slow_consumer():
+    limit = AIMDLimit(8)
+
+    def work(x):
+        time.sleep(0.005)
+        return x
+
+    for res in run_bulk(work, range(60), concurrency=8, adaptive=limit):
+        # consumer time is not part of the call latency
+        time.sleep(0.01)
+
+    assert limit.current == 8
+
+
+def test_run_bulk_adaptive_client_waits():
+    limit = AIMDLimit(4)
+
+    def work(x):
+        # rate limit or retry backoff of the client
+        client_wait(0.02 if x % 2 else 0)
+        time.sleep(0.002)
+        return x
+
+    assert len(list(run_bulk(work, range(20), concurrency=4, adaptive=limit))) == 20
+    assert limit.current == 4
+
+    def overloaded(x):
+        note_overload()
+        return x
+
+    assert len(list(run_bulk(overloaded, range(8), concurrency=4, adaptive=limit))) == 8
+    assert limit.current == 1
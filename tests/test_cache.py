@@ -0,0 +1,108 @@
+import os
+import time
+
+from zmon_cli.cache import CheckValidationCache, EntityCache, ResponseCache, get_cache_dir
+
+
+URL = 'https://some-zmon/api/v1/'
+
+
+def test_get_cache_dir(monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', '/tmp/xdg')
+    assert get_cache_dir() == '/tmp/xdg/zmon-cli'
+
+    monkeypatch.delenv('XDG_CACHE_HOME')
+    assert get_cache_dir() == os.path.expanduser('~/.cache/zmon-cli')
+
+
+def test_entity_cache(tmpdir):
+    cache = EntityCache(path=str(tmpdir.join('cache')), ttl=60)
+
+    assert cache.get(URL) is None
+
+    entities = [{'id': 'e-1', 'type': 'dummy'}]
+    cache.set(URL, entities)
+
+    assert cache.get(URL) == entities
+    assert cache.get('https://other-zmon/api/v1/') is None
+
+    # expired
+    assert EntityCache(path=cache.path, ttl=0).get(URL) is None
+
+    cache.invalidate(URL)
+    cache.invalidate(URL)
+
+    assert cache.get(URL) is None
+
+
+def test_entity_cache_ttl(tmpdir, monkeypatch):
+    cache = EntityCache(path=str(tmpdir), ttl=60)
+    cache.set(URL, [])
+
+    now = time.time()
+    monkeypatch.setattr('time.time', lambda: now + 120)
+
+    assert cache.get(URL) is None
+
+
+def test_entity_cache_corrupt(tmpdir):
+    cache = EntityCache(path=str(tmpdir), ttl=60)
+    cache.set(URL, [])
+
+    with open(cache._file(URL), 'w') as f:
+        f.write('{')
+
+    assert cache.get(URL) is None
+
+
+def test_check_validation_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr('zmon_cli.cache.CHECK_VALIDATION_CACHE_SIZE', 2)
+
+    cache = CheckValidationCache(path=str(tmpdir))
+
+    assert 'a' not in cache
+
+    cache.set('a', None)
+    cache.set('b', 'invalid syntax')
+    cache.set('c', None)
+    cache.save()
+
+    cache = CheckValidationCache(path=str(tmpdir))
+
+    # oldest result trimmed
+    assert 'a' not in cache
+    assert 'b' in cache and cache.get('b') == 'invalid syntax'
+    assert 'c' in cache and cache.get('c') is None
+
+
+def test_check_validation_cache_corrupt(tmpdir):
+    cache = CheckValidationCache(path=str(tmpdir))
+
+    tmpdir.join('check-validation.json').write('{')
+
+    assert 'a' not in cache
+
+
+def test_response_cache(tmpdir, monkeypatch):
+    cache = ResponseCache(path=str(tmpdir), ttl=60)
+
+    assert cache.get(URL) is None
+
+    cache.set(URL, {'a': 1}, etag='"v1"')
+
+    entry = cache.get(URL)
+    assert entry['data'] == {'a': 1}
+    assert entry['etag'] == '"v1"' and entry['last_modified'] is None
+    assert cache.is_fresh(entry)
+
+    now = time.time()
+    monkeypatch.setattr('time.time', lambda: now + 120)
+
+    # expired entries are still returned for revalidation
+    assert cache.get(URL) == entry
+    assert not cache.is_fresh(entry)
+
+    cache.invalidate(URL)
+    cache.invalidate(URL)
+
+    assert cache.get(URL) is None
@@ -1,10 +1,18 @@
+import os
+import copy
+import json
 import yaml
+import pytest
 from unittest.mock import MagicMock
 from click.testing import CliRunner
 
 
 from zmon_cli.main import cli
+import zmon_cli.bulk as bulk_module
+import zmon_cli.client as client
+
 from zmon_cli.client import Zmon
+from zmon_cli.snapshot import EntitySnapshot
 
 
 def get_client(config):
@@ -119,9 +127,78 @@ def test_list_alert_definitions(monkeypatch):
         assert 'Link' in out
 
 
+def test_list_alert_definitions_with_checks(monkeypatch):
+    alerts = [
+        {
+            'team': 'ZMON', 'responsible_team': 'ZMON', 'name': 'alert-1', 'id': 1, 'status': 'ACTIVE', 'priority': 1,
+            'last_modified': 1473418659294, 'last_modified_by': 'user-1', 'check_definition_id': 33,
+            'check_name': 'check-33', 'check_owning_team': 'STUPS', 'check_interval': 60,
+        },
+    ]
+
+    get = MagicMock(side_effect=lambda: copy.deepcopy(alerts))
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions_with_checks', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'l', '--with-checks'], catch_exceptions=False)
+
+        out = result.output.rstrip()
+
+        assert 'Check team' in out
+        assert 'check-33' in out
+        assert 'STUPS' in out
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'l', '--with-checks', '-o', 'json'],
+                               catch_exceptions=False)
+
+        assert json.loads(result.output)[0]['check_owning_team'] == 'STUPS'
+
+
+def test_what_if_alert_definition(monkeypatch):
+    get = MagicMock(return_value={'id': 1, 'condition': '>100'})
+    rows = [{'entity': 'e-{}'.format(i), 'results': [{'value': i * 10}]} for i in range(50)]
+    get_data = MagicMock(side_effect=lambda alert_id: iter(rows))
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definition', get)
+    monkeypatch.setattr('zmon_cli.client.Zmon.iter_alert_data', get_data)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'what-if', '1', '-c', '>450', '-o', 'json'],
+                               catch_exceptions=False)
+
+        report = json.loads(result.output)
+
+        assert report['firing'] == 39
+        assert report['new_firing'] == 4
+        assert len(report['resolved']) == 35
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'what-if', '1', '-c', '>450'],
+                               catch_exceptions=False)
+
+        assert '>100: 39 of 50 entities firing' in result.output
+        assert 'Stopped firing (35)' in result.output
+        assert '... and 15 more' in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'what-if', '1', '-c', '>>'])
+
+        assert result.exit_code != 0
+
+
 def test_filter_alert_definitions(monkeypatch):
-    get = MagicMock()
-    get.return_value = [
+    alerts = [
         {
             'team': 'ZMON', 'responsible_team': 'ZMON', 'name': 'alert-1', 'id': 1, 'status': 'ACTIVE', 'priority': 1,
             'last_modified': 1473418659294, 'last_modified_by': 'user-1', 'check_definition_id': 33
@@ -132,6 +209,9 @@ def test_filter_alert_definitions(monkeypatch):
         },
     ]
 
+    # rendering modifies the alert definitions
+    get = MagicMock(side_effect=lambda: copy.deepcopy(alerts))
+
     monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', get)
     monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
 
@@ -153,6 +233,21 @@ def test_filter_alert_definitions(monkeypatch):
 
         assert 'FANCY' not in out
         assert 'alert-2' not in out
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'f', 'check_definition_id', '34'],
+                               catch_exceptions=False)
+        assert 'alert-2' in result.output and 'alert-1' not in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'f', '-e', "priority <= 2 and team =~ '^FAN'"],
+                               catch_exceptions=False)
+        assert 'alert-2' in result.output and 'alert-1' not in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'f', '-e', 'priority <='])
+        assert result.exit_code != 0
+        assert 'Invalid filter expression' in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'f', 'team'])
+        assert result.exit_code != 0
         assert 'MEDIUM' not in out
 
         result = runner.invoke(
@@ -295,6 +390,352 @@ def test_filter_check_definitions(monkeypatch):
         assert 'check-2' not in out
 
 
+def test_validate_check_definitions(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        os.makedirs('checks/team')
+        for name, check in (('ok.yaml', {'command': 'http("x").code()'}),
+                            ('team/broken.yml', {'command': 'def ('}),
+                            ('team/empty.yaml', {'name': 'no command'})):
+            with open(os.path.join('checks', name), 'w') as fd:
+                yaml.dump(check, fd)
+
+        for _ in range(2):
+            result = runner.invoke(cli, ['-c', 'test.yaml', 'check-definitions', 'validate', 'checks'])
+
+            assert result.exit_code == 1
+            assert '3 check definitions' in result.output
+            assert '1 succeeded, 2 failed' in result.output
+            assert 'broken.yml: invalid syntax' in result.output
+            assert 'empty.yaml: Missing check command' in result.output
+
+        assert os.path.exists(str(tmpdir.join('zmon-cli', 'check-validation.json')))
+
+
+def test_apply_check_definitions(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    get = MagicMock()
+    get.return_value = [
+        {'id': 1, 'name': 'same', 'owning_team': 'zmon', 'command': 'x', 'interval': 60, 'status': 'ACTIVE'},
+        {'id': 2, 'name': 'changed', 'owning_team': 'zmon', 'command': 'x', 'interval': 60, 'status': 'ACTIVE'},
+    ]
+    update = MagicMock()
+    update.side_effect = lambda check, **kwargs: dict(check, id=check.get('id', 3))
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', get)
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_check_definition', update)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        os.makedirs('checks')
+        for name, check in (('same.yaml', {'name': 'same', 'owning_team': 'zmon', 'command': 'x', 'interval': 60}),
+                            ('changed.yaml', {'id': 2, 'name': 'changed', 'owning_team': 'zmon', 'command': 'x',
+                                              'interval': 30}),
+                            ('new.yaml', {'name': 'new', 'owning_team': 'zmon', 'command': 'x'}),
+                            ('broken.yaml', {'name': 'broken', 'owning_team': 'zmon', 'command': 'def ('})):
+            with open(os.path.join('checks', name), 'w') as fd:
+                yaml.dump(check, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check-definitions', 'apply', 'checks', '--dry-run'])
+
+        assert 'Unchanged: 1, created: 1, updated: 1, deleted: 0, failed: 1' in result.output
+        update.assert_not_called()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check-definitions', 'apply', 'checks', '-n', '2'])
+
+        assert result.exit_code == 1
+        assert 'Created checks/new.yaml' in result.output
+        assert 'Updated checks/changed.yaml' in result.output
+        assert 'Unchanged checks/same.yaml' in result.output
+        assert 'checks/broken.yaml: Invalid check command' in result.output
+
+        assert sorted(c[0][0]['name'] for c in update.call_args_list) == ['changed', 'new']
+        assert get.call_count == 2
+
+
+def test_apply_alert_definitions(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    get_alerts = MagicMock()
+    get_alerts.return_value = [
+        {'id': 1, 'name': 'same', 'team': 'zmon', 'check_definition_id': 10, 'priority': 1, 'status': 'ACTIVE',
+         'parameters': {'threshold': {'value': 3}}},
+        {'id': 2, 'name': 'changed', 'team': 'zmon', 'check_definition_id': 10, 'priority': 1, 'status': 'ACTIVE'},
+    ]
+    get_checks = MagicMock()
+    get_checks.return_value = [{'id': 10, 'name': 'check'}]
+    create = MagicMock()
+    create.side_effect = lambda alert: dict(alert, id=3)
+    update = MagicMock()
+    update.side_effect = lambda alert: alert
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', get_alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', get_checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.create_alert_definition', create)
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_alert_definition', update)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123, 'user': 'jdoe'}, fd)
+
+        os.makedirs('alerts')
+        for name, alert in (('same.yaml', {'name': 'same', 'team': 'zmon', 'check_definition_id': '10', 'priority': 1,
+                                           'parameters': {'threshold': '{"value": 3}'}}),
+                            ('bad.yaml', {'name': 'bad', 'team': 'zmon', 'check_definition_id': 10,
+                                          'parameters': {'threshold': '{'}}),
+                            ('changed.yaml', {'name': 'changed', 'team': 'zmon', 'check_definition_id': 10,
+                                              'priority': 2}),
+                            ('new.yaml', {'name': 'new', 'team': 'zmon', 'check_definition_id': 10}),
+                            ('orphan.yaml', {'name': 'orphan', 'team': 'zmon', 'check_definition_id': 99})):
+            with open(os.path.join('alerts', name), 'w') as fd:
+                yaml.dump(alert, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'apply', 'alerts', '--dry-run'])
+
+        assert 'Unchanged: 1, created: 1, updated: 1, deleted: 0, failed: 2' in result.output
+        create.assert_not_called()
+        update.assert_not_called()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'apply', 'alerts', '-n', '2'])
+
+        assert result.exit_code == 1
+        assert 'Created alerts/new.yaml' in result.output
+        assert 'Updated alerts/changed.yaml' in result.output
+        assert 'Unchanged alerts/same.yaml' in result.output
+        assert 'alerts/orphan.yaml: Unknown or inactive check definition: 99' in result.output
+        assert 'alerts/bad.yaml: Invalid parameters' in result.output
+
+        assert create.call_args[0][0]['name'] == 'new'
+        assert create.call_args[0][0]['last_modified_by'] == 'jdoe'
+
+        updated = update.call_args[0][0]
+        assert updated['id'] == 2
+        assert updated['priority'] == 2
+
+        assert get_alerts.call_count == 2
+        assert get_checks.call_count == 2
+
+
+def test_check_definitions_load(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    get_checks = MagicMock()
+    get_checks.return_value = [
+        {'id': 1, 'name': 'c-1', 'owning_team': 'zmon', 'interval': 10, 'entities': [{'type': 'instance'}]},
+        {'id': 2, 'name': 'c-2', 'owning_team': 'stups', 'interval': 60, 'entities': [{'type': 'GLOBAL'}]},
+    ]
+    get_entities = MagicMock()
+    get_entities.return_value = [{'id': 'i-{}'.format(i), 'type': 'instance'} for i in range(5)]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', get_checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get_entities)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check-definitions', 'load', '-o', 'json'],
+                               catch_exceptions=False)
+
+        load = json.loads(result.output)
+        assert [c['id'] for c in load['checks']] == [1, 2]
+        assert load['checks'][0]['entities'] == 5
+        assert load['total'] == pytest.approx(0.5 + 1 / 60)
+
+        with open('new.yaml', 'w') as fd:
+            yaml.dump({'name': 'new', 'owning_team': 'zmon', 'interval': 1, 'entities': [{'type': 'instance'}]}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check-definitions', 'load', 'new.yaml', '2'],
+                               catch_exceptions=False)
+
+        assert 'new' in result.output
+        assert 'c-1' not in result.output
+        assert 'Total: 5.017 check invocations/s' in result.output
+
+
+def test_export(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    checks = MagicMock(return_value=[{'id': 1, 'name': 'check-1', 'command': 'True'}])
+    alerts = MagicMock(return_value=[{'id': 2, 'name': 'alert-1', 'condition': '>0'}])
+    dashboards = MagicMock(side_effect=RuntimeError('unavailable'))
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_dashboards', dashboards)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup'])
+
+        assert result.exit_code == 1
+        assert 'Failed to retrieve dashboards' in result.output
+        assert os.path.exists('backup/check-definitions/1.yaml')
+        assert os.path.exists('backup/alert-definitions/2.yaml')
+
+        dashboards.side_effect = None
+        dashboards.return_value = [{'id': 3, 'name': 'dashboard-1'}]
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup'], catch_exceptions=False)
+
+        assert result.exit_code == 0
+        assert 'Unchanged: 1, created: 0' in result.output
+        assert os.path.exists('backup/dashboards/3.yaml')
+
+
+def test_export_apply_unchanged(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    remote = {
+        'checks': [{'id': 1, 'name': 'check-1', 'owning_team': 'zmon', 'command': 'True', 'interval': 60,
+                    'status': 'ACTIVE', 'last_modified': 1000, 'last_modified_by': 'jdoe'}],
+        'alerts': [{'id': 2, 'name': 'alert-1', 'team': 'zmon', 'check_definition_id': 1, 'condition': '>0',
+                    'priority': 1, 'status': 'ACTIVE', 'last_modified': 1000, 'last_modified_by': 'jdoe',
+                    'created_by': 'jdoe'}],
+    }
+
+    def update(kind):
+        # ZMON sets the server managed attributes on every update
+        def push(zmon, definition, **kwargs):
+            definition = dict(definition, last_modified=remote[kind][0]['last_modified'] + 1)
+            remote[kind] = [definition]
+            return definition
+        return push
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', lambda self: [dict(c) for c in remote['checks']])
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', lambda self: [dict(a) for a in remote['alerts']])
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_dashboards', MagicMock(return_value=[]))
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_check_definition', update('checks'))
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_alert_definition', update('alerts'))
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123, 'user': 'jdoe'}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup'], catch_exceptions=False)
+        assert result.exit_code == 0
+
+        for path, key, value in (('backup/check-definitions/1.yaml', 'interval', 30),
+                                 ('backup/alert-definitions/2.yaml', 'priority', 2)):
+            with open(path) as fd:
+                definition = yaml.safe_load(fd)
+            definition[key] = value
+            with open(path, 'w') as fd:
+                yaml.dump(definition, fd)
+
+        for command, kind in (('check-definitions', 'check-definitions'), ('alert', 'alert-definitions')):
+            directory = os.path.join('backup', kind)
+
+            result = runner.invoke(cli, ['-c', 'test.yaml', command, 'apply', directory], catch_exceptions=False)
+            assert 'Unchanged: 0, created: 0, updated: 1' in result.output
+
+            # the pushed definition has a new last_modified, the file is still up to date
+            result = runner.invoke(cli, ['-c', 'test.yaml', command, 'apply', directory], catch_exceptions=False)
+            assert 'Unchanged: 1, created: 0, updated: 0' in result.output
+
+        assert remote['checks'][0]['interval'] == 30
+        assert remote['alerts'][0]['priority'] == 2
+
+
+def test_data(monkeypatch):
+    def alert_data(alert_id):
+        alert_id = int(alert_id)
+        if alert_id == 3:
+            raise RuntimeError('failed')
+        return iter([
+            {'entity': 'e-1', 'results': [{'value': alert_id, 'ts': 2}, {'value': 0, 'ts': 1}]},
+            {'entity': 'e-2', 'results': [{'value': alert_id * 10, 'ts': 2}]},
+            {'entity': 'e-3', 'results': []},
+            {'entity': 'x-1', 'results': [{'value': -alert_id, 'ts': 2}]},
+        ])
+
+    get_data = MagicMock(side_effect=alert_data)
+    get_alerts = MagicMock(return_value=[
+        {'id': 1, 'team': 'zmon', 'responsible_team': 'zmon'},
+        {'id': 2, 'team': 'stups', 'responsible_team': 'zmon'},
+        {'id': 3, 'team': 'stups', 'responsible_team': 'stups'},
+    ])
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.iter_alert_data', get_data)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', get_alerts)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '1', 'e-2', '-o', 'json'], catch_exceptions=False)
+
+        assert json.loads(result.output) == {'e-2': 10}
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '1', '-o', 'json'], catch_exceptions=False)
+
+        assert json.loads(result.output) == {'e-1': 1, 'e-2': 10, 'x-1': -1}
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '1', 'e-*', '--match', 'glob', '-o', 'json'],
+                               catch_exceptions=False)
+
+        assert json.loads(result.output) == {'e-1': 1, 'e-2': 10}
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '1', '^x', '1$', '-m', 'regex', '--history', '-o',
+                                     'json'], catch_exceptions=False)
+
+        assert json.loads(result.output) == {
+            'e-1': [{'value': 1, 'ts': 2}, {'value': 0, 'ts': 1}],
+            'x-1': [{'value': -1, 'ts': 2}],
+        }
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '1', '(', '-m', 'regex'])
+        assert result.exit_code != 0
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '1,2,3', 'e-1', 'e-2', '-o', 'ndjson', '-n', '2'],
+                               catch_exceptions=False)
+
+        lines = sorted((json.loads(line) for line in result.output.splitlines()), key=lambda r: r['alert_id'])
+        assert lines == [
+            {'alert_id': 1, 'values': {'e-1': 1, 'e-2': 10}},
+            {'alert_id': 2, 'values': {'e-1': 2, 'e-2': 20}},
+            {'alert_id': 3, 'error': 'failed'},
+        ]
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data', '--team', 'zmon', 'e-1', '-o', 'json'],
+                               catch_exceptions=False)
+
+        assert sorted(r['alert_id'] for r in json.loads(result.output)) == [1, 2]
+        assert all(r['values'] == {'e-1': r['alert_id']} for r in json.loads(result.output))
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'data'])
+        assert result.exit_code != 0
+
+
 def test_filter_entities(monkeypatch):
     get = MagicMock()
     get.return_value = [
@@ -321,6 +762,39 @@ def test_filter_entities(monkeypatch):
         get.assert_called_with(query={'type': 'instance', 'application_id': 'app-1'})
 
 
+def test_filter_entities_limit_sort(monkeypatch):
+    get = MagicMock()
+    get.return_value = [
+        {'id': 'e-1', 'type': 'instance', 'last_modified': '2017-01-03 01:01:01.000'},
+        {'id': 'e-2', 'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'e-3', 'type': 'instance', 'last_modified': '2017-01-02 01:01:01.000'},
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'f', 'type', 'instance', '--limit', '2'], catch_exceptions=False)
+
+        out = result.output
+        assert 'e-1' not in out
+        assert out.index('e-2') < out.index('e-3')
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'f', 'type', 'instance', '--sort', 'id', '--reverse', '--limit', '1'],
+            catch_exceptions=False)
+
+        out = result.output
+        assert 'e-3' in out
+        assert 'e-1' not in out and 'e-2' not in out
+
+
 def test_search(monkeypatch):
     get = MagicMock()
     get.return_value = {'alerts': [], 'checks': [], 'dashboards': [], 'grafana_dashboards': []}
@@ -358,3 +832,337 @@ def test_search(monkeypatch):
             cli, ['-c', 'test.yaml', 'search', 'eagle'], catch_exceptions=False)
 
         assert 'eagle' in result.output
+
+
+def test_push_entities_concurrently(monkeypatch):
+    def add_entity(entity):
+        if entity['id'] == 'e-2':
+            raise RuntimeError('boom')
+        return MagicMock(ok=True)
+
+    add = MagicMock(side_effect=add_entity)
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', add)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        entities = [{'id': 'e-{}'.format(i), 'type': 'dummy'} for i in range(5)]
+        with open('entities.yaml', 'w') as fd:
+            yaml.safe_dump(entities, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'entities', 'push', 'entities.yaml', '--concurrency', '3'],
+            catch_exceptions=False)
+
+        out = result.output
+
+        assert add.call_count == 5
+        assert 'Creating entity e-4' in out
+        assert 'Failed: boom' in out
+        assert 'Processed 5 entities' in out
+        assert '4 succeeded, 1 failed' in out
+        assert 'e-2: boom' in out
+
+
+def test_filter_entities_streaming(monkeypatch):
+    entities = [
+        {'id': 'e-1', 'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'e-2', 'type': 'instance', 'last_modified': '2016-01-01 01:01:01.000'},
+    ]
+
+    get = MagicMock()
+    get.side_effect = lambda query=None: iter(entities)
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.iter_entities', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'f', 'type', 'instance', '-o', 'ndjson'], catch_exceptions=False)
+
+        assert [json.loads(line) for line in result.output.splitlines()] == entities
+
+        get.assert_called_with(query={'type': 'instance'})
+
+        for args in ([], ['--pretty']):
+            result = runner.invoke(cli, ['-c', 'test.yaml', 'e', '-o', 'json'] + args, catch_exceptions=False)
+
+            assert result.output == json.dumps(entities, indent=4 if args else None) + '\n'
+
+
+def test_sync_entities(monkeypatch):
+    report = client.SyncReport()
+    report.unchanged = ['e-1']
+    report.created = ['e-2']
+    report.deleted = ['e-3']
+
+    sync = MagicMock(return_value=report)
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.sync_entities', sync)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        entities = [{'id': 'e-1', 'type': 'dummy'}, {'id': 'e-2', 'type': 'dummy'}]
+        with open('entities.yaml', 'w') as fd:
+            yaml.safe_dump(entities, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'entities', 'sync', 'entities.yaml', '--type', 'dummy', '-f', 'team', 'zmon',
+                  '--delete', '--adaptive'], catch_exceptions=False)
+
+        sync.assert_called_once_with(entities, 'dummy', query={'team': 'zmon'}, delete=True, dry_run=False,
+                                     concurrency=1, adaptive=True)
+
+        assert 'Created e-2' in result.output
+        assert 'Deleted e-3' in result.output
+        assert 'Unchanged: 1, created: 1, updated: 0, deleted: 1, failed: 0' in result.output
+
+
+def test_filter_entities_cached(monkeypatch, tmpdir):
+    get = MagicMock()
+    get.return_value.json.return_value = [
+        {'id': 'e-1', 'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'e-2', 'type': 'host', 'last_modified': '2017-01-01 01:01:01.000'},
+    ]
+
+    monkeypatch.setattr('requests.Session.get', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        for args in (['--cached'], ['--cached'], ['--refresh']):
+            result = runner.invoke(
+                cli, ['-c', 'test.yaml', 'e', 'f', 'type', 'host', '-o', 'ndjson'] + args, catch_exceptions=False)
+
+            assert [json.loads(line)['id'] for line in result.output.splitlines()] == ['e-2']
+
+        # second --cached run is answered from the cache
+        assert get.call_count == 2
+
+
+def test_filter_entities_local(monkeypatch, tmpdir):
+    get = MagicMock()
+    get.return_value = [
+        {'id': 'app-1', 'type': 'instance', 'team': 'zmon', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'app-2', 'type': 'instance', 'team': 'stups', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'host-1', 'type': 'host', 'team': 'zmon', 'last_modified': '2017-01-01 01:01:01.000'},
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'f', '--local', 'type', 'instance', '--regex', 'team', '^zm', '-o', 'json'],
+            catch_exceptions=False)
+
+        assert [e['id'] for e in json.loads(result.output)] == ['app-1']
+        get.assert_called_once_with()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'e', 'f', '--prefix', 'id', 'app'], catch_exceptions=False)
+
+        assert result.exit_code != 0
+        assert 'require --local' in result.output
+
+
+def test_export_entities(monkeypatch):
+    get = MagicMock()
+    get.return_value = [
+        {'id': 'e-1', 'type': 'instance', 'team': 'zmon'},
+        {'id': 'e-2', 'type': 'instance', 'team': 'stups'},
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'export', 'entities.snapshot', '-f', 'type', 'instance'],
+            catch_exceptions=False)
+
+        assert '2 entities' in result.output
+        get.assert_called_with(query={'type': 'instance'})
+
+        with EntitySnapshot('entities.snapshot') as snapshot:
+            assert [e['id'] for e in snapshot.filter({'team': 'zmon'})] == ['e-1']
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'export', 'entities.json', '--format', 'json'], catch_exceptions=False)
+
+        get.assert_called_with(query=None)
+        with open('entities.json') as fd:
+            assert json.load(fd) == get.return_value
+
+
+def test_delete_entities_filter(monkeypatch):
+    get = MagicMock(return_value=[{'id': 'e-{}'.format(i), 'type': 'dummy'} for i in range(4)])
+    delete = MagicMock(side_effect=lambda entity_id: entity_id != 'e-1')
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+    monkeypatch.setattr('zmon_cli.client.Zmon.delete_entity', delete)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'delete', '-f', 'type', 'dummy', '--dry-run'], catch_exceptions=False)
+
+        assert '4 entities would be deleted' in result.output
+        delete.assert_not_called()
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'delete', '-f', 'type', 'dummy', '-n', '2'], catch_exceptions=False)
+
+        get.assert_called_with(query={'type': 'dummy'}, use_cache=False)
+        assert delete.call_count == 4
+        assert 'Processed 4 entities' in result.output
+        assert '3 succeeded, 1 failed' in result.output
+        assert 'e-1: Not deleted' in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'e', 'delete'], catch_exceptions=False)
+
+        assert result.exit_code != 0
+        assert 'Either ENTITY_ID or --filter' in result.output
+
+
+def test_push_entities_ndjson(monkeypatch):
+    add = MagicMock()
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', add)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    lines = ['{"id": "e-1", "type": "dummy"}', '', '{"id": "e-2", "type": "dummy"}', '{"id": ', '3']
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        with open('entities.ndjson', 'w') as fd:
+            fd.write('\n'.join(lines))
+
+        for args, kwargs in ((['-'], {'input': '\n'.join(lines)}), (['entities.ndjson', '-n', '2'], {})):
+            add.reset_mock()
+
+            result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push'] + args, catch_exceptions=False,
+                                   **kwargs)
+
+            out = result.output
+
+            assert sorted(c[0][0]['id'] for c in add.call_args_list if isinstance(c[0][0], dict)) == ['e-1', 'e-2']
+            assert 'Creating entity e-2' in out
+            assert 'Invalid entity on line 4' in out
+            assert 'Processed 4 entities' in out
+            assert '3 succeeded, 1 failed' in out
+
+
+def test_connection_options(monkeypatch):
+    status = MagicMock()
+    status.return_value = {'workers': []}
+    monkeypatch.setattr('zmon_cli.client.Zmon.status', status)
+
+    clients = []
+
+    def init(self, *args, **kwargs):
+        clients.append(kwargs)
+        init.orig(self, *args, **kwargs)
+
+    init.orig = Zmon.__init__
+    monkeypatch.setattr('zmon_cli.client.Zmon.__init__', init)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.safe_dump({'url': 'https://zmon-api', 'token': '123', 'max_connections': 12}, fd)
+
+        runner.invoke(cli, ['-c', 'test.yaml', 'status'], catch_exceptions=False)
+        runner.invoke(cli, ['-c', 'test.yaml', '--max-connections', '32', '--rate-limit', '5', 'status'],
+                      catch_exceptions=False)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', '--max-connections', '0', 'status'])
+        assert result.exit_code != 0
+
+    assert [c['pool_maxsize'] for c in clients] == [12, 32]
+    assert [c['rate_limit'] for c in clients] == [None, 5]
+
+
+def test_bulk_concurrency_max_connections(monkeypatch):
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', MagicMock())
+
+    clients = []
+
+    def init(self, *args, **kwargs):
+        clients.append(self)
+        init.orig(self, *args, **kwargs)
+
+    init.orig = Zmon.__init__
+    monkeypatch.setattr('zmon_cli.client.Zmon.__init__', init)
+
+    concurrency = []
+
+    def run_bulk(func, items, concurrency=1, **kwargs):
+        run_bulk.concurrency.append(concurrency)
+        return bulk_module.run_bulk(func, items, concurrency=concurrency, **kwargs)
+
+    run_bulk.concurrency = concurrency
+    monkeypatch.setattr('zmon_cli.cmds.entity.run_bulk', run_bulk)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'https://zmon-api', 'token': 123}, fd)
+
+        with open('entities.yaml', 'w') as fd:
+            yaml.safe_dump([{'id': 'e-{}'.format(i), 'type': 'dummy'} for i in range(20)], fd)
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', '--max-connections', '4', 'entities', 'push', 'entities.yaml', '-n', '16'],
+            catch_exceptions=False)
+
+        assert 'using 4' in result.output
+        assert clients[-1].pool_maxsize == 4
+
+        runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', 'entities.yaml', '-n', '16'],
+                      catch_exceptions=False)
+
+        assert clients[-1].pool_maxsize == 16
+
+    assert concurrency == [4, 16]
@@ -0,0 +1,127 @@
+import pytest
+
+from zmon_cli import conditions
+from zmon_cli.conditions import Condition, ConditionError, ConditionTimeout, what_if
+
+
+VALUES = [0, 1, 99, 100, 100.5, 250, -3, True, None, 'n/a', {'errors': 7}, [1, 2], 2 ** 60]
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'scalar'])
+def vectorize(request, monkeypatch):
+    if request.param:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(conditions, 'numpy', None)
+    return request.param
+
+
+def expected(condition, values):
+    results = []
+    for value in values:
+        try:
+            results.append(Condition(condition)(value))
+        except Exception:
+            results.append(None)
+    return results
+
+
+@pytest.mark.parametrize('condition,vectorized', [
+    ('>100', True),
+    ('<= 99', True),
+    ('== 100', True),
+    ('!=0', True),
+    ('value * 2 - 1 > 150 or value < 0', True),
+    ('1 < value < 250', True),
+    ('not value > 1', True),
+    ('value and value >= 100', True),
+    ('abs(value) > 2', False),
+    ("value['errors'] > 5", False),
+    ('value / 2 > 40', False),
+    ('>2.5e1', True),
+])
+def test_condition_evaluate(vectorize, condition, vectorized):
+    c = Condition(condition)
+
+    assert c.vectorized == (vectorize and vectorized)
+    assert c.evaluate(VALUES) == expected(condition, VALUES)
+
+
+@pytest.mark.parametrize('values', [[1, 2.5, 300, -7], [1, 2 ** 60, 2 ** 60 + 1], []])
+def test_condition_evaluate_numeric(vectorize, values):
+    condition = '> 2 ** 2 and value != 1152921504606846977'
+
+    assert Condition('>2').evaluate(values) == expected('>2', values)
+    assert Condition(condition).evaluate(values) == expected(condition, values)
+
+
+def test_condition_scalar():
+    c = Condition('>100')
+
+    assert c(101) is True
+    assert c(100) is False
+
+    with pytest.raises(TypeError):
+        c('n/a')
+
+    assert Condition("value['errors'] > 5")({'errors': 7}) is True
+
+
+@pytest.mark.parametrize('condition', ['>', 'value >> >', 'value.__class__', ''])
+def test_condition_invalid(condition):
+    with pytest.raises(ConditionError):
+        Condition(condition)
+
+
+def test_condition_no_builtins():
+    with pytest.raises(NameError):
+        Condition('open("/etc/passwd")')(1)
+
+
+def test_what_if(vectorize):
+    values = {'e-{}'.format(i): i for i in range(1000)}
+    values['broken'] = 'n/a'
+
+    report = what_if(values, '>100', '>=990')
+
+    assert report['entities'] == 1001
+    assert report['firing'] == 899
+    assert report['new_firing'] == 10
+    assert report['started'] == []
+    assert report['resolved'] == sorted('e-{}'.format(i) for i in range(101, 990))
+    assert report['errors'] == 1
+
+    report = what_if(values, '>=990', '>100')
+
+    assert len(report['started']) == 889
+    assert report['resolved'] == []
+
+
+@pytest.mark.parametrize('condition', ['>9**9**9', '> 2 ** value', '> 10 ** 1000', '> 1 << 10 ** 9', '> 2 ** -200'])
+def test_condition_expensive(condition):
+    with pytest.raises(ConditionError):
+        Condition(condition)
+
+
+def test_condition_time_limit():
+    c = Condition("any(x == 'z' for x in str(value) * 1000000)", time_limit=0.05)
+
+    with pytest.raises(ConditionTimeout):
+        c(12345678)
+
+    assert c.evaluate([12345678, 'n/a']) == [None, None]
+
+    assert Condition('>2 ** 64')(2 ** 65) is True
+
+
+def test_condition_without_numpy(monkeypatch):
+    values = list(range(-5, 300, 7)) + [2.5, 'n/a']
+    vectorized = Condition('value * 2 > 100 or value < 0').evaluate(values)
+
+    monkeypatch.setattr(conditions, 'numpy', None)
+
+    c = Condition('value * 2 > 100 or value < 0')
+
+    assert c.vectorized is False
+    assert c.evaluate(values) == vectorized
+    assert what_if({'a': 1, 'b': 200}, '>100', '>0')['started'] == ['a']
@@ -0,0 +1,69 @@
+import pytest
+
+from zmon_cli.definitions import check_definition_keys, alert_definition_keys, definition_changed, load_definitions
+from zmon_cli.definitions import plan_definitions
+
+
+REMOTE = [
+    {'id': 1, 'name': 'a', 'owning_team': 'zmon', 'interval': 60, 'last_modified_by': 'x'},
+    {'id': 2, 'name': 'b', 'owning_team': 'zmon', 'interval': 60},
+]
+
+
+@pytest.mark.parametrize('local,changed', [
+    ({'id': 1, 'interval': 60}, False),
+    ({'id': 1, 'interval': 60, 'last_modified_by': 'y'}, False),
+    ({'id': 1, 'interval': 60, 'last_modified': 1483232461000, 'created_by': 'y'}, False),
+    ({'id': 1, 'interval': 30}, True),
+    ({'id': 1, 'command': 'x'}, True),
+])
+def test_definition_changed(local, changed):
+    assert definition_changed(local, REMOTE[0]) is changed
+
+
+def test_plan_definitions():
+    definitions = [
+        ('a.yaml', {'name': 'a', 'owning_team': 'zmon', 'interval': 60}),
+        ('b.yaml', {'id': 2, 'name': 'renamed', 'owning_team': 'zmon', 'interval': 60}),
+        ('c.yaml', {'name': 'a', 'owning_team': 'other', 'interval': 60}),
+    ]
+
+    plan = plan_definitions(definitions, REMOTE, check_definition_keys)
+
+    assert [p for p, _ in plan['unchanged']] == ['a.yaml']
+    assert [p for p, _ in plan['updated']] == ['b.yaml']
+    assert [p for p, _ in plan['created']] == ['c.yaml']
+    assert plan['matches'] == {'a.yaml': REMOTE[0], 'b.yaml': REMOTE[1]}
+
+
+def test_plan_alert_definitions():
+    remote = [
+        {'id': 1, 'name': 'a', 'team': 'zmon', 'check_definition_id': 10, 'priority': 1},
+        {'id': 2, 'name': 'a', 'team': 'zmon', 'check_definition_id': 11, 'priority': 1},
+    ]
+    definitions = [
+        ('a.yaml', {'name': 'a', 'team': 'zmon', 'check_definition_id': 11, 'priority': 2}),
+        ('b.yaml', {'name': 'a', 'team': 'zmon', 'check_definition_id': 12, 'priority': 1}),
+        ('c.yaml', {'id': 1, 'name': 'a', 'team': 'zmon', 'check_definition_id': 10, 'priority': 1}),
+    ]
+
+    plan = plan_definitions(definitions, remote, alert_definition_keys)
+
+    assert [p for p, _ in plan['updated']] == ['a.yaml']
+    assert plan['matches']['a.yaml']['id'] == 2
+    assert [p for p, _ in plan['created']] == ['b.yaml']
+    assert [p for p, _ in plan['unchanged']] == ['c.yaml']
+
+
+def test_load_definitions(tmpdir):
+    tmpdir.join('b.yaml').write('name: b\n')
+    tmpdir.mkdir('sub').join('a.yml').write('name: a\n')
+    tmpdir.join('list.yaml').write('- name: c\n')
+    tmpdir.join('broken.yaml').write('name: [\n')
+    tmpdir.join('README.md').write('# checks\n')
+
+    errors = []
+    definitions = load_definitions(str(tmpdir), lambda path, e: errors.append(path))
+
+    assert [d['name'] for _, d in definitions] == ['b', 'a']
+    assert sorted(p.rsplit('/', 1)[-1] for p in errors) == ['broken.yaml', 'list.yaml']
@@ -0,0 +1,100 @@
+import os
+
+from zmon_cli import export
+from zmon_cli.export import EXPORT_MANIFEST, export_objects
+
+
+CHECKS = [
+    {'id': 1, 'name': 'check-1', 'command': 'http("x").code()\n', 'interval': 60},
+    {'id': 2, 'name': 'check-2', 'command': 'True', 'interval': 60},
+]
+
+
+def test_export_objects(tmpdir, monkeypatch):
+    directory = str(tmpdir.join('checks'))
+
+    report = export_objects(directory, [dict(c) for c in CHECKS])
+
+    assert sorted(report.created) == ['1.yaml', '2.yaml']
+    assert os.path.exists(os.path.join(directory, EXPORT_MANIFEST))
+    assert 'check-1' in tmpdir.join('checks', '1.yaml').read()
+
+    # unchanged objects are not emitted again
+    dump = []
+    monkeypatch.setattr('zmon_cli.export.dump_yaml', dump.append)
+
+    report = export_objects(directory, [dict(c) for c in CHECKS])
+
+    assert sorted(report.unchanged) == ['1.yaml', '2.yaml']
+    assert dump == []
+
+    monkeypatch.undo()
+
+    tmpdir.join('checks', 'stale.yaml').write('id: 3\n')
+
+    report = export_objects(directory, [dict(CHECKS[0], interval=30)])
+
+    assert report.updated == ['1.yaml']
+    assert report.deleted == ['2.yaml', 'stale.yaml']
+    assert sorted(os.listdir(directory)) == [EXPORT_MANIFEST, '1.yaml']
+    assert 'interval: 30' in tmpdir.join('checks', '1.yaml').read()
+
+
+def test_export_objects_without_manifest(tmpdir):
+    directory = str(tmpdir)
+
+    export_objects(directory, [dict(c) for c in CHECKS])
+    os.unlink(os.path.join(directory, EXPORT_MANIFEST))
+
+    # identical file content is detected without the manifest
+    report = export_objects(directory, [dict(c) for c in CHECKS])
+
+    assert sorted(report.unchanged) == ['1.yaml', '2.yaml']
+
+
+def test_export_objects_failed_write(tmpdir, monkeypatch):
+    directory = str(tmpdir.join('checks'))
+
+    def write_atomic(path, data, mode=None):
+        if path.endswith('.yaml'):
+            raise OSError('disk full')
+        orig(path, data, mode=mode)
+
+    orig = export.write_atomic
+    monkeypatch.setattr('zmon_cli.export.write_atomic', write_atomic)
+
+    report = export_objects(directory, [CHECKS[0]], file_name=lambda obj: 'sub/{}.yaml'.format(obj['id']))
+
+    assert report.created == []
+    assert [name for name, _ in report.failed] == ['sub/1.yaml']
+
+
+def test_export_objects_none_values(tmpdir):
+    directory = str(tmpdir.join('checks'))
+
+    objects = [{'id': 1, 'name': 'check-1', 'description': None}, {'id': 3, 'command': 42}, CHECKS[1]]
+
+    report = export_objects(directory, objects)
+
+    assert report.created == ['1.yaml', '2.yaml']
+    # the command can not be emitted as literal block, the other objects are still exported
+    assert [name for name, _ in report.failed] == ['3.yaml']
+
+    with open(os.path.join(directory, '1.yaml')) as f:
+        assert f.read() == 'id: 1\nname: check-1\n'
+
+    assert os.path.exists(os.path.join(directory, EXPORT_MANIFEST))
+
+
+def test_export_objects_file_mode(tmpdir):
+    directory = str(tmpdir.join('checks'))
+
+    umask = os.umask(0o022)
+    try:
+        export_objects(directory, CHECKS, file_name=lambda obj: 'team/{}.yaml'.format(obj['id']))
+    finally:
+        os.umask(umask)
+
+    assert os.stat(os.path.join(directory, 'team', '1.yaml')).st_mode & 0o777 == 0o644
+    assert os.stat(os.path.join(directory, 'team')).st_mode & 0o777 == 0o755
+    assert os.stat(os.path.join(directory, EXPORT_MANIFEST)).st_mode & 0o777 == 0o644
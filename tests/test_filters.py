@@ -0,0 +1,84 @@
+import pytest
+
+from zmon_cli.filters import FilterSyntaxError, compile_filter, filter_definitions, tokenize
+
+
+CHECK = {
+    'id': 1, 'name': 'Kubernetes nodes', 'owning_team': 'zmon', 'interval': 60, 'status': 'ACTIVE', 'enabled': True,
+    'tags': ['critical', 'k8s'], 'parameters': {'threshold': {'value': 3}},
+    'entities': [{'type': 'instance'}, {'type': 'host', 'application_id': 'app-1'}],
+}
+
+
+@pytest.mark.parametrize('expression,result', [
+    ("owning_team == 'zmon'", True),
+    ('owning_team == "stups"', False),
+    ("owning_team != 'stups'", True),
+    ('interval >= 60 and interval < 61', True),
+    ('interval > 60 or id == 1', True),
+    ('not interval == 60', False),
+    ("not (owning_team == 'zmon' and id == 2)", True),
+    ("owning_team in ['stups', 'zmon']", True),
+    ("owning_team not in ['stups', 'zmon']", False),
+    ("'critical' in tags", True),
+    ("'nodes' in name", True),
+    ("'threshold' in parameters", True),
+    ("'instance' in entities.type", True),
+    ("'inst' in entities.type", False),
+    ("'inst' not in entities.type", True),
+    ("'host' not in entities.type", False),
+    ("'app-1' in entities.application_id", True),
+    ("name =~ '^kube'", False),
+    ("name =~ '(?i)^kube'", True),
+    ("name !~ 'pods$'", True),
+    (r"name =~ '\bnodes\b'", True),
+    (r"name =~ '\bnode\b'", False),
+    (r"entities.application_id =~ '^app-\d$'", True),
+    (r"entities.application_id =~ '\.'", False),
+    (r"name != 'it\'s'", True),
+    ('parameters.threshold.value == 3', True),
+    ("tags.1 == 'k8s'", True),
+    ('tags.5 == null', True),
+    ("entities.type == 'host'", True),
+    ("entities.application_id == 'app-2'", False),
+    ('missing == null', True),
+    ('missing != 1', True),
+    ('missing', False),
+    ('enabled', True),
+    ('enabled == 1', False),
+    ('enabled == true', True),
+    ("interval > 'x'", False),
+    ('interval == 60.0', True),
+])
+def test_compile_filter(expression, result):
+    assert compile_filter(expression)(CHECK) is result
+
+
+@pytest.mark.parametrize('expression', [
+    '', 'owning_team ==', "(owning_team == 'zmon'", "owning_team == 'zmon' id", "name =~ '['", 'id & 1',
+    'owning_team in [owning_team]', 'id == ==',
+])
+def test_compile_filter_invalid(expression):
+    with pytest.raises(FilterSyntaxError):
+        compile_filter(expression)
+
+
+@pytest.mark.parametrize('literal,value', [
+    (r"'\b\d+'", r'\b\d+'),
+    (r"'it\'s'", "it's"),
+    (r'"say \"hi\""', 'say "hi"'),
+    (r"'back\\slash'", 'back\\slash'),
+    (r"'\"'", r'\"'),
+])
+def test_tokenize_string(literal, value):
+    assert tokenize(literal) == [('string', value)]
+
+
+def test_filter_definitions():
+    checks = [dict(CHECK, id=i, interval=i * 30) for i in range(1, 5)]
+
+    assert [c['id'] for c in filter_definitions(iter(checks), 'interval >= 60 and id != 4')] == [2, 3]
+
+    predicate = compile_filter('id > 2')
+    assert compile_filter('id > 2') is predicate
+    assert [c['id'] for c in filter_definitions(checks, predicate)] == [3, 4]
@@ -0,0 +1,48 @@
+import pytest
+
+from zmon_cli.client import entity_matches
+from zmon_cli.index import EntityIndex
+
+
+ENTITIES = [
+    {'id': 'app-1-a', 'type': 'instance', 'application_id': 'app-1', 'team': 'zmon', 'tags': ['x', 'y', 'x']},
+    {'id': 'app-1-b', 'type': 'instance', 'application_id': 'app-1', 'team': 'stups', 'port': 80},
+    {'id': 'app-2-a', 'type': 'instance', 'application_id': 'app-2', 'team': 'zmon', 'enabled': True},
+    {'id': 'host-1', 'type': 'host', 'team': 'zmon', 'nested': {'k': 'v'}, 'port': 1},
+]
+
+
+@pytest.mark.parametrize('query,prefix,regex,ids', [
+    (None, None, None, ['app-1-a', 'app-1-b', 'app-2-a', 'host-1']),
+    ({'type': 'instance', 'application_id': 'app-1'}, None, None, ['app-1-a', 'app-1-b']),
+    ({'type': 'instance', 'team': 'zmon'}, None, None, ['app-1-a', 'app-2-a']),
+    ({'type': 'host', 'application_id': 'app-1'}, None, None, []),
+    ({'missing': 'x'}, None, None, []),
+    ({'tags': 'x'}, None, None, ['app-1-a']),
+    ({'port': 80}, None, None, ['app-1-b']),
+    ({'port': '80'}, None, None, []),
+    ({'port': True}, None, None, []),
+    ({'enabled': 1}, None, None, []),
+    ({'nested': {'k': 'v'}}, None, None, ['host-1']),
+    ({'tags': ['y']}, None, None, ['app-1-a']),
+    (None, {'id': 'app-1'}, None, ['app-1-a', 'app-1-b']),
+    ({'team': 'zmon'}, {'id': 'app-'}, None, ['app-1-a', 'app-2-a']),
+    (None, None, {'team': '^(zmon|stups)$'}, ['app-1-a', 'app-1-b', 'app-2-a', 'host-1']),
+    ({'type': 'instance'}, {'application_id': 'app'}, {'id': '-a$'}, ['app-1-a', 'app-2-a']),
+])
+def test_entity_index_filter(query, prefix, regex, ids):
+    index = EntityIndex(ENTITIES)
+
+    assert [e['id'] for e in index.filter(query, prefix=prefix, regex=regex)] == ids
+
+    if query and not prefix and not regex:
+        assert [e['id'] for e in ENTITIES if entity_matches(e, query)] == ids
+
+
+def test_entity_index_attributes():
+    index = EntityIndex(iter(ENTITIES))
+
+    assert len(index) == 4
+    assert 'nested' not in index.attributes
+    assert sorted(index.values('application_id')) == ['app-1', 'app-2']
+    assert sorted(index.values('tags')) == ['x', 'y']
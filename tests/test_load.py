@@ -0,0 +1,48 @@
+import pytest
+
+from zmon_cli.load import CheckLoadEstimator, team_load
+
+
+ENTITIES = [
+    {'id': 'app-1-a', 'type': 'instance', 'application_id': 'app-1'},
+    {'id': 'app-1-b', 'type': 'instance', 'application_id': 'app-1'},
+    {'id': 'app-2-a', 'type': 'instance', 'application_id': 'app-2'},
+    {'id': 'db-1', 'type': 'database', 'application_id': 'app-1'},
+]
+
+
+@pytest.mark.parametrize('entities,count', [
+    ([{'type': 'instance'}], 3),
+    ([{'type': 'instance', 'application_id': 'app-1'}], 2),
+    ([{'type': 'instance', 'application_id': 'app-1'}, {'application_id': 'app-1'}], 3),
+    ([{'type': 'instance'}, {'type': 'database'}], 4),
+    ([{'type': 'GLOBAL'}], 1),
+    ([{'type': 'missing'}], 0),
+    ([], 0),
+])
+def test_check_load(entities, count):
+    estimator = CheckLoadEstimator(ENTITIES)
+
+    load = estimator.estimate({'id': 1, 'name': 'check', 'owning_team': 'zmon', 'interval': 30, 'entities': entities})
+
+    assert load.entities == count
+    assert load.invocations_per_sec == count / 30
+
+
+def test_team_load():
+    estimator = CheckLoadEstimator(ENTITIES)
+
+    loads = [estimator.estimate(c) for c in (
+        {'id': 1, 'owning_team': 'zmon', 'interval': 60, 'entities': [{'type': 'instance'}]},
+        {'id': 2, 'owning_team': 'zmon', 'interval': 10, 'entities': [{'type': 'database'}]},
+        {'id': 3, 'owning_team': 'stups', 'interval': 1, 'entities': [{'type': 'instance'}]},
+        {'id': 4, 'owning_team': 'stups', 'entities': [{'type': 'instance'}]},
+    )]
+
+    assert loads[3].invocations_per_sec == 0.0
+
+    teams = team_load(loads)
+
+    assert [t['owning_team'] for t in teams] == ['stups', 'zmon']
+    assert teams[0]['checks'] == 2 and teams[0]['entities'] == 6
+    assert teams[1]['invocations_per_sec'] == pytest.approx(3 / 60 + 1 / 10)
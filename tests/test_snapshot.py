@@ -0,0 +1,109 @@
+import pytest
+
+from zmon_cli.client import entity_matches
+from zmon_cli.snapshot import EntitySnapshot, write_snapshot
+
+
+ENTITIES = [
+    {'id': 'app-1-a', 'type': 'instance', 'application_id': 'app-1', 'team': 'zmon', 'tags': ['x', 'y', 'x']},
+    {'id': 'app-1-b', 'type': 'instance', 'application_id': 'app-1', 'team': 'stups', 'port': 80},
+    {'id': 'app-2-a', 'type': 'instance', 'application_id': 'app-2', 'team': 'zmon', 'enabled': True},
+    {'id': 'host-1', 'type': 'host', 'team': 'zmon', 'nested': {'k': 'v', 'l': [1]}, 'port': 1, 'name': 'Grüße'},
+    {'id': 'host-2', 'type': 'host', 'n': 1.0, 'weight': 2},
+]
+
+
+@pytest.fixture
+def snapshot(tmpdir):
+    path = str(tmpdir.join('entities.snapshot'))
+
+    assert write_snapshot(iter(ENTITIES), path) == 5
+
+    with EntitySnapshot(path) as s:
+        yield s
+
+
+@pytest.mark.parametrize('query,ids', [
+    (None, ['app-1-a', 'app-1-b', 'app-2-a', 'host-1', 'host-2']),
+    ({'type': 'instance', 'application_id': 'app-1'}, ['app-1-a', 'app-1-b']),
+    ({'type': 'instance', 'team': 'zmon'}, ['app-1-a', 'app-2-a']),
+    ({'type': 'host', 'application_id': 'app-1'}, []),
+    ({'missing': 'x'}, []),
+    ({'tags': 'x'}, ['app-1-a']),
+    ({'tags': 'z'}, []),
+    ({'port': 80}, ['app-1-b']),
+    ({'port': '80'}, []),
+    ({'port': True}, []),
+    ({'enabled': 1}, []),
+    ({'nested': {'k': 'v'}}, ['host-1']),
+    ({'nested': {'l': [1]}}, ['host-1']),
+    ({'tags': ['y']}, ['app-1-a']),
+    ({'name': 'Grüße'}, ['host-1']),
+    ({'n': 1}, ['host-2']),
+    ({'n': 1.0}, ['host-2']),
+    ({'n': True}, []),
+    ({'weight': 2.0}, ['host-2']),
+    ({'type': 'host', 'port': 1.0}, ['host-1']),
+])
+def test_snapshot_filter(snapshot, query, ids):
+    assert [e['id'] for e in snapshot.filter(query)] == ids
+    assert [e['id'] for e in ENTITIES if entity_matches(e, query or {})] == ids
+
+
+def test_snapshot_lookups(snapshot):
+    assert len(snapshot) == 5
+    assert list(snapshot) == ENTITIES
+    assert snapshot.entity(3) == ENTITIES[3]
+
+    assert snapshot.attributes == sorted({k for e in ENTITIES for k in e})
+    assert snapshot.values('application_id') == ['app-1', 'app-2']
+    assert snapshot.values('missing') == []
+
+    assert snapshot.get(1, 'port') == 80
+    assert snapshot.get(0, 'port') is None
+    assert snapshot.get(0, 'missing', 'default') == 'default'
+    assert snapshot.get(3, 'nested') == {'k': 'v', 'l': [1]}
+
+    assert snapshot.get(4, 'n') == 1.0
+
+    with pytest.raises(IndexError):
+        snapshot.entity(5)
+
+
+def test_snapshot_empty(tmpdir):
+    path = str(tmpdir.join('empty.snapshot'))
+
+    assert write_snapshot([], path) == 0
+
+    with EntitySnapshot(path) as s:
+        assert len(s) == 0
+        assert s.filter({'type': 'instance'}) == []
+
+
+def test_snapshot_close_with_columns(tmpdir):
+    path = str(tmpdir.join('entities.snapshot'))
+    write_snapshot(ENTITIES, path)
+
+    s = EntitySnapshot(path)
+    column = s._column('type')
+    s.close()
+
+    with pytest.raises(ValueError):
+        column[0]
+
+    # a failing close does not replace the exception raised in the block
+    with pytest.raises(KeyError):
+        with EntitySnapshot(path) as s:
+            held = memoryview(s._mmap)
+            raise KeyError('in block')
+
+    held.release()
+    s._mmap.close()
+
+
+def test_snapshot_invalid(tmpdir):
+    path = tmpdir.join('entities.json')
+    path.write('[{"id": "e-1"}]')
+
+    with pytest.raises(ValueError):
+        EntitySnapshot(str(path))
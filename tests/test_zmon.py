@@ -1,5 +1,15 @@
+import contextlib
+import http.server
 import json
+import random
+import socketserver
+import threading
+import time
 
+import requests
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from unittest.mock import MagicMock
 
@@ -8,6 +18,7 @@ import pytest
 from requests.exceptions import HTTPError
 
 import zmon_cli.client as client
+from zmon_cli.cache import CheckValidationCache, EntityCache, ResponseCache
 from zmon_cli.client import Zmon, DEFAULT_TIMEOUT
 
 
@@ -36,6 +47,38 @@ def test_get_entity_id(monkeypatch, fx_ids):
     assert client.get_valid_entity_id(inp) == exp
 
 
+def test_get_entity_ids(monkeypatch, fx_ids):
+    inp, exp = fx_ids
+
+    assert client.get_valid_entity_ids([inp, inp]) == ([exp, exp], {})
+
+
+def test_get_entity_ids_random():
+    rnd = random.Random(42)
+    alphabet = 'aB1-_.@:[]()((( ))/#%\x00\x01\x02ßİΣ€\n'
+
+    ids = [''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 20))) for _ in range(5000)]
+
+    assert client.get_valid_entity_ids(ids).ids == [client.get_valid_entity_id(e) for e in ids]
+
+
+def test_get_entity_ids_full_translation(monkeypatch):
+    monkeypatch.setattr(client, '_invalid_run_translation', dict(client._invalid_run_translation))
+    monkeypatch.setattr(client, 'ENTITY_ID_RUN_CACHE_SIZE', len(client._invalid_run_translation))
+
+    ids = ['a (( ))b', 'App (v1) / #2', '((x))']
+
+    assert client.get_valid_entity_ids(ids).ids == ['a-[-]b', 'app-[v1]-2', '[x]']
+    assert len(client._invalid_run_translation) == client.ENTITY_ID_RUN_CACHE_SIZE
+
+
+def test_get_entity_ids_collisions():
+    res = client.get_valid_entity_ids(['My App', 'my-app', 'my app', 'My App', 'other'])
+
+    assert res.ids == ['my-app', 'my-app', 'my-app', 'my-app', 'other']
+    assert res.collisions == {'my-app': ['My App', 'my-app', 'my app']}
+
+
 @pytest.mark.parametrize('e1,e2,result', [
     (
         {'id': '1', 'nested': {'k': 'v', 'k2': 'v'}, 'date': DATE},
@@ -52,16 +95,52 @@ def test_get_entity_id(monkeypatch, fx_ids):
         {'id': '1', 'nested': {'22': 22, 'k': 'v', 'k3': {'list': [1, 2]}}},
         False
     ),
+    (
+        {'id': '1', 'ports': {80: 80, 443: 443, 8080: 8080}},
+        {'id': '1', 'ports': {'443': 443, '80': 80, '8080': 8080}},
+        True
+    ),
+    (
+        {'id': '1', 'list': [{'b': DATE, 'a': (1, 2)}]},
+        {'id': '1', 'list': [{'a': [1, 2], 'b': '2017-03-06T16:40:00'}]},
+        True
+    ),
+    (
+        {'id': '1', 'ordered': OrderedDict([('z', None), ('list', [True, 1.5, {2: 'b', 10: 'a'}])])},
+        {'id': '1', 'ordered': {'list': [True, 1.5, {'10': 'a', '2': 'b'}], 'z': None}},
+        True
+    ),
     (
         {},
         str,  # JSON exception!
         False
-    )
+    ),
+    (
+        {'id': '1', 'obj': object()},
+        {'id': '1', 'obj': object()},
+        False
+    ),
 ])
 def test_zmon_compare_entities(monkeypatch, e1, e2, result):
     assert client.compare_entities(e1, e2) == result
 
 
+def test_entity_fingerprints_memoized(monkeypatch):
+    fingerprint = MagicMock(side_effect=client.entity_fingerprint)
+    monkeypatch.setattr('zmon_cli.client.entity_fingerprint', fingerprint)
+
+    local = [{'id': str(i), 'type': 'dummy'} for i in range(10)]
+    remote = [{'id': str(i), 'type': 'dummy', 'last_modified': i} for i in range(10)]
+
+    fingerprints = client.EntityFingerprints()
+
+    for e1 in local:
+        for e2 in remote:
+            assert client.compare_entities(e1, e2, fingerprint=fingerprints) == (e1['id'] == e2['id'])
+
+    assert fingerprint.call_count == 20
+
+
 def test_zmon_view_urls(monkeypatch):
     zmon = Zmon(URL, token=TOKEN)
 
@@ -136,6 +215,194 @@ def test_zmon_get_entities(monkeypatch, q, result):
     get.assert_called_with(zmon.endpoint(client.ENTITIES), params=params, timeout=20)
 
 
+def test_zmon_get_entities_cached(monkeypatch, tmpdir):
+    entities = [{'id': 'e-1', 'type': 'instance'}, {'id': 'e-2', 'type': 'host'}]
+
+    get = MagicMock()
+    get.return_value.json.return_value = entities
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN, entity_cache=EntityCache(path=str(tmpdir)))
+
+    assert zmon.get_entities() == entities
+    assert zmon.get_entities(query={'type': 'host'}) == entities[1:]
+    assert zmon.get_entities(query=[{'type': 'host'}, {'id': 'e-1'}]) == entities
+
+    get.assert_called_once_with(zmon.endpoint(client.ENTITIES), timeout=DEFAULT_TIMEOUT)
+
+    zmon.get_entities(query={'type': 'host'}, use_cache=False)
+    assert get.call_count == 2
+
+    # pushing entities invalidates the cache
+    monkeypatch.setattr('requests.Session.put', MagicMock())
+    zmon.add_entity({'id': 'e-3', 'type': 'host'})
+
+    zmon.get_entities()
+    assert get.call_count == 3
+
+
+@pytest.mark.parametrize('entity,query,result', [
+    ({'id': '1', 'type': 'a'}, {}, True),
+    ({'id': '1', 'type': 'a'}, {'type': 'b'}, False),
+    ({'id': '1', 'type': 'a'}, {'missing': None}, False),
+    ({'id': '1', 'nested': {'k': 'v', 'k2': 1}}, {'nested': {'k2': 1}}, True),
+    ({'id': '1', 'tags': ['x', 'y']}, {'tags': 'y'}, True),
+    ({'id': '1', 'tags': [{'k': 'v', 'o': 1}]}, {'tags': [{'k': 'v'}]}, True),
+    ({'id': '1', 'tags': ['x']}, {'tags': ['x', 'z']}, False),
+    ({'id': '1', 'port': 80}, {'port': '80'}, False),
+])
+def test_entity_matches(entity, query, result):
+    assert client.entity_matches(entity, query) is result
+
+
+@pytest.mark.parametrize('chunks,result', [
+    (['[]'], []),
+    ([' [ ', ' ] '], []),
+    (['[{"id": "a"}', ', {"id"', ': "b", "n": [1, 2', ']}]'], [{'id': 'a'}, {'id': 'b', 'n': [1, 2]}]),
+    (['[1', '2, 3', '4]'], [12, 34]),
+    (['["a,]", ', '"b"]'], ['a,]', 'b']),
+])
+def test_iter_json_array(chunks, result):
+    assert list(client.iter_json_array(chunks)) == result
+
+
+@pytest.mark.parametrize('chunks', [['{"id": 1}'], ['[{"id": 1}'], ['[1 2]']])
+def test_iter_json_array_invalid(chunks):
+    with pytest.raises(ValueError):
+        list(client.iter_json_array(chunks))
+
+
+@pytest.mark.parametrize('q', [None, {'type': 'dummy'}])
+def test_zmon_iter_entities(monkeypatch, q):
+    result = [{'id': 'e-{}'.format(i), 'type': 'dummy', 'name': 'ü'} for i in range(100)]
+    body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+    get = MagicMock()
+    get.return_value.encoding = None
+    get.return_value.iter_content.return_value = (body[i:i + 7] for i in range(0, len(body), 7))
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN, timeout=20)
+
+    res = zmon.iter_entities(query=q)
+
+    assert list(res) == result
+    get.return_value.close.assert_called_once_with()
+
+    params = {'query': json.dumps(q)} if q else None
+    get.assert_called_with(zmon.endpoint(client.ENTITIES), params=params, timeout=20, stream=True)
+
+
+def test_zmon_iter_entities_stop_early(monkeypatch):
+    get = MagicMock()
+    get.return_value.encoding = None
+    get.return_value.iter_content.return_value = iter([b'[{"id": "e-1"}, ', b'{"id": "e-2"}, ', b'{"id": "e-3"}]'])
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    res = zmon.iter_entities()
+
+    assert next(res) == {'id': 'e-1'}
+    get.return_value.close.assert_not_called()
+
+    res.close()
+    get.return_value.close.assert_called_once_with()
+
+
+def test_zmon_iter_entities_error(monkeypatch):
+    get = MagicMock()
+    get.return_value.raise_for_status.side_effect = requests.HTTPError('503')
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    with pytest.raises(requests.HTTPError):
+        zmon.iter_entities()
+
+    get.return_value.close.assert_called_once_with()
+
+
+@pytest.mark.parametrize('delete,dry_run', [(False, False), (True, False), (True, True)])
+def test_zmon_sync_entities(monkeypatch, delete, dry_run):
+    remote = [
+        {'id': 'same', 'type': 'dummy', 'v': 1, 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'changed', 'type': 'dummy', 'v': 1},
+        {'id': 'obsolete', 'type': 'dummy'},
+    ]
+    desired = [
+        {'id': 'same', 'type': 'dummy', 'v': 1},
+        {'id': 'changed', 'type': 'dummy', 'v': 2},
+        {'id': 'new', 'v': 3},
+    ]
+
+    get = MagicMock(return_value=remote)
+    add = MagicMock()
+    delete_entity = MagicMock(return_value=True)
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', add)
+    monkeypatch.setattr('zmon_cli.client.Zmon.delete_entity', delete_entity)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    report = zmon.sync_entities(desired, 'dummy', query={'team': 't'}, delete=delete, dry_run=dry_run)
+
+    get.assert_called_once_with(query={'team': 't', 'type': 'dummy'}, use_cache=False)
+
+    assert report.unchanged == ['same']
+    assert report.updated == ['changed']
+    assert report.created == ['new']
+    assert report.deleted == (['obsolete'] if delete else [])
+    assert report.counts['failed'] == 0
+
+    # the caller's entities are not modified
+    assert desired[2] == {'id': 'new', 'v': 3}
+
+    if dry_run:
+        add.assert_not_called()
+        delete_entity.assert_not_called()
+    else:
+        assert sorted(c[0][0]['id'] for c in add.call_args_list) == ['changed', 'new']
+        assert {'id': 'new', 'type': 'dummy', 'v': 3} in [c[0][0] for c in add.call_args_list]
+        assert delete_entity.call_count == (1 if delete else 0)
+
+
+def test_zmon_sync_entities_failures(monkeypatch):
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', MagicMock(return_value=[{'id': 'old', 'type': 'dummy'}]))
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', MagicMock(side_effect=HTTPError('503')))
+    monkeypatch.setattr('zmon_cli.client.Zmon.delete_entity', MagicMock(return_value=False))
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    report = zmon.sync_entities([{'id': 'new', 'type': 'dummy'}], 'dummy', delete=True)
+
+    assert report.created == []
+    assert report.deleted == []
+    assert [entity_id for entity_id, _ in report.failed] == ['new', 'old']
+
+
+@pytest.mark.parametrize('entities', [
+    [{'type': 'dummy'}],
+    [{'id': '1', 'type': 'other'}],
+    [{'id': '1', 'type': 'dummy'}, {'id': '1'}],
+])
+def test_zmon_sync_entities_invalid(monkeypatch, entities):
+    get = MagicMock()
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    with pytest.raises(client.ZmonArgumentError):
+        zmon.sync_entities(entities, 'dummy')
+
+    get.assert_not_called()
+
+
 def test_zmon_get_entity(monkeypatch):
     get = MagicMock()
     result = {'id': 1, 'type': 'dummy'}
@@ -277,6 +544,69 @@ def test_zmon_get_check_defintions(monkeypatch, resp, result):
     get.assert_called_with(zmon.endpoint(client.ACTIVE_CHECK_DEF), timeout=DEFAULT_TIMEOUT)
 
 
+def test_zmon_get_check_definitions_expression(monkeypatch):
+    get = MagicMock()
+    get.return_value.json.return_value = {'check_definitions': [{'id': 1, 'interval': 30}, {'id': 2, 'interval': 60}]}
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    assert zmon.get_check_definitions(expression='interval >= 60') == [{'id': 2, 'interval': 60}]
+
+
+@pytest.mark.parametrize('headers,conditional', [
+    ({'ETag': '"v1"'}, {'If-None-Match': '"v1"'}),
+    ({'Last-Modified': 'Sat, 01 Jan 2017 00:00:00 GMT'}, {'If-Modified-Since': 'Sat, 01 Jan 2017 00:00:00 GMT'}),
+])
+def test_zmon_get_check_definitions_revalidated(monkeypatch, tmpdir, headers, conditional):
+    ok = MagicMock(status_code=200, headers=headers)
+    ok.json.return_value = {'check_definitions': [1, 2]}
+    not_modified = MagicMock(status_code=304, headers=headers)
+
+    get = MagicMock()
+    get.side_effect = [ok, not_modified]
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN, response_cache=ResponseCache(path=str(tmpdir)))
+    url = zmon.endpoint(client.ACTIVE_CHECK_DEF)
+
+    assert zmon.get_check_definitions() == [1, 2]
+    get.assert_called_with(url, headers={}, timeout=DEFAULT_TIMEOUT)
+
+    assert zmon.get_check_definitions() == [1, 2]
+    get.assert_called_with(url, headers=conditional, timeout=DEFAULT_TIMEOUT)
+    not_modified.json.assert_not_called()
+
+
+def test_zmon_get_alert_definitions_cached_ttl(monkeypatch, tmpdir):
+    get = MagicMock()
+    get.return_value.status_code = 200
+    get.return_value.headers = {}
+    get.return_value.json.return_value = {'alert_definitions': [1]}
+
+    monkeypatch.setattr('requests.Session.get', get)
+    monkeypatch.setattr('requests.Session.delete', MagicMock())
+
+    zmon = Zmon(URL, token=TOKEN, response_cache=ResponseCache(path=str(tmpdir), ttl=60))
+
+    assert zmon.get_alert_definitions() == [1]
+    assert zmon.get_alert_definitions() == [1]
+    assert get.call_count == 1
+
+    # no validators and expired
+    zmon.response_cache.ttl = 0
+    zmon.get_alert_definitions()
+    assert get.call_count == 2
+
+    # changing alert definitions invalidates the cache
+    zmon.response_cache.ttl = 60
+    zmon.delete_alert_definition(1)
+    zmon.get_alert_definitions()
+    assert get.call_count == 3
+
+
 @pytest.mark.parametrize('c,skip,result', [
     (
         {'id': '2', 'owning_team': 'Zmon', 'command': 'return True'},
@@ -336,6 +666,31 @@ def test_zmon_update_check_defintion(monkeypatch, c, skip, result):
         post.assert_called_with(zmon.endpoint(client.CHECK_DEF), json=c, timeout=DEFAULT_TIMEOUT)
 
 
+@pytest.mark.parametrize('parallel_min', [1000, 1])
+def test_zmon_validate_check_commands(monkeypatch, tmpdir, parallel_min):
+    monkeypatch.setattr('zmon_cli.client.PARALLEL_VALIDATION_MIN', parallel_min)
+
+    sources = ['http("x").code()', 'def (', 'http("x").code()', 'entity["id"]']
+    cache = CheckValidationCache(path=str(tmpdir))
+
+    errors = Zmon.validate_check_commands(sources, cache=cache, processes=2)
+
+    assert errors[0] is None and errors[2] is None and errors[3] is None
+    assert 'invalid syntax' in errors[1]
+
+    # second run is answered from the persisted cache
+    parse = MagicMock()
+    monkeypatch.setattr('ast.parse', parse)
+
+    cached = Zmon.validate_check_commands(sources, cache=CheckValidationCache(path=str(tmpdir)))
+
+    assert cached == errors
+    parse.assert_not_called()
+
+    Zmon.validate_check_commands(['x + 1'], cache=cache, processes=1)
+    parse.assert_called_once_with('x + 1')
+
+
 @pytest.mark.parametrize('result', [True, False])
 def test_zmon_delete_check_definition(monkeypatch, result):
     delete = MagicMock()
@@ -386,6 +741,42 @@ def test_zmon_get_alert_defintions(monkeypatch, resp, result):
     get.assert_called_with(zmon.endpoint(client.ACTIVE_ALERT_DEF), timeout=DEFAULT_TIMEOUT)
 
 
+def test_zmon_get_alert_definitions_with_checks(monkeypatch):
+    def json_response(url, **kwargs):
+        resp = MagicMock()
+        if client.ACTIVE_ALERT_DEF in url:
+            resp.json.return_value = {'alert_definitions': [
+                {'id': 1, 'check_definition_id': 10, 'name': 'a-1'},
+                {'id': 2, 'check_definition_id': 11, 'name': 'a-2'},
+                {'id': 3, 'check_definition_id': 99, 'name': 'a-3'},
+            ]}
+        else:
+            resp.json.return_value = {'check_definitions': [
+                {'id': 10, 'name': 'c-10', 'owning_team': 'zmon', 'interval': 60},
+                {'id': 11, 'name': 'c-11', 'owning_team': 'stups', 'interval': 30},
+            ]}
+        return resp
+
+    get = MagicMock(side_effect=json_response)
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    alerts = zmon.get_alert_definitions_with_checks()
+
+    assert get.call_count == 2
+    assert [(a['id'], a['check_name'], a['check_owning_team'], a['check_interval']) for a in alerts] == [
+        (1, 'c-10', 'zmon', 60),
+        (2, 'c-11', 'stups', 30),
+        (3, None, None, None),
+    ]
+
+    alerts = zmon.get_alert_definitions_with_checks("check_owning_team == 'stups'")
+
+    assert [a['id'] for a in alerts] == [2]
+
+
 @pytest.mark.parametrize('a,result', [
     (
         {'check_definition_id': '4545', 'last_modified_by': 'user1'},
@@ -502,6 +893,24 @@ def test_zmon_alert_data(monkeypatch):
     get.assert_called_with(zmon.endpoint(client.ALERT_DATA, 1, 'all-entities'), timeout=DEFAULT_TIMEOUT)
 
 
+def test_zmon_iter_alert_data(monkeypatch):
+    result = [{'entity': 'e-{}'.format(i), 'results': [{'value': i, 'ts': 1}]} for i in range(100)]
+    body = json.dumps(result).encode('utf-8')
+
+    get = MagicMock()
+    get.return_value.encoding = None
+    get.return_value.iter_content.return_value = (body[i:i + 11] for i in range(0, len(body), 11))
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    assert list(zmon.iter_alert_data(1)) == result
+
+    get.assert_called_with(zmon.endpoint(client.ALERT_DATA, 1, 'all-entities'), timeout=DEFAULT_TIMEOUT,
+                           stream=True)
+
+
 def test_zmon_search(monkeypatch):
     get = MagicMock()
     result = {'alerts': []}
@@ -787,3 +1196,186 @@ def test_zmon_set_name(monkeypatch):
 
     put.assert_called_with(
         zmon.endpoint(client.GROUPS, 'user1@something', client.PHONE, 'user1'), timeout=DEFAULT_TIMEOUT)
+
+
+def test_zmon_thread_sessions():
+    zmon = Zmon(URL, username='user', password='pass', verify=False, pool_maxsize=4)
+
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(zmon.session))
+    thread.start()
+    thread.join()
+
+    session = sessions[0]
+
+    assert session is not zmon.session
+    assert session.auth == ('user', 'pass')
+    assert session.verify is False
+    assert session.headers['User-Agent'] == zmon.user_agent
+    assert session.get_adapter(URL) is zmon.session.get_adapter(URL)
+
+    zmon.ensure_pool_size(2)
+    assert zmon.pool_maxsize == 4
+
+    adapter = zmon.session.get_adapter(URL)
+    zmon.ensure_pool_size(16)
+
+    assert zmon.pool_maxsize == 16
+    assert zmon.session.get_adapter(URL) is not adapter
+    assert zmon.session.get_adapter(URL)._pool_maxsize == 16
+
+
+def test_zmon_thread_sessions_follow_changes():
+    zmon = Zmon(URL, token=TOKEN)
+
+    in_thread = ThreadPoolExecutor(max_workers=1)
+    session = in_thread.submit(lambda: zmon.session).result()
+
+    zmon.session.headers['Authorization'] = 'Bearer 456'
+    zmon.session.cookies.set('c', 'v')
+    zmon.session.auth = ('user', 'pass')
+
+    assert in_thread.submit(lambda: zmon.session).result() is session
+    assert session.headers['Authorization'] == 'Bearer 456'
+    assert session.cookies.get('c') == 'v'
+    assert session.auth == ('user', 'pass')
+
+    in_thread.shutdown()
+
+
+class StubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+@contextlib.contextmanager
+def stub_server(respond):
+    """Local keep-alive HTTP server answering every request with ``respond(handler)``, a (status, headers) tuple."""
+    received = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def handle_request(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            self.body = self.rfile.read(length) if length else b''
+            received.append(self)
+
+            status, headers = respond(self)
+            body = b'{}'
+
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_PUT = do_POST = handle_request
+
+        def log_message(self, *args):
+            pass
+
+    server = StubServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_address[1]), received
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_zmon_connection_pool():
+    with stub_server(lambda handler: (200, {})) as (url, received):
+        zmon = Zmon(url, token=TOKEN, pool_maxsize=8, pool_block=True)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: zmon.status(), range(200)))
+
+    assert results == [{}] * 200
+    assert len(received) == 200
+    assert len({r.client_address[1] for r in received}) <= 8
+
+
+@pytest.mark.parametrize('header,expected', [
+    (None, None),
+    ('7', 7),
+    ('soon', None),
+    ('Wed, 21 Oct 2015 07:28:00 GMT', 0),
+])
+def test_retry_after(header, expected):
+    resp = requests.Response()
+    if header:
+        resp.headers['Retry-After'] = header
+
+    assert client.retry_after(resp) == expected
+
+
+def test_zmon_retry():
+    statuses = [429, 503, 200, 503, 503, 503]
+
+    def respond(handler):
+        status = statuses.pop(0)
+        return status, {'Retry-After': '0'} if status == 429 else {}
+
+    with stub_server(respond) as (url, received):
+        zmon = Zmon(url, token=TOKEN, retries=2, retry_backoff=0.001)
+
+        resp = zmon.add_entity({'id': 'e-1', 'type': 'instance'})
+        assert resp.status_code == 200
+        assert [json.loads(r.body.decode())['id'] for r in received] == ['e-1'] * 3
+
+        with pytest.raises(HTTPError) as e:
+            zmon.status()
+        assert e.value.response.status_code == 503
+
+    assert len(received) == 6
+    # rejected requests do not close the keep-alive connection
+    assert len({r.client_address[1] for r in received}) == 1
+
+
+@pytest.mark.parametrize('status,headers,sent', [
+    (503, {}, 1),
+    (503, {'Retry-After': '0'}, 2),
+    (429, {}, 2),
+])
+def test_zmon_retry_post(status, headers, sent):
+    statuses = [status, 200]
+
+    def respond(handler):
+        status = statuses.pop(0)
+        return status, headers if status != 200 else {}
+
+    with stub_server(respond) as (url, received):
+        zmon = Zmon(url, token=TOKEN, retries=2, retry_backoff=0.001)
+
+        if sent == 1:
+            with pytest.raises(HTTPError):
+                zmon.get_onetime_token()
+        else:
+            assert zmon.get_onetime_token() == '{}'
+
+    assert [r.command for r in received] == ['POST'] * sent
+
+
+def test_zmon_retry_after_exceeding_max_backoff():
+    with stub_server(lambda handler: (429, {'Retry-After': '120'})) as (url, received):
+        zmon = Zmon(url, token=TOKEN, max_retry_backoff=30)
+
+        with pytest.raises(HTTPError):
+            zmon.status()
+
+    assert len(received) == 1
+
+
+def test_zmon_rate_limit():
+    with stub_server(lambda handler: (200, {})) as (url, received):
+        zmon = Zmon(url, token=TOKEN, rate_limit=20)
+
+        started = time.monotonic()
+        for _ in range(25):
+            zmon.status()
+
+    # burst of 20 requests, then 20 requests per second
+    assert time.monotonic() - started >= 0.24
@@ -0,0 +1,549 @@
+"""
+Asyncio ZMON client.
+
+:class:`AsyncZmon` has the same methods as :class:`zmon_cli.client.Zmon`, as coroutines. It requires the optional
+``aiohttp`` package, installed with the ``async`` extra, e.g. ``pip3 install zmon-cli[async]``.
+
+Example:
+
+.. code-block:: python
+
+    async with AsyncZmon('https://zmon.example.org', token=token, max_connections=50) as zmon:
+        alerts = await zmon.get_alert_definitions()
+        data = await asyncio.gather(*(zmon.get_alert_data(alert['id']) for alert in alerts))
+"""
+import asyncio
+import functools
+import json
+import logging
+
+import requests
+
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from zmon_cli.bulk import BulkResult
+from zmon_cli.client import ZmonBase, JSONDateEncoder, ZMON_USER_AGENT, join_alerts_with_checks
+from zmon_cli.client import ACTIVE_ALERT_DEF, ACTIVE_CHECK_DEF, ALERT_DATA, ALERT_DEF, CHECK_DEF, DASHBOARD, DOWNTIME
+from zmon_cli.client import ENTITIES, GRAFANA, GROUPS, MEMBER, PHONE, SEARCH, STATUS, TOKENS
+from zmon_cli.config import DEFAULT_TIMEOUT
+from zmon_cli.filters import filter_definitions
+
+
+DEFAULT_MAX_CONNECTIONS = 100
+
+logger = logging.getLogger(__name__)
+
+
+def logged(f):
+    @functools.wraps(f)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await f(*args, **kwargs)
+        except Exception:
+            logger.error('ZMON client failed in: {}'.format(f.__name__))
+            raise
+
+    return wrapper
+
+
+async def gather_bulk(func, items, concurrency=1) -> list:
+    """
+    Await ``func`` for every item, at most ``concurrency`` at a time. Asyncio counterpart of
+    :func:`zmon_cli.bulk.run_bulk`.
+
+    :return: List of :class:`zmon_cli.bulk.BulkResult` in the order of ``items``, with either ``result`` or ``error``
+             set.
+    :rtype: list
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def call(item):
+        async with semaphore:
+            try:
+                return BulkResult(item, await func(item), None)
+            except Exception as e:
+                logger.debug('Bulk call failed for item {}: {}'.format(item, e))
+                return BulkResult(item, None, e)
+
+    return await asyncio.gather(*(call(item) for item in items))
+
+
+def _response(resp, content: bytes) -> requests.Response:
+    # wrap the read aiohttp response, so callers handle errors and bodies the same way for both clients
+    response = requests.Response()
+    response.status_code = resp.status
+    response.reason = resp.reason
+    response.url = str(resp.url)
+    response.headers = CaseInsensitiveDict(resp.headers)
+    response.encoding = resp.charset
+    response._content = content
+    return response
+
+
+class AsyncZmon(ZmonBase):
+    """
+    Asyncio ZMON client, see :class:`zmon_cli.client.Zmon` for the methods.
+
+    Requests are sent over a pooled ``aiohttp`` session, created on first use. Close it with :meth:`close`, or use
+    the client as an async context manager. Failed requests raise :class:`requests.HTTPError`, and returned
+    responses are :class:`requests.Response` objects, like in the synchronous client.
+
+    :param url: ZMON backend base url.
+    :type url: str
+
+    :param token: ZMON authentication token.
+    :type token: str
+
+    :param username: ZMON authentication username. Ignored if ``token`` is used.
+    :type username: str
+
+    :param password: ZMON authentication password. Ignored if ``token`` is used.
+    :type password: str
+
+    :param timeout: HTTP requests timeout. Default is 10 sec.
+    :type timeout: int
+
+    :param verify: Verify SSL connection. Default is ``True``.
+    :type verify: bool
+
+    :param user_agent: ZMON user agent. Default is generated by ZMON client and includes lib version.
+    :type user_agent: str
+
+    :param max_connections: Maximum number of open connections. Default is 100.
+    :type max_connections: int
+
+    :param max_connections_per_host: Maximum number of open connections per host. Default is 0, i.e. no limit.
+    :type max_connections_per_host: int
+
+    The streaming methods ``iter_entities`` and ``iter_alert_data`` of the synchronous client are not available, as
+    async generators require Python 3.6. Use :meth:`get_entities`, :meth:`get_alert_data` and :func:`gather_bulk`
+    instead. Tracing and the entity and response caches of the synchronous client are not supported either.
+    """
+
+    def __init__(
+            self, url, token=None, username=None, password=None, timeout=DEFAULT_TIMEOUT, verify=True,
+            user_agent=ZMON_USER_AGENT, max_connections=DEFAULT_MAX_CONNECTIONS, max_connections_per_host=0):
+        """Initialize async ZMON client."""
+        if aiohttp is None:
+            raise ImportError('AsyncZmon requires the aiohttp package')
+
+        super().__init__(url)
+
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+
+        self._verify = verify
+        self._session = None
+
+        self._headers = {'User-Agent': user_agent, 'Content-Type': 'application/json'}
+        self._auth = None
+
+        if username and password and token is None:
+            self._auth = aiohttp.BasicAuth(username, password)
+
+        if token:
+            self._headers['Authorization'] = 'Bearer {}'.format(token)
+
+        if not verify:
+            logger.warning('ZMON client will skip SSL verification!')
+
+    @property
+    def session(self):
+        """The pooled ``aiohttp.ClientSession``, must be used from within the event loop running the requests."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections, limit_per_host=self.max_connections_per_host,
+                ssl=None if self._verify else False)
+
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=self._headers, auth=self._auth,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        return self._session
+
+    async def close(self):
+        """Close the HTTP session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def configure_pool(self, max_connections=None, max_connections_per_host=None):
+        """
+        Change the connection limits. Arguments which are not set keep their current value. The current session is
+        closed, the next request opens a new one.
+
+        :param max_connections: Maximum number of open connections, 0 for no limit.
+        :type max_connections: int
+
+        :param max_connections_per_host: Maximum number of open connections per host, 0 for no limit.
+        :type max_connections_per_host: int
+        """
+        if max_connections is not None:
+            self.max_connections = max_connections
+        if max_connections_per_host is not None:
+            self.max_connections_per_host = max_connections_per_host
+
+        await self.close()
+
+    async def ensure_pool_size(self, maxsize):
+        """Raise the connection limit to at least ``maxsize`` connections, e.g. the concurrency of a bulk operation."""
+        if self.max_connections and maxsize > self.max_connections:
+            await self.configure_pool(max_connections=maxsize)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def request(self, method, url, params=None, **kwargs) -> requests.Response:
+        """
+        Send a HTTP request and read the complete response.
+
+        :return: Response object.
+        :rtype: :class:`requests.Response`
+        """
+        if params:
+            params = {k: str(v) for k, v in params.items()}
+
+        async with self.session.request(method, url, params=params, **kwargs) as resp:
+            content = await resp.read()
+
+        return _response(resp, content)
+
+    @logged
+    async def status(self) -> dict:
+        resp = await self.request('GET', self.endpoint(STATUS))
+
+        return self.json(resp)
+
+########################################################################################################################
+# ENTITIES
+########################################################################################################################
+
+    @logged
+    async def get_entities(self, query=None) -> list:
+        query_str = json.dumps(query) if query else ''
+        logger.debug('Retrieving entities with query: {} ...'.format(query_str))
+
+        params = {'query': query_str} if query else None
+
+        resp = await self.request('GET', self.endpoint(ENTITIES), params=params)
+
+        return self.json(resp)
+
+    @logged
+    async def get_entity(self, entity_id: str) -> dict:
+        logger.debug('Retrieving entities with id: {} ...'.format(entity_id))
+
+        resp = await self.request('GET', self.endpoint(ENTITIES, entity_id, trailing_slash=False))
+
+        return self.json(resp)
+
+    @logged
+    async def add_entity(self, entity: dict) -> requests.Response:
+        self._validate_entity(entity)
+
+        logger.debug('Adding new entity: {} ...'.format(entity['id']))
+
+        data = json.dumps(entity, cls=JSONDateEncoder)
+        resp = await self.request('PUT', self.endpoint(ENTITIES, trailing_slash=False), data=data)
+
+        resp.raise_for_status()
+
+        return resp
+
+    @logged
+    async def delete_entity(self, entity_id: str) -> bool:
+        logger.debug('Removing existing entity: {} ...'.format(entity_id))
+
+        resp = await self.request('DELETE', self.endpoint(ENTITIES, entity_id))
+
+        resp.raise_for_status()
+
+        return resp.text == '1'
+
+    @logged
+    async def sync_entities(self, entities: list, entity_type: str, query=None, delete=False, dry_run=False,
+                            concurrency=1):
+        desired = self._desired_entities(entities, entity_type)
+
+        query = dict(query or {}, type=entity_type)
+        remote = {e['id']: e for e in await self.get_entities(query=query)}
+
+        report, to_push, to_delete = self._plan_entity_sync(desired, remote, delete)
+
+        logger.debug('Syncing entities of type {}: {}'.format(entity_type, report.counts))
+
+        if dry_run:
+            report.deleted.extend(to_delete)
+            return report
+
+        self._record_pushed(report, await gather_bulk(self.add_entity, to_push, concurrency=concurrency))
+        self._record_deleted(report, await gather_bulk(self.delete_entity, to_delete, concurrency=concurrency))
+
+        return report
+
+########################################################################################################################
+# DASHBOARD
+########################################################################################################################
+
+    @logged
+    async def get_dashboards(self) -> list:
+        resp = await self.request('GET', self.endpoint(DASHBOARD))
+
+        return self.json(resp)
+
+    @logged
+    async def get_dashboard(self, dashboard_id: str) -> dict:
+        resp = await self.request('GET', self.endpoint(DASHBOARD, dashboard_id))
+
+        return self.json(resp)
+
+    @logged
+    async def update_dashboard(self, dashboard: dict) -> dict:
+        if 'id' in dashboard and dashboard['id']:
+            logger.debug('Updating dashboard with ID: {} ...'.format(dashboard['id']))
+            resp = await self.request('POST', self.endpoint(DASHBOARD, dashboard['id']), json=dashboard)
+        else:
+            # new dashboard
+            logger.debug('Adding new dashboard ...')
+            resp = await self.request('POST', self.endpoint(DASHBOARD), json=dashboard)
+
+        resp.raise_for_status()
+
+        return self.json(resp)
+
+########################################################################################################################
+# CHECK-DEFS
+########################################################################################################################
+
+    @logged
+    async def get_check_definition(self, definition_id: int) -> dict:
+        resp = await self.request('GET', self.endpoint(CHECK_DEF, definition_id))
+
+        # TODO: total hack! API returns 200 if check def does not exist!
+        if resp.text == '':
+            resp.status_code = 404
+            resp.reason = 'Not Found'
+
+        return self.json(resp)
+
+    @logged
+    async def get_check_definitions(self, expression=None) -> list:
+        resp = await self.request('GET', self.endpoint(ACTIVE_CHECK_DEF))
+
+        definitions = self.json(resp).get('check_definitions')
+
+        if expression:
+            definitions = list(filter_definitions(definitions, expression))
+
+        return definitions
+
+    @logged
+    async def update_check_definition(self, check_definition, skip_validation=False) -> dict:
+        self._prepare_check_definition(check_definition, skip_validation=skip_validation)
+
+        resp = await self.request('POST', self.endpoint(CHECK_DEF), json=check_definition)
+
+        return self.json(resp)
+
+    @logged
+    async def delete_check_definition(self, check_definition_id: int) -> requests.Response:
+        resp = await self.request('DELETE', self.endpoint(CHECK_DEF, check_definition_id))
+
+        resp.raise_for_status()
+
+        return resp
+
+########################################################################################################################
+# ALERT-DEFS & DATA
+########################################################################################################################
+
+    @logged
+    async def get_alert_definition(self, alert_id: int) -> dict:
+        resp = await self.request('GET', self.endpoint(ALERT_DEF, alert_id))
+
+        return self.json(resp)
+
+    @logged
+    async def get_alert_definitions(self, expression=None) -> list:
+        resp = await self.request('GET', self.endpoint(ACTIVE_ALERT_DEF))
+
+        definitions = self.json(resp).get('alert_definitions')
+
+        if expression:
+            definitions = list(filter_definitions(definitions, expression))
+
+        return definitions
+
+    async def get_alert_definitions_with_checks(self, expression=None) -> list:
+        alerts, checks = await asyncio.gather(self.get_alert_definitions(), self.get_check_definitions())
+
+        alerts = join_alerts_with_checks(alerts, checks)
+
+        if expression:
+            alerts = list(filter_definitions(alerts, expression))
+
+        return alerts
+
+    @logged
+    async def create_alert_definition(self, alert_definition: dict) -> dict:
+        self._prepare_alert_definition(alert_definition)
+
+        resp = await self.request('POST', self.endpoint(ALERT_DEF), json=alert_definition)
+
+        return self.json(resp)
+
+    @logged
+    async def update_alert_definition(self, alert_definition: dict) -> dict:
+        self._prepare_alert_definition(alert_definition, update=True)
+
+        resp = await self.request('PUT', self.endpoint(ALERT_DEF, alert_definition['id']), json=alert_definition)
+
+        return self.json(resp)
+
+    @logged
+    async def delete_alert_definition(self, alert_definition_id: int) -> dict:
+        resp = await self.request('DELETE', self.endpoint(ALERT_DEF, alert_definition_id))
+
+        return self.json(resp)
+
+    @logged
+    async def get_alert_data(self, alert_id: int) -> dict:
+        resp = await self.request('GET', self.endpoint(ALERT_DATA, alert_id, 'all-entities'))
+
+        return self.json(resp)
+
+########################################################################################################################
+# SEARCH
+########################################################################################################################
+
+    @logged
+    async def search(self, q, limit=None, teams=None) -> dict:
+        params = self._search_params(q, limit=limit, teams=teams)
+
+        resp = await self.request('GET', self.endpoint(SEARCH), params=params)
+
+        return self.json(resp)
+
+########################################################################################################################
+# ONETIME-TOKENS
+########################################################################################################################
+
+    @logged
+    async def list_onetime_tokens(self) -> list:
+        resp = await self.request('GET', self.endpoint(TOKENS))
+
+        return self.json(resp)
+
+    @logged
+    async def get_onetime_token(self) -> str:
+        resp = await self.request('POST', self.endpoint(TOKENS), json={})
+
+        resp.raise_for_status()
+
+        return resp.text
+
+########################################################################################################################
+# GRAFANA
+########################################################################################################################
+
+    @logged
+    async def get_grafana_dashboard(self, grafana_dashboard_uid: str) -> dict:
+        resp = await self.request('GET', self.endpoint(GRAFANA, grafana_dashboard_uid, trailing_slash=False))
+
+        return self.json(resp)
+
+    @logged
+    async def update_grafana_dashboard(self, grafana_dashboard: dict) -> dict:
+        self._validate_grafana_dashboard(grafana_dashboard)
+
+        resp = await self.request('POST', self.endpoint(GRAFANA), json=json.dumps(grafana_dashboard))
+
+        return self.json(resp)
+
+########################################################################################################################
+# DOWNTIMES
+########################################################################################################################
+
+    @logged
+    async def create_downtime(self, downtime: dict) -> dict:
+        self._validate_downtime(downtime)
+
+        resp = await self.request('POST', self.endpoint(DOWNTIME), json=downtime)
+
+        return self.json(resp)
+
+########################################################################################################################
+# GROUPS - MEMBERS
+########################################################################################################################
+
+    @logged
+    async def get_groups(self):
+        resp = await self.request('GET', self.endpoint(GROUPS))
+
+        return self.json(resp)
+
+    @logged
+    async def switch_active_user(self, group_name, user_name):
+        resp = await self.request('DELETE', self.endpoint(GROUPS, group_name, 'active'))
+        if not resp.ok:
+            logger.error('Failed to de-activate group: {}'.format(group_name))
+            resp.raise_for_status()
+
+        logger.debug('Switching active user: {}'.format(user_name))
+
+        resp = await self.request('PUT', self.endpoint(GROUPS, group_name, 'active', user_name))
+        if not resp.ok:
+            logger.error('Failed to switch active user {}'.format(user_name))
+            resp.raise_for_status()
+
+        return resp.text == '1'
+
+    @logged
+    async def add_member(self, group_name, user_name):
+        resp = await self.request('PUT', self.endpoint(GROUPS, group_name, MEMBER, user_name))
+
+        resp.raise_for_status()
+
+        return resp.text == '1'
+
+    @logged
+    async def remove_member(self, group_name, user_name):
+        resp = await self.request('DELETE', self.endpoint(GROUPS, group_name, MEMBER, user_name))
+
+        resp.raise_for_status()
+
+        return resp.text == '1'
+
+    @logged
+    async def add_phone(self, member_email, phone_nr):
+        resp = await self.request('PUT', self.endpoint(GROUPS, member_email, PHONE, phone_nr))
+
+        resp.raise_for_status()
+
+        return resp.text == '1'
+
+    @logged
+    async def remove_phone(self, member_email, phone_nr):
+        resp = await self.request('DELETE', self.endpoint(GROUPS, member_email, PHONE, phone_nr))
+
+        resp.raise_for_status()
+
+        return resp.text == '1'
+
+    @logged
+    async def set_name(self, member_email, member_name):
+        resp = await self.request('PUT', self.endpoint(GROUPS, member_email, PHONE, member_name))
+
+        resp.raise_for_status()
+
+        return resp
@@ -0,0 +1,328 @@
+import time
+import logging
+import threading
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+BulkResult = namedtuple('BulkResult', 'item result error')
+
+# responses of an overloaded backend, which did not process the request
+OVERLOAD_STATUSES = (429, 503)
+
+DEFAULT_AIMD_BACKOFF = 0.5
+DEFAULT_AIMD_LATENCY_FACTOR = 2.0
+
+# client side waits and overload responses of the call running in the current thread, see run_bulk()
+_call_stats = threading.local()
+
+_CallOutcome = namedtuple('_CallOutcome', 'result error latency overloaded')
+
+
+def client_wait(seconds):
+    """
+    Sleep ``seconds`` on the client side, e.g. for a rate limit or a retry backoff.
+
+    The time is not counted in the latency of the bulk call running in the current thread.
+    """
+    if seconds > 0:
+        time.sleep(seconds)
+        _call_stats.waited = getattr(_call_stats, 'waited', 0.0) + seconds
+
+
+def note_overload():
+    """Mark the bulk call running in the current thread as overloaded, e.g. on a retried response with status 429."""
+    _call_stats.overloaded = True
+
+
+def _measured_call(func, item):
+    _call_stats.waited = 0.0
+    _call_stats.overloaded = False
+
+    started = time.monotonic()
+    try:
+        result, error = func(item), None
+    except Exception as e:
+        result, error = None, e
+
+    latency = max(0.0, time.monotonic() - started - _call_stats.waited)
+
+    return _CallOutcome(result, error, latency, _call_stats.overloaded)
+
+
+def is_overload_error(e):
+    """
+    Whether the exception ``e`` of a call signals an overloaded backend.
+
+    :param e: Exception raised by a call.
+    :type e: Exception
+
+    :return: ``True`` for HTTP errors with status 429 or 503, and for connection errors or timeouts.
+    :rtype: bool
+    """
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code in OVERLOAD_STATUSES
+
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting calls to ``rate`` per second, allowing bursts of up to ``burst`` calls.
+
+    :param rate: Calls per second.
+    :type rate: float
+
+    :param burst: Maximum number of calls without waiting, after the bucket was idle. Default is ``rate``, at least 1.
+    :type burst: float
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('Rate must be positive: {}'.format(rate))
+
+        self.rate = float(rate)
+        self.burst = max(1.0, float(rate if burst is None else burst))
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available.
+
+        Tokens are reserved under the lock and waited for outside of it, so waiting threads are served in order.
+
+        :return: Seconds waited.
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            delay = max(-self._tokens / self.rate, self._resume_at - now, 0.0)
+
+        client_wait(delay)
+
+        return delay
+
+    def pause(self, seconds):
+        """Make all calls wait at least ``seconds`` from now, e.g. as requested by a ``Retry-After`` header."""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+class AIMDLimit:
+    """
+    Concurrency limit adapted with additive increase and multiplicative decrease (AIMD).
+
+    The limit grows by one after a round of ``limit`` healthy calls. It is multiplied by ``backoff`` after a call
+    failing with an overload error (see :func:`is_overload_error`), or when the smoothed latency exceeds
+    ``latency_factor`` times the baseline latency, at most once per round. The smoothed latency follows the last few
+    calls, the baseline is a much slower moving average of the last hundred or so, so it adapts to a backend whose
+    latency changes or is noisy instead of sticking to a single fast call.
+
+    >>> limit = AIMDLimit(8, initial=4)
+    >>> for _ in range(4):
+    ...     limit.record(0.1)
+    >>> limit.current
+    5
+    >>> limit.record(0.1, error=requests.Timeout())
+    >>> limit.current
+    2
+
+    :param maximum: Maximum concurrency.
+    :type maximum: int
+
+    :param initial: Initial concurrency. Default is 1.
+    :type initial: int
+
+    :param minimum: Minimum concurrency. Default is 1.
+    :type minimum: int
+
+    :param backoff: Factor applied to the limit on overload. Default is 0.5.
+    :type backoff: float
+
+    :param latency_factor: Latency increase over the baseline latency considered an overload. Default is 2.
+    :type latency_factor: float
+    """
+
+    def __init__(self, maximum, initial=1, minimum=1, backoff=DEFAULT_AIMD_BACKOFF,
+                 latency_factor=DEFAULT_AIMD_LATENCY_FACTOR):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+
+        self.limit = float(max(self.minimum, min(initial, self.maximum)))
+
+        self.latency = None
+        self.baseline_latency = None
+
+        self._round = 0
+
+    @property
+    def current(self):
+        """Number of calls allowed in flight."""
+        return int(self.limit)
+
+    def record(self, latency, error=None, overloaded=False):
+        """
+        Adapt the limit to the outcome of a call.
+
+        :param latency: Seconds the call took, without client side waits.
+        :type latency: float
+
+        :param error: Exception raised by the call, if any. Errors which do not signal an overload leave the limit
+                      unchanged.
+        :type error: Exception
+
+        :param overloaded: Whether the call succeeded only after retrying overload responses. Default is ``False``.
+        :type overloaded: bool
+        """
+        self._round += 1
+
+        if overloaded:
+            self._decrease('retried overload response')
+            return
+
+        if error is not None:
+            if is_overload_error(error):
+                self._decrease('{}'.format(error))
+            return
+
+        # exponentially weighted moving averages, a short one smoothing the latency of single calls and a long one
+        if self.latency is None:
+            self.latency = self.baseline_latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+            self.baseline_latency = 0.99 * self.baseline_latency + 0.01 * latency
+
+        if self.latency > self.latency_factor * self.baseline_latency:
+            self._decrease('latency {:.3f}s'.format(self.latency))
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.current)
+
+    def _decrease(self, reason):
+        if self._round < self.current:
+            # outcomes of calls started before the last decrease
+            return
+
+        self._round = 0
+        self.limit = max(self.minimum, self.limit * self.backoff)
+
+        logger.debug('Decreased bulk concurrency to {} on overload: {}'.format(self.current, reason))
+
+
+def run_bulk(func, items, concurrency=1, adaptive=False):
+    """
+    Call ``func`` for every item using a pool of ``concurrency`` worker threads.
+
+    Items are consumed lazily and at most ``2 * concurrency`` calls are in flight at any time, so ``items`` can be a
+    generator over an arbitrarily large input. Results are yielded in completion order.
+
+    In ``adaptive`` mode, the number of calls in flight starts at 1 and is adapted by :class:`AIMDLimit` up to
+    ``concurrency``, converging on the capacity of the backend. The latency of a call is measured in its worker
+    thread, without the time the consumer of the results takes and without :func:`client_wait` sleeps.
+
+    :param func: Callable accepting a single item.
+    :type func: callable
+
+    :param items: Iterable of items.
+    :type items: iterable
+
+    :param concurrency: Number of worker threads. Default is 1.
+    :type concurrency: int
+
+    :param adaptive: Adapt the number of calls in flight to the latency and overload errors of calls, either
+                     ``True`` or the :class:`AIMDLimit` to use. Default is ``False``.
+    :type adaptive: bool
+
+    :return: Generator of :class:`BulkResult`, with either ``result`` or ``error`` set.
+    :rtype: generator
+    """
+    concurrency = max(1, concurrency)
+    limit = adaptive if isinstance(adaptive, AIMDLimit) else AIMDLimit(concurrency) if adaptive else None
+
+    items = iter(items)
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        exhausted = False
+
+        while True:
+            window = 2 * concurrency if limit is None else limit.current
+
+            while not exhausted and len(pending) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                if limit is None:
+                    pending[executor.submit(func, item)] = item
+                else:
+                    pending[executor.submit(_measured_call, func, item)] = item
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = BulkResult(item, None, e)
+                else:
+                    if limit is None:
+                        result = BulkResult(item, result, None)
+                    else:
+                        limit.record(result.latency, result.error, overloaded=result.overloaded)
+                        result = BulkResult(item, result.result, result.error)
+
+                if result.error is not None:
+                    logger.debug('Bulk call failed for item {}: {}'.format(item, result.error))
+
+                yield result
+
+
+class BulkSummary:
+    """Collects per-item outcomes of a bulk operation and computes throughput."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.succeeded = 0
+        self.failures = []
+
+    def add(self, name, error=None):
+        if error is None:
+            self.succeeded += 1
+        else:
+            self.failures.append((name, error))
+
+    @property
+    def total(self):
+        return self.succeeded + len(self.failures)
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def throughput(self):
+        elapsed = self.elapsed
+        return self.total / elapsed if elapsed > 0 else 0.0
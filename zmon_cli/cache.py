@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_DIR = '~/.cache/zmon-cli'
+DEFAULT_ENTITY_CACHE_TTL = 300
+DEFAULT_RESPONSE_CACHE_TTL = 60
+
+# oldest check validation results are dropped beyond this number of entries
+CHECK_VALIDATION_CACHE_SIZE = 100000
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_dir():
+    """Return the ZMON CLI cache directory, honoring ``XDG_CACHE_HOME``."""
+    xdg_cache = os.environ.get('XDG_CACHE_HOME')
+    if xdg_cache:
+        return os.path.join(xdg_cache, 'zmon-cli')
+
+    return os.path.expanduser(DEFAULT_CACHE_DIR)
+
+
+def write_atomic(path, data: bytes, mode=None):
+    """
+    Write ``data`` to ``path`` atomically, readable by the current user only unless a file ``mode`` is given.
+    Missing directories are created readable by the current user only.
+    """
+    directory = os.path.dirname(path) or os.curdir
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+class EntityCache:
+    """
+    On-disk cache of the complete entity list of a ZMON installation.
+
+    :param path: Cache directory. Default is :func:`zmon_cli.cache.get_cache_dir`.
+    :type path: str
+
+    :param ttl: Seconds a cached entity list is considered fresh. ``0`` forces a refresh on every read.
+    :type ttl: int
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_ENTITY_CACHE_TTL):
+        self.path = path or get_cache_dir()
+        self.ttl = ttl
+
+    def _file(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.path, 'entities-{}.json'.format(key))
+
+    def get(self, url):
+        """
+        Return cached entities of ZMON ``url``, or ``None`` if missing or expired.
+
+        :rtype: list
+        """
+        if self.ttl <= 0:
+            return None
+
+        try:
+            with open(self._file(url), 'rb') as f:
+                data = json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception('Failed to read entity cache for {}'.format(url))
+            return None
+
+        if data.get('url') != url or time.time() - data.get('fetched', 0) > self.ttl:
+            return None
+
+        return data['entities']
+
+    def set(self, url, entities: list):
+        """Store the complete entity list of ZMON ``url``."""
+        data = {'url': url, 'fetched': time.time(), 'entities': entities}
+
+        try:
+            write_atomic(self._file(url), json.dumps(data).encode('utf-8'))
+        except Exception:
+            logger.exception('Failed to write entity cache for {}'.format(url))
+
+    def invalidate(self, url):
+        """Drop cached entities of ZMON ``url``."""
+        try:
+            os.unlink(self._file(url))
+        except FileNotFoundError:
+            pass
+
+
+class ResponseCache:
+    """
+    On-disk cache of JSON responses of ZMON GET endpoints, revalidated by the client.
+
+    Entries with an ``ETag`` or ``Last-Modified`` validator are revalidated with a conditional request on every read,
+    entries without validators are considered fresh for ``ttl`` seconds.
+
+    :param path: Cache directory. Default is :func:`zmon_cli.cache.get_cache_dir`.
+    :type path: str
+
+    :param ttl: Seconds a response without validators is considered fresh. ``0`` always fetches those responses.
+    :type ttl: int
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_RESPONSE_CACHE_TTL):
+        self.path = path or get_cache_dir()
+        self.ttl = ttl
+
+    def _file(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.path, 'response-{}.json'.format(key))
+
+    def get(self, url):
+        """
+        Return the cached entry of ``url`` regardless of its age, or ``None``.
+
+        :return: Dict with ``data``, ``fetched`` and the ``etag`` and ``last_modified`` validators.
+        :rtype: dict
+        """
+        try:
+            with open(self._file(url), 'rb') as f:
+                entry = json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception('Failed to read response cache for {}'.format(url))
+            return None
+
+        return entry if entry.get('url') == url else None
+
+    def is_fresh(self, entry) -> bool:
+        """Return ``True`` if ``entry`` can be used without revalidation."""
+        return self.ttl > 0 and time.time() - entry.get('fetched', 0) <= self.ttl
+
+    def set(self, url, data, etag=None, last_modified=None):
+        entry = {'url': url, 'fetched': time.time(), 'etag': etag, 'last_modified': last_modified, 'data': data}
+
+        try:
+            write_atomic(self._file(url), json.dumps(entry).encode('utf-8'))
+        except Exception:
+            logger.exception('Failed to write response cache for {}'.format(url))
+
+    def invalidate(self, url):
+        try:
+            os.unlink(self._file(url))
+        except FileNotFoundError:
+            pass
+
+
+class CheckValidationCache:
+    """
+    Persistent cache of check command syntax validation results, keyed by
+    :func:`zmon_cli.client.check_command_hash`.
+
+    :param path: Cache directory. Default is :func:`zmon_cli.cache.get_cache_dir`.
+    :type path: str
+    """
+
+    def __init__(self, path=None):
+        self.file = os.path.join(path or get_cache_dir(), 'check-validation.json')
+        self._results = None
+
+    @property
+    def results(self) -> dict:
+        if self._results is None:
+            try:
+                with open(self.file, 'rb') as f:
+                    self._results = json.loads(f.read().decode('utf-8'), object_pairs_hook=OrderedDict)
+            except FileNotFoundError:
+                self._results = OrderedDict()
+            except Exception:
+                logger.exception('Failed to read check validation cache')
+                self._results = OrderedDict()
+        return self._results
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def get(self, key):
+        """Return the cached syntax error message for ``key``, ``None`` if the command is valid."""
+        return self.results.get(key)
+
+    def set(self, key, error=None):
+        # re-insert to keep the most recently validated results when trimming
+        self.results.pop(key, None)
+        self.results[key] = error
+
+    def save(self):
+        results = self.results
+        if len(results) > CHECK_VALIDATION_CACHE_SIZE:
+            results = OrderedDict(list(results.items())[-CHECK_VALIDATION_CACHE_SIZE:])
+
+        try:
+            write_atomic(self.file, json.dumps(results).encode('utf-8'))
+        except Exception:
+            logger.exception('Failed to write check validation cache')
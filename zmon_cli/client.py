@@ -1,19 +1,33 @@
 import ast
+import codecs
+import hashlib
 import logging
 import json
+import os
 import functools
+import random
 import re
+import sys
+import threading
 import traceback
 
 import requests
 
-from datetime import datetime
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from urllib.parse import urljoin, urlsplit, urlunsplit, SplitResult
 
 from opentracing_utils import trace, extract_span_from_kwargs
 
 from zmon_cli import __version__
+from zmon_cli.bulk import run_bulk, client_wait, note_overload, TokenBucket, OVERLOAD_STATUSES
 from zmon_cli.config import DEFAULT_TIMEOUT
+from zmon_cli.filters import filter_definitions, json_equal
 
 
 API_VERSION = 'v1'
@@ -42,6 +56,30 @@ DASHBOARD_VIEW_URL = '#/dashboards/views/'
 GRAFANA_DASHBOARD_URL = 'visualization/dashboard/'
 TOKEN_LOGIN_URL = 'tv/'
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_POOL_CONNECTIONS = DEFAULT_POOLSIZE
+DEFAULT_POOL_MAXSIZE = DEFAULT_POOLSIZE
+
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_MAX_RETRY_BACKOFF = 30
+
+# methods retried on any overload status, same as the urllib3 Retry default
+IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT', 'TRACE'])
+
+# settings of the client session followed by the sessions of other threads, headers and cookies are shared objects
+SHARED_SESSION_ATTRS = ('headers', 'cookies', 'auth', 'verify', 'cert', 'proxies', 'trust_env', 'params')
+
+# types JSON encodes as scalars, values of these types hold no dict keys
+JSON_SCALAR_TYPES = frozenset([str, int, float, bool, type(None)])
+
+# bound for the translations of multi-character invalid runs, which are added on first use
+ENTITY_ID_RUN_CACHE_SIZE = 4096
+
+# below this number of uncached check commands, starting worker processes costs more than parsing serially
+PARALLEL_VALIDATION_MIN = 500
+
 logger = logging.getLogger(__name__)
 
 parentheses_re = re.compile('[(]+|[)]+')
@@ -65,6 +103,43 @@ class ZmonArgumentError(ZmonError):
     pass
 
 
+ValidEntityIds = namedtuple('ValidEntityIds', 'ids collisions')
+
+
+class SyncReport:
+    """
+    Result of syncing a desired set of objects with ZMON, e.g. by :func:`zmon_cli.client.Zmon.sync_entities`, holding
+    the affected object names per outcome. Failures are ``(name, exception)`` tuples.
+    """
+
+    def __init__(self):
+        self.unchanged = []
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.failed = []
+
+    @property
+    def counts(self) -> dict:
+        return {
+            'unchanged': len(self.unchanged),
+            'created': len(self.created),
+            'updated': len(self.updated),
+            'deleted': len(self.deleted),
+            'failed': len(self.failed),
+        }
+
+
+def traced_validation(span, validate, *args, **kwargs):
+    """Call ``validate``, marking the tracing ``span`` as failed if it raises."""
+    try:
+        return validate(*args, **kwargs)
+    except Exception:
+        span.set_tag('error', True)
+        span.log_kv({'exception': traceback.format_exc()})
+        raise
+
+
 def logged(f):
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
@@ -77,82 +152,449 @@ def logged(f):
     return wrapper
 
 
-def compare_entities(e1, e2):
-    try:
-        e1_copy = e1.copy()
-        e1_copy.pop('last_modified', None)
+def _has_non_str_keys(obj):
+    if isinstance(obj, dict):
+        for key in obj:
+            if type(key) is not str:
+                return True
+        values = obj.values()
+    else:
+        values = obj
+
+    for v in values:
+        # most values are scalars, skip them without the slower isinstance check
+        if type(v) in JSON_SCALAR_TYPES:
+            continue
+        if isinstance(v, (dict, list, tuple)) and _has_non_str_keys(v):
+            return True
+
+    return False
+
+
+_json_date_encoder = JSONDateEncoder()
+_canonical_encoder = JSONDateEncoder(sort_keys=True, separators=(',', ':'))
+
+
+def entity_fingerprint(entity: dict) -> str:
+    """
+    Return a canonical, key order independent fingerprint of an entity, ignoring ``last_modified``.
+
+    Keys and values are coerced like a JSON round-trip, i.e. ``int`` keys equal their ``str`` counterparts and
+    ``datetime`` values equal their ISO format.
+
+    >>> entity_fingerprint({'id': '1', 22: 22}) == entity_fingerprint({'22': 22, 'id': '1', 'last_modified': 1})
+    True
+
+    :raises: TypeError if the entity is not JSON serializable.
+    """
+    data = dict(entity)
+    data.pop('last_modified', None)
+
+    if _has_non_str_keys(data):
+        # sorting would fail on (or order differently with) non-string keys, normalize them first
+        data = json.loads(_json_date_encoder.encode(data))
+
+    return hashlib.sha1(_canonical_encoder.encode(data).encode('utf-8')).hexdigest()
+
+
+class EntityFingerprints:
+    """
+    Memoizes :func:`zmon_cli.client.entity_fingerprint` per entity object.
+
+    Entities are referenced for the lifetime of the cache, and must not be modified after being fingerprinted.
+    """
 
-        e2_copy = e2.copy()
-        e2_copy.pop('last_modified', None)
+    def __init__(self):
+        self._cache = {}
 
-        return (json.loads(json.dumps(e1_copy, cls=JSONDateEncoder)) ==
-                json.loads(json.dumps(e2_copy, cls=JSONDateEncoder)))
+    def __call__(self, entity: dict) -> str:
+        cached = self._cache.get(id(entity))
+        if cached is not None and cached[0] is entity:
+            return cached[1]
+
+        fingerprint = entity_fingerprint(entity)
+        self._cache[id(entity)] = (entity, fingerprint)
+
+        return fingerprint
+
+
+def compare_entities(e1, e2, fingerprint=entity_fingerprint):
+    """
+    Compare two entities, ignoring ``last_modified``.
+
+    Pass an :class:`zmon_cli.client.EntityFingerprints` instance as ``fingerprint`` to avoid re-hashing entities which
+    are compared multiple times.
+    """
+    try:
+        return fingerprint(e1) == fingerprint(e2)
     except Exception:
-        # We failed during json serialiazation/deserialization, fallback to *not-equal*!
+        # We failed during json serialization, fallback to *not-equal*!
         logger.exception('Failed in `compare_entities`')
         return False
 
 
+def entity_matches(entity, query) -> bool:
+    """
+    Check whether ``entity`` matches an entity filtering ``query`` the way ZMON backend does (JSON containment).
+
+    A ``list`` query matches if any of its elements matches.
+
+    >>> entity_matches({'id': 'e-1', 'type': 'instance', 'tags': ['a', 'b']}, {'type': 'instance', 'tags': ['b']})
+    True
+    >>> entity_matches({'id': 'e-1', 'type': 'instance'}, [{'type': 'host'}, {'id': 'e-2'}])
+    False
+    """
+    if isinstance(query, list):
+        return any(entity_matches(entity, q) for q in query)
+
+    return _json_contains(entity, query)
+
+
+def _json_contains(value, pattern):
+    if isinstance(pattern, dict):
+        return isinstance(value, dict) and all(k in value and _json_contains(value[k], v) for k, v in pattern.items())
+
+    if isinstance(value, list):
+        if isinstance(pattern, list):
+            return all(any(_json_contains(v, p) for v in value) for p in pattern)
+        # JSON containment special case: an array contains a matching primitive
+        return any(json_equal(v, pattern) for v in value)
+
+    return json_equal(value, pattern)
+
+
+def iter_response_text(resp, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield decoded text chunks of a streamed response body, and close the response once done or closed early."""
+    decoder = codecs.getincrementaldecoder(resp.encoding or 'utf-8')(errors='replace')
+
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+    finally:
+        # release the pooled connection also if the consumer stops early
+        resp.close()
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decode the items of a top-level JSON array from an iterable of text chunks.
+
+    Only the item currently being decoded is kept in memory, so arbitrarily large arrays can be consumed lazily.
+
+    >>> list(iter_json_array(['[{"id": 1}, {"i', 'd": 2}', ', 3', '4]']))
+    [{'id': 1}, {'id': 2}, 34]
+
+    :raises: ValueError if the input is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\n\r'
+
+    buf = ''
+    pos = 0
+    started = False
+    expect_item = True
+
+    for chunk in chunks:
+        buf = buf[pos:] + chunk
+        pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in whitespace:
+                pos += 1
+
+            if pos == len(buf):
+                break
+
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError('Expected JSON array, got: {!r}'.format(buf[pos:pos + 20]))
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == ']':
+                return
+
+            if not expect_item:
+                if buf[pos] != ',':
+                    raise ValueError('Expected "," or "]" at: {!r}'.format(buf[pos:pos + 20]))
+                expect_item = True
+                pos += 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # incomplete item, wait for more data
+                break
+
+            if end == len(buf):
+                # a trailing number could still continue in the next chunk
+                break
+
+            yield item
+
+            pos = end
+            expect_item = False
+
+    raise ValueError('Unexpected end of JSON array')
+
+
 def get_valid_entity_id(e):
     return invalid_entity_id_re.sub('-', parentheses_re.sub(lambda m: '[' if '(' in m.group() else ']', e.lower()))
 
 
-class Zmon:
-    """ZMON client class that enables communication with ZMON backend.
+# replacement of every run of invalid characters, precomputed for single ASCII characters
+_invalid_run_translation = {c: get_valid_entity_id(c) for c in map(chr, range(128)) if invalid_entity_id_re.match(c)}
 
-    :param url: ZMON backend base url.
-    :type url: str
 
-    :param token: ZMON authentication token.
-    :type token: str
+def _translate_invalid_run(m):
+    run = m.group()
+    valid = _invalid_run_translation.get(run)
+    if valid is None:
+        # runs never span valid characters, so translating one on its own matches translating the whole ID
+        valid = get_valid_entity_id(run)
+        if len(_invalid_run_translation) < ENTITY_ID_RUN_CACHE_SIZE:
+            _invalid_run_translation[run] = valid
+    return valid
 
-    :param username: ZMON authentication username. Ignored if ``token`` is used.
-    :type username: str
 
-    :param password: ZMON authentication password. Ignored if ``token`` is used.
-    :type password: str
+def _valid_entity_id(e):
+    e = e.lower()
 
-    :param timeout: HTTP requests timeout. Default is 10 sec.
-    :type timeout: int
+    # parentheses are invalid characters too, most IDs take this path
+    if invalid_entity_id_re.search(e) is None:
+        return e
 
-    :param verify: Verify SSL connection. Default is ``True``.
-    :type verify: bool
+    return invalid_entity_id_re.sub(_translate_invalid_run, e)
 
-    :param user_agent: ZMON user agent. Default is generated by ZMON client and includes lib version.
-    :type user_agent: str
+
+def get_valid_entity_ids(entity_ids) -> ValidEntityIds:
     """
+    Normalize many raw entity IDs at once, with the same result as :func:`zmon_cli.client.get_valid_entity_id`.
 
-    def __init__(
-            self, url, token=None, username=None, password=None, timeout=DEFAULT_TIMEOUT, verify=True,
-            user_agent=ZMON_USER_AGENT):
-        """Initialize ZMON client."""
-        self.timeout = timeout
+    Already valid IDs are detected with a single search. Other IDs are rewritten in one substitution, looking up each
+    run of invalid characters in a translation table.
 
-        split = urlsplit(url)
-        self.base_url = urlunsplit(SplitResult(split.scheme, split.netloc, '', '', ''))
-        self.url = urljoin(self.base_url, self._join_path(['api', API_VERSION, '']))
+    >>> get_valid_entity_ids(['App (v1)', 'app [v1]', 'app-1'])
+    ValidEntityIds(ids=['app-[v1]', 'app-[v1]', 'app-1'], collisions={'app-[v1]': ['App (v1)', 'app [v1]']})
 
-        self._session = requests.Session()
+    :param entity_ids: Iterable of raw entity IDs.
+    :type entity_ids: iterable
 
-        self._timeout = timeout
-        self.user_agent = user_agent
+    :return: Valid IDs in input order, and a dict of valid IDs produced by more than one distinct raw ID.
+    :rtype: :class:`zmon_cli.client.ValidEntityIds`
+    """
+    raws = list(entity_ids)
+    ids = list(map(_valid_entity_id, raws))
 
-        if username and password and token is None:
-            self._session.auth = (username, password)
+    collisions = {}
 
-        self._session.headers.update({'User-Agent': user_agent, 'Content-Type': 'application/json'})
+    # only group the raw IDs if distinct inputs collapsed to fewer distinct results
+    if len(set(ids)) < len(set(raws)):
+        sources = {}
+        for raw, valid in zip(raws, ids):
+            sources.setdefault(valid, []).append(raw)
 
-        if token:
-            self._session.headers.update({'Authorization': 'Bearer {}'.format(token)})
+        for valid, group in sources.items():
+            distinct = list(OrderedDict.fromkeys(group))
+            if len(distinct) > 1:
+                collisions[valid] = distinct
 
-        if not verify:
-            logger.warning('ZMON client will skip SSL verification!')
-            requests.packages.urllib3.disable_warnings()
-            self._session.verify = False
+    return ValidEntityIds(ids, collisions)
 
-    @property
-    def session(self):
-        return self._session
+
+def _check_command_error(src):
+    # module level to be picklable for worker processes
+    try:
+        ast.parse(src)
+    except Exception as e:
+        return str(e)
+
+    return None
+
+
+def check_command_hash(src: str) -> str:
+    """
+    Return a content hash of check command ``src``, including the Python version which determines the valid syntax.
+    """
+    key = '{}.{}\n{}'.format(sys.version_info[0], sys.version_info[1], src)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+JOINED_CHECK_FIELDS = (('name', 'check_name'), ('owning_team', 'check_owning_team'), ('interval', 'check_interval'))
+
+
+def join_alerts_with_checks(alerts, checks) -> list:
+    """
+    Join alert definitions with their check definitions on ``check_definition_id``, using an in-memory hash table of
+    the checks.
+
+    Every returned alert is a copy extended with ``check_name``, ``check_owning_team`` and ``check_interval``, which
+    are ``None`` if the check is not among ``checks`` (e.g. inactive).
+
+    >>> checks = [{'id': 7, 'name': 'c', 'interval': 60}]
+    >>> alert = join_alerts_with_checks([{'id': 1, 'check_definition_id': 7}], checks)[0]
+    >>> alert['check_name'], alert['check_owning_team'], alert['check_interval']
+    ('c', None, 60)
+
+    :param alerts: Iterable of alert definitions.
+    :type alerts: iterable
+
+    :param checks: Iterable of check definitions.
+    :type checks: iterable
+
+    :rtype: list
+    """
+    checks_by_id = {check['id']: check for check in checks}
+    missing = {}
+
+    joined = []
+    for alert in alerts:
+        check = checks_by_id.get(alert.get('check_definition_id'), missing)
+
+        row = dict(alert)
+        for field, joined_field in JOINED_CHECK_FIELDS:
+            row[joined_field] = check.get(field)
+        joined.append(row)
+
+    return joined
+
+
+def retry_after(resp):
+    """
+    Return the seconds to wait before retrying as requested by the ``Retry-After`` header of ``resp``.
+
+    :param resp: HTTP response.
+    :type resp: :class:`requests.Response`
+
+    :return: Seconds to wait, or ``None`` if the header is missing or invalid.
+    :rtype: float
+    """
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+    if date is None:
+        return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryAdapter(HTTPAdapter):
+    """
+    Transport adapter sending requests at a limited rate, and retrying requests rejected by an overloaded ZMON.
+
+    Responses with status 429 or 503 are retried after the ``Retry-After`` delay if the response has one, otherwise
+    after an exponential backoff with full jitter. A 503 from a gateway may arrive after ZMON processed the request,
+    so non-idempotent requests, e.g. ``POST``, are only retried on 429, or on 503 with a ``Retry-After`` header. Other
+    ``kwargs`` are passed to :class:`requests.adapters.HTTPAdapter`.
+
+    :param retries: Number of retries of a rejected request. Default is 3.
+    :type retries: int
+
+    :param backoff: Backoff of the first retry in seconds, doubled on every retry. Default is 0.5.
+    :type backoff: float
+
+    :param max_backoff: Maximum seconds to wait before a retry. Requests with a longer ``Retry-After`` delay are not
+                        retried. Default is 30.
+    :type max_backoff: float
+
+    :param rate_limiter: Limiter of requests shared by all threads. Default is ``None``, i.e. no rate limit.
+    :type rate_limiter: :class:`zmon_cli.bulk.TokenBucket`
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_RETRY_BACKOFF, max_backoff=DEFAULT_MAX_RETRY_BACKOFF,
+                 rate_limiter=None, **kwargs):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter
+
+        super().__init__(**kwargs)
+
+    def backoff_delay(self, attempt):
+        """Return a random delay before retry number ``attempt``, starting at 0, up to the exponential backoff."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def is_retryable(self, request, resp):
+        """Whether ``request`` rejected by ``resp`` can be sent again."""
+        if resp.status_code not in OVERLOAD_STATUSES:
+            return False
+
+        if request.method.upper() in IDEMPOTENT_METHODS or resp.status_code == 429:
+            return True
+
+        return retry_after(resp) is not None
+
+    def send(self, request, **kwargs):
+        # streamed request bodies can not be sent again
+        retries = self.retries if request.body is None or isinstance(request.body, (bytes, str)) else 0
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            resp = super().send(request, **kwargs)
+
+            if attempt >= retries or not self.is_retryable(request, resp):
+                return resp
+
+            requested = retry_after(resp)
+            delay = self.backoff_delay(attempt) if requested is None else requested
+            if delay > self.max_backoff:
+                return resp
+
+            logger.debug('Retrying {} {} in {:.2f}s after status {}'.format(
+                request.method, request.url, delay, resp.status_code))
+
+            # release the connection for reuse
+            resp.content
+            resp.close()
+
+            note_overload()
+
+            if self.rate_limiter is not None and requested is not None:
+                # server requested delay applies to all requests
+                self.rate_limiter.pause(delay)
+            else:
+                client_wait(delay)
+
+            attempt += 1
+
+
+class ZmonBase:
+    """
+    URL building, deeplinks and validation shared by the ZMON clients :class:`zmon_cli.client.Zmon` and
+    :class:`zmon_cli.async_client.AsyncZmon`.
+
+    :param url: ZMON backend base url.
+    :type url: str
+    """
+
+    def __init__(self, url):
+        split = urlsplit(url)
+        self.base_url = urlunsplit(SplitResult(split.scheme, split.netloc, '', '', ''))
+        self.url = urljoin(self.base_url, self._join_path(['api', API_VERSION, '']))
 
     @staticmethod
     def is_valid_entity_id(entity_id):
@@ -168,10 +610,62 @@ class Zmon:
 
         :raises: ZmonError
         """
-        try:
-            ast.parse(src)
-        except Exception as e:
-            raise ZmonError('Invalid check command: {}'.format(e))
+        error = _check_command_error(src)
+        if error is not None:
+            raise ZmonError('Invalid check command: {}'.format(error))
+
+    @staticmethod
+    def validate_check_commands(sources, cache=None, processes=None) -> list:
+        """
+        Validate the syntax of many check commands at once.
+
+        Identical commands are parsed once. Large batches are parsed in a pool of worker processes.
+
+        :param sources: Iterable of check command python source code.
+        :type sources: iterable
+
+        :param cache: Optional persistent cache of validation results, skipping commands already validated before.
+        :type cache: :class:`zmon_cli.cache.CheckValidationCache`
+
+        :param processes: Number of worker processes. Default is the number of CPUs, ``1`` parses serially.
+        :type processes: int
+
+        :return: Syntax error messages in input order, ``None`` for valid commands.
+        :rtype: list
+        """
+        sources = list(sources)
+        hashes = [check_command_hash(src) for src in sources]
+
+        results = {}
+        pending = OrderedDict()
+
+        for h, src in zip(hashes, sources):
+            if h in results or h in pending:
+                continue
+
+            if cache is not None and h in cache:
+                results[h] = cache.get(h)
+            else:
+                pending[h] = src
+
+        if len(pending) >= PARALLEL_VALIDATION_MIN and processes != 1:
+            workers = processes or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # few large chunks, pickling every single command costs about as much as parsing it
+                chunksize = max(1, len(pending) // (4 * workers))
+                errors = list(executor.map(_check_command_error, pending.values(), chunksize=chunksize))
+        else:
+            errors = [_check_command_error(src) for src in pending.values()]
+
+        for h, error in zip(pending, errors):
+            results[h] = error
+            if cache is not None:
+                cache.set(h, error)
+
+        if cache is not None and pending:
+            cache.save()
+
+        return [results[h] for h in hashes]
 
     def _join_path(self, parts):
         return '/'.join(str(p).strip('/') for p in parts)
@@ -192,6 +686,125 @@ class Zmon:
 
         return resp.json()
 
+    def _validate_entity(self, entity: dict):
+        if 'id' not in entity or 'type' not in entity:
+            raise ZmonArgumentError('Entity "id" and "type" are required.')
+
+        if not self.is_valid_entity_id(entity['id']):
+            raise ZmonArgumentError('Invalid entity ID.')
+
+    def _prepare_check_definition(self, check_definition: dict, skip_validation=False):
+        if 'owning_team' not in check_definition:
+            raise ZmonArgumentError('Check definition must have "owning_team"')
+
+        if 'status' not in check_definition:
+            check_definition['status'] = 'ACTIVE'
+
+        if not skip_validation:
+            self.validate_check_command(check_definition['command'])
+
+    def _prepare_alert_definition(self, alert_definition: dict, update=False):
+        if 'last_modified_by' not in alert_definition:
+            raise ZmonArgumentError('Alert definition must have "last_modified_by"')
+
+        if update and 'id' not in alert_definition:
+            raise ZmonArgumentError('Alert definition must have "id"')
+
+        if 'check_definition_id' not in alert_definition:
+            raise ZmonArgumentError('Alert defintion must have "check_definition_id"')
+
+        if 'status' not in alert_definition:
+            alert_definition['status'] = 'ACTIVE'
+
+    def _validate_grafana_dashboard(self, grafana_dashboard: dict):
+        if 'uid' not in grafana_dashboard['dashboard']:
+            raise ZmonArgumentError('Grafana dashboard must have "uid". Hint: Use Grafana6 dashboard format.')
+        elif 'title' not in grafana_dashboard['dashboard']:
+            raise ZmonArgumentError('Grafana dashboard must have "title"')
+
+    def _validate_downtime(self, downtime: dict):
+        if not downtime.get('entities'):
+            raise ZmonArgumentError('At least one entity ID should be specified')
+
+        if not downtime.get('start_time') or not downtime.get('end_time'):
+            raise ZmonArgumentError('Downtime must specify "start_time" and "end_time"')
+
+    def _search_params(self, q, limit=None, teams=None) -> dict:
+        if teams and type(teams) not in (list, tuple):
+            raise ZmonArgumentError('"teams" should be a list!')
+
+        params = {'query': q}
+        if limit:
+            params.update({'limit': limit})
+
+        if teams:
+            params['teams'] = ','.join(teams)
+
+        return params
+
+    @staticmethod
+    def _desired_entities(entities, entity_type) -> dict:
+        desired = {}
+        for entity in entities:
+            if 'type' not in entity:
+                # normalize a copy, the caller's entities are left untouched
+                entity = dict(entity, type=entity_type)
+
+            if 'id' not in entity:
+                raise ZmonArgumentError('Entity "id" is required.')
+
+            if entity['type'] != entity_type:
+                raise ZmonArgumentError('Entity {} has type "{}", expected "{}".'.format(
+                    entity['id'], entity['type'], entity_type))
+
+            if entity['id'] in desired:
+                raise ZmonArgumentError('Duplicate entity ID: {}'.format(entity['id']))
+
+            desired[entity['id']] = entity
+
+        return desired
+
+    @staticmethod
+    def _plan_entity_sync(desired, remote, delete):
+        # return the report of unchanged, created and updated entities, the entities to push and the IDs to delete
+        report = SyncReport()
+
+        to_push = []
+        for entity_id, entity in desired.items():
+            if entity_id not in remote:
+                report.created.append(entity_id)
+                to_push.append(entity)
+            elif not compare_entities(entity, remote[entity_id]):
+                report.updated.append(entity_id)
+                to_push.append(entity)
+            else:
+                report.unchanged.append(entity_id)
+
+        to_delete = [entity_id for entity_id in remote if entity_id not in desired] if delete else []
+
+        return report, to_push, to_delete
+
+    @staticmethod
+    def _record_pushed(report, results):
+        failed = set()
+        for res in results:
+            if res.error is not None:
+                failed.add(res.item['id'])
+                report.failed.append((res.item['id'], res.error))
+
+        report.created = [entity_id for entity_id in report.created if entity_id not in failed]
+        report.updated = [entity_id for entity_id in report.updated if entity_id not in failed]
+
+    @staticmethod
+    def _record_deleted(report, results):
+        for res in results:
+            if res.error is not None:
+                report.failed.append((res.item, res.error))
+            elif not res.result:
+                report.failed.append((res.item, ZmonError('Entity was not deleted')))
+            else:
+                report.deleted.append(res.item)
+
 ########################################################################################################################
 # DEEPLINKS
 ########################################################################################################################
@@ -258,6 +871,196 @@ class Zmon:
             return self.endpoint(GRAFANA_DASHBOARD_URL, dashboard['id'], base_url=self.base_url, trailing_slash=False)
         return ""
 
+
+class Zmon(ZmonBase):
+    """ZMON client class that enables communication with ZMON backend.
+
+    :param url: ZMON backend base url.
+    :type url: str
+
+    :param token: ZMON authentication token.
+    :type token: str
+
+    :param username: ZMON authentication username. Ignored if ``token`` is used.
+    :type username: str
+
+    :param password: ZMON authentication password. Ignored if ``token`` is used.
+    :type password: str
+
+    :param timeout: HTTP requests timeout. Default is 10 sec.
+    :type timeout: int
+
+    :param verify: Verify SSL connection. Default is ``True``.
+    :type verify: bool
+
+    :param user_agent: ZMON user agent. Default is generated by ZMON client and includes lib version.
+    :type user_agent: str
+
+    :param entity_cache: Local entity cache read through by :func:`zmon_cli.client.Zmon.get_entities`. Default is
+                         ``None``, i.e. always query the backend.
+    :type entity_cache: :class:`zmon_cli.cache.EntityCache`
+
+    :param response_cache: Local cache of active check and alert definitions, revalidated with conditional requests.
+                           Default is ``None``, i.e. always download the definitions.
+    :type response_cache: :class:`zmon_cli.cache.ResponseCache`
+
+    :param pool_connections: Number of per-host connection pools to cache. Default is 10.
+    :type pool_connections: int
+
+    :param pool_maxsize: Maximum number of connections kept open per host. Default is 10.
+    :type pool_maxsize: int
+
+    :param pool_block: Wait for a free connection when all ``pool_maxsize`` connections are in use, instead of
+                       opening a connection which is closed after the request. Default is ``False``.
+    :type pool_block: bool
+
+    :param rate_limit: Maximum requests per second, shared by all threads. Default is ``None``, i.e. no limit.
+    :type rate_limit: float
+
+    :param retries: Number of retries of requests rejected with status 429 or 503, see
+                    :class:`zmon_cli.client.RetryAdapter`. Default is 3.
+    :type retries: int
+
+    :param retry_backoff: Backoff of the first retry in seconds, doubled on every retry. Default is 0.5.
+    :type retry_backoff: float
+
+    :param max_retry_backoff: Maximum seconds to wait before a retry. Default is 30.
+    :type max_retry_backoff: float
+
+    The client can be shared across threads: every thread uses its own session, and all sessions share one pool of
+    keep-alive connections. Thread sessions follow the headers, cookies, auth and TLS settings of the session of the
+    thread creating the client, including later changes.
+    """
+
+    def __init__(
+            self, url, token=None, username=None, password=None, timeout=DEFAULT_TIMEOUT, verify=True,
+            user_agent=ZMON_USER_AGENT, entity_cache=None, response_cache=None,
+            pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+            rate_limit=None, retries=DEFAULT_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+            max_retry_backoff=DEFAULT_MAX_RETRY_BACKOFF):
+        """Initialize ZMON client."""
+        self.timeout = timeout
+        self.entity_cache = entity_cache
+        self.response_cache = response_cache
+
+        super().__init__(url)
+
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        self._adapter = None
+        self._local = threading.local()
+        self._session = requests.Session()
+        self._local.session = self._session
+
+        self.configure_pool(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+        self._timeout = timeout
+        self.user_agent = user_agent
+
+        if username and password and token is None:
+            self._session.auth = (username, password)
+
+        self._session.headers.update({'User-Agent': user_agent, 'Content-Type': 'application/json'})
+
+        if token:
+            self._session.headers.update({'Authorization': 'Bearer {}'.format(token)})
+
+        if not verify:
+            logger.warning('ZMON client will skip SSL verification!')
+            requests.packages.urllib3.disable_warnings()
+            self._session.verify = False
+
+    @property
+    def session(self):
+        """Requests session of the calling thread."""
+        session = getattr(self._local, 'session', None)
+
+        if session is None:
+            session = self._local.session = requests.Session()
+
+        if session is not self._session:
+            for attr in SHARED_SESSION_ATTRS:
+                setattr(session, attr, getattr(self._session, attr))
+
+        if session.adapters.get('https://') is not self._adapter:
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+
+        return session
+
+    def configure_pool(self, pool_connections=None, pool_maxsize=None, pool_block=None):
+        """
+        Replace the connection pool shared by the sessions of all threads. Arguments which are not set keep their
+        current value.
+
+        :param pool_connections: Number of per-host connection pools to cache.
+        :type pool_connections: int
+
+        :param pool_maxsize: Maximum number of connections kept open per host.
+        :type pool_maxsize: int
+
+        :param pool_block: Wait for a free connection instead of opening a connection exceeding ``pool_maxsize``.
+        :type pool_block: bool
+        """
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+        if pool_block is not None:
+            self.pool_block = pool_block
+
+        previous = self._adapter
+
+        self._adapter = RetryAdapter(
+            retries=self.retries, backoff=self.retry_backoff, max_backoff=self.max_retry_backoff,
+            rate_limiter=self.rate_limiter, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block)
+
+        if previous is not None:
+            # idle connections are closed, connections in use are closed when released
+            previous.close()
+
+    def ensure_pool_size(self, maxsize):
+        """Grow the connection pool to keep at least ``maxsize`` connections per host, e.g. one per worker thread."""
+        if maxsize > self.pool_maxsize:
+            self.configure_pool(pool_maxsize=maxsize)
+
+    def _invalidate_entity_cache(self):
+        if self.entity_cache is not None:
+            self.entity_cache.invalidate(self.url)
+
+    def _invalidate_response_cache(self, path):
+        if self.response_cache is not None:
+            self.response_cache.invalidate(self.endpoint(path))
+
+    def _get_cached_json(self, url):
+        entry = self.response_cache.get(url)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+            if not headers and self.response_cache.is_fresh(entry):
+                return entry['data']
+
+        resp = self.session.get(url, headers=headers, timeout=self._timeout)
+
+        if entry is not None and resp.status_code == 304:
+            logger.debug('Cached response of {} is still valid'.format(url))
+            return entry['data']
+
+        data = self.json(resp)
+        self.response_cache.set(url, data, etag=resp.headers.get('ETag'),
+                                last_modified=resp.headers.get('Last-Modified'))
+
+        return data
+
     @logged
     def status(self) -> dict:
         """
@@ -276,14 +1079,20 @@ class Zmon:
 
     @trace(pass_span=True)
     @logged
-    def get_entities(self, query=None, **kwargs) -> list:
+    def get_entities(self, query=None, use_cache=True, **kwargs) -> list:
         """
         Get ZMON entities, with optional filtering.
 
+        If the client has an ``entity_cache``, the complete entity list is read through the cache and ``query`` is
+        applied locally using :func:`zmon_cli.client.entity_matches`.
+
         :param query: Entity filtering query. Default is ``None``. Example query ``{'type': 'instance'}`` to return
                       all entities of type: ``instance``.
         :type query: dict
 
+        :param use_cache: Read through ``entity_cache`` if configured. Default is ``True``.
+        :type use_cache: bool
+
         :return: List of entities.
         :rtype: list
         """
@@ -293,12 +1102,119 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.log_kv({'query': query_str})
 
+        if use_cache and self.entity_cache is not None:
+            entities = self.entity_cache.get(self.url)
+
+            current_span.set_tag('cache_hit', entities is not None)
+
+            if entities is None:
+                resp = self.session.get(self.endpoint(ENTITIES), timeout=self._timeout)
+                entities = self.json(resp)
+                self.entity_cache.set(self.url, entities)
+
+            return [e for e in entities if entity_matches(e, query)] if query else entities
+
         params = {'query': query_str} if query else None
 
         resp = self.session.get(self.endpoint(ENTITIES), params=params, timeout=self._timeout)
 
         return self.json(resp)
 
+    @trace(pass_span=True)
+    @logged
+    def iter_entities(self, query=None, **kwargs):
+        """
+        Iterate over ZMON entities, with optional filtering.
+
+        Same as :func:`zmon_cli.client.Zmon.get_entities`, but the response is streamed and decoded incrementally, so
+        memory usage does not grow with the number of returned entities.
+
+        :param query: Entity filtering query. Default is ``None``.
+        :type query: dict
+
+        :return: Generator of entities.
+        :rtype: generator
+        """
+        query_str = json.dumps(query) if query else ''
+        logger.debug('Streaming entities with query: {} ...'.format(query_str))
+
+        current_span = extract_span_from_kwargs(**kwargs)
+        current_span.log_kv({'query': query_str})
+
+        params = {'query': query_str} if query else None
+
+        resp = self.session.get(self.endpoint(ENTITIES), params=params, timeout=self._timeout, stream=True)
+
+        try:
+            resp.raise_for_status()
+        except requests.HTTPError:
+            # the streamed body is never read, release the connection
+            resp.close()
+            raise
+
+        return iter_json_array(iter_response_text(resp))
+
+    @trace(pass_span=True)
+    @logged
+    def sync_entities(self, entities: list, entity_type: str, query=None, delete=False, dry_run=False, concurrency=1,
+                      adaptive=False, **kwargs) -> SyncReport:
+        """
+        Make ZMON entities of ``entity_type`` match the desired ``entities``.
+
+        Current entities are fetched once and compared using :func:`zmon_cli.client.compare_entities`, only new or
+        changed entities are pushed. If ``delete`` is set, remote entities of ``entity_type`` matching ``query`` which
+        are not desired anymore are deleted.
+
+        :param entities: List of desired entity dicts. Missing ``type`` defaults to ``entity_type``.
+        :type entities: list
+
+        :param entity_type: Entity type to synchronize.
+        :type entity_type: str
+
+        :param query: Additional entity filtering query restricting the synced set, e.g. ``{'team': 'zmon'}``.
+        :type query: dict
+
+        :param delete: Delete remote entities which are not desired. Default is ``False``.
+        :type delete: bool
+
+        :param dry_run: Only compute the report, without changing any entities. Default is ``False``.
+        :type dry_run: bool
+
+        :param concurrency: Number of parallel requests. Default is 1.
+        :type concurrency: int
+
+        :param adaptive: Adapt the number of parallel requests up to ``concurrency``, see
+                         :func:`zmon_cli.bulk.run_bulk`. Default is ``False``.
+        :type adaptive: bool
+
+        :return: Sync report.
+        :rtype: :class:`zmon_cli.client.SyncReport`
+        """
+        current_span = extract_span_from_kwargs(**kwargs)
+        current_span.set_tag('entity_type', entity_type)
+
+        desired = self._desired_entities(entities, entity_type)
+
+        query = dict(query or {}, type=entity_type)
+        remote = {e['id']: e for e in self.get_entities(query=query, use_cache=False)}
+
+        report, to_push, to_delete = self._plan_entity_sync(desired, remote, delete)
+
+        logger.debug('Syncing entities of type {}: {}'.format(entity_type, report.counts))
+
+        current_span.log_kv({'push': len(to_push), 'delete': len(to_delete)})
+
+        if dry_run:
+            report.deleted.extend(to_delete)
+            return report
+
+        self._record_pushed(report, run_bulk(self.add_entity, to_push, concurrency=concurrency, adaptive=adaptive))
+
+        self._record_deleted(
+            report, run_bulk(self.delete_entity, to_delete, concurrency=concurrency, adaptive=adaptive))
+
+        return report
+
     @trace(pass_span=True)
     @logged
     def get_entity(self, entity_id: str, **kwargs) -> str:
@@ -335,15 +1251,11 @@ class Zmon:
         :return: Response object.
         :rtype: :class:`requests.Response`
         """
-        if 'id' not in entity or 'type' not in entity:
-            raise ZmonArgumentError('Entity "id" and "type" are required.')
-
-        if not self.is_valid_entity_id(entity['id']):
-            raise ZmonArgumentError('Invalid entity ID.')
+        current_span = extract_span_from_kwargs(**kwargs)
+        traced_validation(current_span, self._validate_entity, entity)
 
         logger.debug('Adding new entity: {} ...'.format(entity['id']))
 
-        current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('entity_id', entity['id'])
 
         data = json.dumps(entity, cls=JSONDateEncoder)
@@ -351,6 +1263,8 @@ class Zmon:
 
         resp.raise_for_status()
 
+        self._invalidate_entity_cache()
+
         return resp
 
     @trace(pass_span=True)
@@ -378,12 +1292,27 @@ class Zmon:
 
         resp.raise_for_status()
 
+        self._invalidate_entity_cache()
+
         return resp.text == '1'
 
 ########################################################################################################################
 # DASHBOARD
 ########################################################################################################################
 
+    @trace()
+    @logged
+    def get_dashboards(self) -> list:
+        """
+        Retrieve all ZMON dashboards.
+
+        :return: List of dashboard dicts.
+        :rtype: list
+        """
+        resp = self.session.get(self.endpoint(DASHBOARD), timeout=self._timeout)
+
+        return self.json(resp)
+
     @trace(pass_span=True)
     @logged
     def get_dashboard(self, dashboard_id: str, **kwargs) -> dict:
@@ -462,16 +1391,29 @@ class Zmon:
 
     @trace()
     @logged
-    def get_check_definitions(self) -> list:
+    def get_check_definitions(self, expression=None) -> list:
         """
         Return list of all ``active`` check definitions.
 
+        If the client has a ``response_cache``, an unchanged list is not downloaded again.
+
+        :param expression: Optional filter expression, e.g. ``"team == 'zmon' and name =~ '^K8s'"``. See
+                           :mod:`zmon_cli.filters`.
+        :type expression: str
+
         :return: List of check-defs.
         :rtype: list
         """
-        resp = self.session.get(self.endpoint(ACTIVE_CHECK_DEF), timeout=self._timeout)
+        if self.response_cache is not None:
+            definitions = self._get_cached_json(self.endpoint(ACTIVE_CHECK_DEF)).get('check_definitions')
+        else:
+            resp = self.session.get(self.endpoint(ACTIVE_CHECK_DEF), timeout=self._timeout)
+            definitions = self.json(resp).get('check_definitions')
+
+        if expression:
+            definitions = list(filter_definitions(definitions, expression))
 
-        return self.json(resp).get('check_definitions')
+        return definitions
 
     @trace(pass_span=True)
     @logged
@@ -491,24 +1433,13 @@ class Zmon:
         :rtype: dict
         """
         current_span = extract_span_from_kwargs(**kwargs)
-        if 'owning_team' not in check_definition:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Check definition must have "owning_team"'})
-            raise ZmonArgumentError('Check definition must have "owning_team"')
-
-        if 'status' not in check_definition:
-            check_definition['status'] = 'ACTIVE'
-
-        if not skip_validation:
-            try:
-                self.validate_check_command(check_definition['command'])
-            except Exception:
-                current_span.set_tag('error', True)
-                current_span.log_kv({'exception': traceback.format_exc()})
-                raise
+        traced_validation(current_span, self._prepare_check_definition, check_definition,
+                          skip_validation=skip_validation)
 
         resp = self.session.post(self.endpoint(CHECK_DEF), json=check_definition, timeout=self._timeout)
 
+        self._invalidate_response_cache(ACTIVE_CHECK_DEF)
+
         return self.json(resp)
 
     @trace(pass_span=True)
@@ -528,6 +1459,8 @@ class Zmon:
 
         resp = self.session.delete(self.endpoint(CHECK_DEF, check_definition_id))
 
+        self._invalidate_response_cache(ACTIVE_CHECK_DEF)
+
         resp.raise_for_status()
 
         return resp
@@ -557,16 +1490,55 @@ class Zmon:
 
     @trace()
     @logged
-    def get_alert_definitions(self) -> list:
+    def get_alert_definitions(self, expression=None) -> list:
         """
         Return list of all ``active`` alert definitions.
 
+        If the client has a ``response_cache``, an unchanged list is not downloaded again.
+
+        :param expression: Optional filter expression, e.g. ``"team == 'zmon' and name =~ '^K8s'"``. See
+                           :mod:`zmon_cli.filters`.
+        :type expression: str
+
         :return: List of alert-defs.
         :rtype: list
         """
-        resp = self.session.get(self.endpoint(ACTIVE_ALERT_DEF), timeout=self._timeout)
+        if self.response_cache is not None:
+            definitions = self._get_cached_json(self.endpoint(ACTIVE_ALERT_DEF)).get('alert_definitions')
+        else:
+            resp = self.session.get(self.endpoint(ACTIVE_ALERT_DEF), timeout=self._timeout)
+            definitions = self.json(resp).get('alert_definitions')
+
+        if expression:
+            definitions = list(filter_definitions(definitions, expression))
+
+        return definitions
+
+    @trace(pass_span=True)
+    @logged
+    def get_alert_definitions_with_checks(self, expression=None, **kwargs) -> list:
+        """
+        Return list of all ``active`` alert definitions joined with their check definitions.
+
+        Fetches all active alert and check definitions once and joins them locally, see
+        :func:`zmon_cli.client.join_alerts_with_checks`.
+
+        :param expression: Optional filter expression applied to the joined alerts, e.g.
+                           ``"check_owning_team == 'zmon'"``. See :mod:`zmon_cli.filters`.
+        :type expression: str
+
+        :return: List of alert-defs with ``check_name``, ``check_owning_team`` and ``check_interval``.
+        :rtype: list
+        """
+        current_span = extract_span_from_kwargs(**kwargs)
+        current_span.log_kv({'expression': expression})
+
+        alerts = join_alerts_with_checks(self.get_alert_definitions(), self.get_check_definitions())
+
+        if expression:
+            alerts = list(filter_definitions(alerts, expression))
 
-        return self.json(resp).get('alert_definitions')
+        return alerts
 
     @trace(pass_span=True)
     @logged
@@ -584,22 +1556,14 @@ class Zmon:
         :rtype: dict
         """
         current_span = extract_span_from_kwargs(**kwargs)
-        if 'last_modified_by' not in alert_definition:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Alert definition must have "last_modified_by"'})
-            raise ZmonArgumentError('Alert definition must have "last_modified_by"')
-
-        if 'status' not in alert_definition:
-            alert_definition['status'] = 'ACTIVE'
+        traced_validation(current_span, self._prepare_alert_definition, alert_definition)
 
-        if 'check_definition_id' not in alert_definition:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Alert definition must have "last_modified_by"'})
-            raise ZmonArgumentError('Alert defintion must have "check_definition_id"')
         current_span.set_tag('check_id', alert_definition['check_definition_id'])
 
         resp = self.session.post(self.endpoint(ALERT_DEF), json=alert_definition, timeout=self._timeout)
 
+        self._invalidate_response_cache(ACTIVE_ALERT_DEF)
+
         return self.json(resp)
 
     @trace(pass_span=True)
@@ -618,29 +1582,16 @@ class Zmon:
         :rtype: dict
         """
         current_span = extract_span_from_kwargs(**kwargs)
-        if 'last_modified_by' not in alert_definition:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Alert definition must have "last_modified_by"'})
-            raise ZmonArgumentError('Alert definition must have "last_modified_by"')
+        traced_validation(current_span, self._prepare_alert_definition, alert_definition, update=True)
 
-        if 'id' not in alert_definition:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Alert definition must have "id"'})
-            raise ZmonArgumentError('Alert definition must have "id"')
         current_span.set_tag('alert_id', alert_definition['id'])
-
-        if 'check_definition_id' not in alert_definition:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Alert definition must have "check_definition_id"'})
-            raise ZmonArgumentError('Alert defintion must have "check_definition_id"')
         current_span.set_tag('check_id', alert_definition['check_definition_id'])
 
-        if 'status' not in alert_definition:
-            alert_definition['status'] = 'ACTIVE'
-
         resp = self.session.put(
             self.endpoint(ALERT_DEF, alert_definition['id']), json=alert_definition, timeout=self._timeout)
 
+        self._invalidate_response_cache(ACTIVE_ALERT_DEF)
+
         return self.json(resp)
 
     @trace(pass_span=True)
@@ -659,6 +1610,8 @@ class Zmon:
         current_span.set_tag('alert_id', str(alert_definition_id))
         resp = self.session.delete(self.endpoint(ALERT_DEF, alert_definition_id))
 
+        self._invalidate_response_cache(ACTIVE_ALERT_DEF)
+
         return self.json(resp)
 
     @trace(pass_span=True)
@@ -691,6 +1644,35 @@ class Zmon:
 
         return self.json(resp)
 
+    @trace(pass_span=True)
+    @logged
+    def iter_alert_data(self, alert_id: int, **kwargs):
+        """
+        Iterate over alert data rows.
+
+        Same as :func:`zmon_cli.client.Zmon.get_alert_data`, but the response is streamed and decoded incrementally,
+        one ``{"entity": ..., "results": [...]}`` row at a time.
+
+        :param alert_id: ZMON alert ID.
+        :type alert_id: int
+
+        :return: Generator of alert data rows.
+        :rtype: generator
+        """
+        current_span = extract_span_from_kwargs(**kwargs)
+        current_span.set_tag('alert_id', str(alert_id))
+        resp = self.session.get(self.endpoint(ALERT_DATA, alert_id, 'all-entities'), timeout=self._timeout,
+                                stream=True)
+
+        try:
+            resp.raise_for_status()
+        except requests.HTTPError:
+            # the streamed body is never read, release the connection
+            resp.close()
+            raise
+
+        return iter_json_array(iter_response_text(resp))
+
 ########################################################################################################################
 # SEARCH
 ########################################################################################################################
@@ -722,16 +1704,7 @@ class Zmon:
             }
         """
         current_span = extract_span_from_kwargs(**kwargs)
-        if teams and type(teams) not in (list, tuple):
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': '"teams" should be a list'})
-            raise ZmonArgumentError('"teams" should be a list!')
-
-        params = {'query': q}
-        if limit:
-            params.update({'limit': limit})
-        if teams:
-            params['teams'] = ','.join(teams)
+        params = traced_validation(current_span, self._search_params, q, limit=limit, teams=teams)
 
         current_span.log_kv({'query', json.dumps(params)})
         resp = self.session.get(self.endpoint(SEARCH), params=params, timeout=self._timeout)
@@ -821,16 +1794,7 @@ class Zmon:
         :rtype: dict
         """
         current_span = extract_span_from_kwargs(**kwargs)
-
-        if 'uid' not in grafana_dashboard['dashboard']:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Grafana dashboard must have "uid". Use Grafana6 dashboard format.'})
-            raise ZmonArgumentError('Grafana dashboard must have "uid". Hint: Use Grafana6 dashboard format.')
-
-        elif 'title' not in grafana_dashboard['dashboard']:
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Grafana dashboard must have "title"'})
-            raise ZmonArgumentError('Grafana dashboard must have "title"')
+        traced_validation(current_span, self._validate_grafana_dashboard, grafana_dashboard)
 
         current_span.set_tag('grafana_dashboard_uid', grafana_dashboard['dashboard']['uid'])
 
@@ -871,15 +1835,7 @@ class Zmon:
             }
         """
         current_span = extract_span_from_kwargs(**kwargs)
-        if not downtime.get('entities'):
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'At least one entity ID should be specified'})
-            raise ZmonArgumentError('At least one entity ID should be specified')
-
-        if not downtime.get('start_time') or not downtime.get('end_time'):
-            current_span.set_tag('error', True)
-            current_span.log_kv({'exception': 'Downtime must specify "start_time" and "end_time"'})
-            raise ZmonArgumentError('Downtime must specify "start_time" and "end_time"')
+        traced_validation(current_span, self._validate_downtime, downtime)
 
         current_span.set_tag('entity_ids', str(downtime.get('entities')))
         # FIXME - those also?
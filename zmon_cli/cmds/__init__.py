@@ -6,6 +6,7 @@ from zmon_cli.cmds.dashboard import dashboard
 from zmon_cli.cmds.data import data
 from zmon_cli.cmds.downtime import downtimes
 from zmon_cli.cmds.entity import entities
+from zmon_cli.cmds.export import export
 from zmon_cli.cmds.grafana import grafana
 from zmon_cli.cmds.group import groups, members
 from zmon_cli.cmds.search import search
@@ -20,6 +21,7 @@ __all__ = (
     data,
     downtimes,
     entities,
+    export,
     grafana,
     groups,
     members,
@@ -1,14 +1,29 @@
 import json
+import functools
 
 import yaml
 
 import click
 
-from clickclick import AliasedGroup, Action, ok
+from clickclick import AliasedGroup, Action, ok, fatal_error
 
-from zmon_cli.cmds.command import cli, get_client, yaml_output_option, output_option, pretty_json
-from zmon_cli.output import dump_yaml, Output, render_alerts
-from zmon_cli.client import ZmonArgumentError
+from zmon_cli.cmds.command import cli, get_client, yaml_output_option, output_option, pretty_json, adaptive_option
+from zmon_cli.cmds.command import bulk_concurrency, enable_response_cache, definition_filter
+from zmon_cli.cmds.data import alert_values
+from zmon_cli.output import dump_yaml, Output, render_alerts, render_what_if, render_sync_report
+from zmon_cli.bulk import run_bulk
+from zmon_cli.client import ZmonArgumentError, SyncReport
+from zmon_cli.conditions import Condition, ConditionError, what_if
+from zmon_cli.definitions import load_definitions, plan_definitions, alert_definition_keys
+from zmon_cli.filters import filter_definitions
+
+
+def decode_alert_parameters(alert):
+    # Workaround API inconsistency!
+    if alert.get('parameters'):
+        for k, v in alert['parameters'].items():
+            if type(v) is str:
+                alert['parameters'][k] = json.loads(v)
 
 
 @cli.group('alert-definitions', cls=AliasedGroup)
@@ -69,16 +84,22 @@ def get_alert_definition(obj, alert_id, output, pretty):
 
 
 @alert_definitions.command('list')
+@click.option('--with-checks', is_flag=True,
+              help='Include name, owning team and interval of the check definition of every alert.')
 @click.pass_obj
 @output_option
 @pretty_json
-def list_alert_definitions(obj, output, pretty):
+def list_alert_definitions(obj, with_checks, output, pretty):
     """List all active alert definitions"""
     client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
 
     with Output('Retrieving active alert definitions ...', nl=True, output=output, pretty_json=pretty,
-                printer=render_alerts) as act:
-        alerts = client.get_alert_definitions()
+                printer=functools.partial(render_alerts, with_checks=with_checks)) as act:
+        if with_checks:
+            alerts = client.get_alert_definitions_with_checks()
+        else:
+            alerts = client.get_alert_definitions()
 
         for alert in alerts:
             alert['link'] = client.alert_details_url(alert)
@@ -87,23 +108,34 @@ def list_alert_definitions(obj, output, pretty):
 
 
 @alert_definitions.command('filter')
-@click.argument('field')
-@click.argument('value')
+@click.argument('field', required=False)
+@click.argument('value', required=False)
+@click.option('-e', '--expression', help='Filter expression, e.g. "team == \'zmon\' and priority <= 2".')
 @click.pass_obj
 @output_option
 @pretty_json
-def filter_alert_definitions(obj, field, value, output, pretty):
-    """Filter active alert definitions"""
+def filter_alert_definitions(obj, field, value, expression, output, pretty):
+    """
+    Filter active alert definitions
+
+    Either by a single FIELD VALUE match, or by a filter expression supporting and/or/not, comparisons, "in", regex
+    matches with "=~" and nested fields, e.g.:
+
+        zmon alert-definitions filter -e "check_definition_id in [1, 2] or tags.0 == 'critical'"
+    """
+    if field == 'check_definition_id' and value is not None:
+        value = int(value)
+
+    predicate = definition_filter(field, value, expression)
+
     client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
 
     with Output('Retrieving and filtering alert definitions ...', nl=True, output=output, pretty_json=pretty,
                 printer=render_alerts) as act:
         alerts = client.get_alert_definitions()
 
-        if field == 'check_definition_id':
-            value = int(value)
-
-        filtered = [alert for alert in alerts if alert.get(field) == value]
+        filtered = list(filter_definitions(alerts, predicate))
 
         for alert in filtered:
             alert['link'] = client.alert_details_url(alert)
@@ -111,6 +143,40 @@ def filter_alert_definitions(obj, field, value, output, pretty):
         act.echo(filtered)
 
 
+@alert_definitions.command('what-if')
+@click.argument('alert_id', type=int)
+@click.option('-c', '--condition', 'new_condition', required=True,
+              help='Condition to compare with the current alert condition, e.g. ">250".')
+@click.pass_obj
+@output_option
+@pretty_json
+def what_if_alert_definition(obj, alert_id, new_condition, output, pretty):
+    """
+    Compare the entities firing with a different alert condition
+
+    Both the current and the new condition are evaluated offline against the latest check values of all entities of
+    the alert, e.g.:
+
+        zmon alert-definitions what-if 123 --condition '>250'
+    """
+    client = get_client(obj.config)
+
+    alert = client.get_alert_definition(alert_id)
+    condition = alert.get('condition') or ''
+
+    try:
+        Condition(condition)
+        Condition(new_condition)
+    except ConditionError as e:
+        fatal_error(str(e))
+
+    with Output('Evaluating alert conditions ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_what_if) as act:
+        values = alert_values(client.iter_alert_data(alert_id))
+
+        act.echo(what_if(values, condition, new_condition))
+
+
 @alert_definitions.command('create')
 @click.argument('yaml_file', type=click.File('rb'))
 @click.pass_obj
@@ -143,11 +209,7 @@ def update_alert_definition(obj, yaml_file):
 
     with Action('Updating alert definition ...', nl=True) as act:
         try:
-            # Workaround API inconsistency!
-            if alert.get('parameters'):
-                for k, v in alert['parameters'].items():
-                    if type(v) is str:
-                        alert['parameters'][k] = json.loads(v)
+            decode_alert_parameters(alert)
 
             client.update_alert_definition(alert)
             ok(client.alert_details_url(alert))
@@ -155,6 +217,103 @@ def update_alert_definition(obj, yaml_file):
             act.error(str(e))
 
 
+@alert_definitions.command('apply')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('-n', '--concurrency', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of alert definitions updated in parallel.')
+@adaptive_option
+@click.option('--dry-run', is_flag=True, help='Only report what would change.')
+@click.pass_obj
+def apply(obj, directory, concurrency, adaptive, dry_run):
+    """
+    Create or update all alert definition YAML files in a directory
+
+    Current alert and check definitions are retrieved once. Alert definitions referring to a check definition which is
+    not active are rejected, only new or changed alert definitions are updated.
+    """
+    report = SyncReport()
+
+    with Action('Loading alert definitions from {} ...'.format(directory)):
+        definitions = load_definitions(directory, lambda path, e: report.failed.append((path, e)))
+
+    decoded = []
+    for path, alert in definitions:
+        alert.setdefault('status', 'ACTIVE')
+        check_id = alert.get('check_definition_id')
+        if isinstance(check_id, str) and check_id.isdigit():
+            alert['check_definition_id'] = int(check_id)
+
+        # decoded before planning, so parameters given as JSON strings compare equal to the current definitions
+        try:
+            decode_alert_parameters(alert)
+        except ValueError as e:
+            report.failed.append((path, 'Invalid parameters: {}'.format(e)))
+        else:
+            decoded.append((path, alert))
+
+    client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
+
+    with Action('Retrieving active alert and check definitions ...'):
+        alerts = client.get_alert_definitions()
+        check_ids = {check['id'] for check in client.get_check_definitions()}
+
+    for alert in alerts:
+        try:
+            decode_alert_parameters(alert)
+        except ValueError:
+            pass
+
+    valid = []
+    for path, alert in decoded:
+        if alert.get('check_definition_id') in check_ids:
+            valid.append((path, alert))
+        else:
+            report.failed.append(
+                (path, 'Unknown or inactive check definition: {}'.format(alert.get('check_definition_id'))))
+
+    plan = plan_definitions(valid, alerts, alert_definition_keys)
+
+    report.unchanged = [path for path, _ in plan['unchanged']]
+
+    if dry_run:
+        report.created = [path for path, _ in plan['created']]
+        report.updated = [path for path, _ in plan['updated']]
+        render_sync_report(report, outcomes=('created', 'updated', 'unchanged'))
+        return
+
+    concurrency = bulk_concurrency(client, obj.config, concurrency)
+
+    user = obj.config.get('user', 'unknown')
+
+    def apply_alert(item):
+        path, alert = item
+        alert['last_modified_by'] = user
+
+        current = plan['matches'].get(path)
+        if current is None:
+            return client.create_alert_definition(alert)
+
+        alert.setdefault('id', current['id'])
+        return client.update_alert_definition(alert)
+
+    with Action('Updating {} alert definitions ...'.format(len(plan['created']) + len(plan['updated'])), nl=True):
+        for res in run_bulk(apply_alert, plan['created'] + plan['updated'], concurrency=concurrency,
+                            adaptive=adaptive):
+            path = res.item[0]
+            if res.error is not None:
+                report.failed.append((path, res.error))
+            elif path in plan['matches']:
+                report.updated.append(path)
+            else:
+                report.created.append(path)
+
+    render_sync_report(report, outcomes=('created', 'updated', 'unchanged'))
+
+    if report.failed:
+        fatal_error('Failed to apply {} alert definitions!'.format(len(report.failed)))
+
+
 @alert_definitions.command('delete')
 @click.argument('alert_id', type=int)
 @click.pass_obj
@@ -1,15 +1,25 @@
+import os
+
 import yaml
 
 import click
 
-from clickclick import AliasedGroup, Action, ok
+from clickclick import Action, ok, fatal_error
 
-from zmon_cli.cmds.command import cli, get_client, yaml_output_option, pretty_json, output_option
-from zmon_cli.output import dump_yaml, Output, render_checks
-from zmon_cli.client import ZmonArgumentError
+from zmon_cli.cmds.command import cli, get_client, yaml_output_option, pretty_json, output_option, adaptive_option
+from zmon_cli.cmds.command import AbbreviatedGroup, enable_entity_cache, enable_response_cache, definition_filter
+from zmon_cli.cmds.command import bulk_concurrency
+from zmon_cli.output import dump_yaml, Output, render_checks, render_bulk_summary, render_sync_report
+from zmon_cli.output import render_check_load
+from zmon_cli.bulk import BulkSummary, run_bulk
+from zmon_cli.cache import CheckValidationCache
+from zmon_cli.client import Zmon, ZmonArgumentError, SyncReport
+from zmon_cli.definitions import load_definitions, plan_definitions, check_definition_keys
+from zmon_cli.filters import filter_definitions
+from zmon_cli.load import CheckLoadEstimator, team_load
 
 
-@cli.group('check-definitions', cls=AliasedGroup)
+@cli.group('check-definitions', cls=AbbreviatedGroup, abbreviations={'l': 'list'})
 @click.pass_obj
 def check_definitions(obj):
     """Manage check definitions"""
@@ -67,6 +77,7 @@ def get_check_definition(obj, check_id, output, pretty):
 def list_check_definitions(obj, output, pretty):
     """List all active check definitions"""
     client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
 
     with Output('Retrieving active check definitions ...', nl=True, output=output, pretty_json=pretty,
                 printer=render_checks) as act:
@@ -79,20 +90,31 @@ def list_check_definitions(obj, output, pretty):
 
 
 @check_definitions.command('filter')
-@click.argument('field')
-@click.argument('value')
+@click.argument('field', required=False)
+@click.argument('value', required=False)
+@click.option('-e', '--expression', help='Filter expression, e.g. "owning_team == \'zmon\' and interval < 60".')
 @click.pass_obj
 @output_option
 @pretty_json
-def filter_check_definitions(obj, field, value, output, pretty):
-    """Filter active check definitions"""
+def filter_check_definitions(obj, field, value, expression, output, pretty):
+    """
+    Filter active check definitions
+
+    Either by a single FIELD VALUE match, or by a filter expression supporting and/or/not, comparisons, "in", regex
+    matches with "=~" and nested fields, e.g.:
+
+        zmon check-definitions filter -e "name =~ '^Kubernetes' and 'instance' in entities.type"
+    """
+    predicate = definition_filter(field, value, expression)
+
     client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
 
     with Output('Retrieving and filtering check definitions ...', nl=True, output=output, pretty_json=pretty,
                 printer=render_checks) as act:
         checks = client.get_check_definitions()
 
-        filtered = [check for check in checks if check.get(field) == value]
+        filtered = list(filter_definitions(checks, predicate))
 
         for check in filtered:
             check['link'] = client.check_definition_url(check)
@@ -120,6 +142,167 @@ def update(obj, yaml_file, skip_validation):
             act.error(str(e))
 
 
+@check_definitions.command('validate')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('-p', '--processes', type=click.IntRange(min=1),
+              help='Number of worker processes parsing check commands. Default is the number of CPUs.')
+@click.option('--no-cache', is_flag=True, help='Validate all check commands, ignoring previous results.')
+def validate(directory, processes, no_cache):
+    """
+    Validate check command syntax of all check definition YAML files in a directory
+
+    Results are cached by command content, so unchanged check commands are not parsed again.
+    """
+    summary = BulkSummary()
+
+    with Action('Validating check definitions in {} ...'.format(directory), nl=True):
+        definitions = load_definitions(directory, summary.add)
+
+        commands = []
+        for path, check in definitions:
+            if isinstance(check.get('command'), str):
+                commands.append((path, check['command']))
+            else:
+                summary.add(path, 'Missing check command')
+
+        cache = None if no_cache else CheckValidationCache()
+        errors = Zmon.validate_check_commands([src for _, src in commands], cache=cache, processes=processes)
+
+        for (path, _), e in zip(commands, errors):
+            summary.add(path, e)
+
+    render_bulk_summary(summary, noun='check definitions')
+
+    if summary.failures:
+        fatal_error('Invalid check definitions found!')
+
+
+@check_definitions.command('apply')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('-n', '--concurrency', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of check definitions updated in parallel.')
+@adaptive_option
+@click.option('--dry-run', is_flag=True, help='Only report what would change.')
+@click.option('--skip-validation', is_flag=True, help='Skip check command syntax validation.')
+@click.pass_obj
+def apply(obj, directory, concurrency, adaptive, dry_run, skip_validation):
+    """
+    Create or update all check definition YAML files in a directory
+
+    Current check definitions are retrieved once, only new or changed check definitions are updated.
+    """
+    report = SyncReport()
+
+    with Action('Loading check definitions from {} ...'.format(directory)):
+        definitions = load_definitions(directory, lambda path, e: report.failed.append((path, e)))
+
+    if not skip_validation:
+        commands = [check.get('command', '') for _, check in definitions]
+        errors = Zmon.validate_check_commands(commands, cache=CheckValidationCache())
+
+        valid = []
+        for (path, check), e in zip(definitions, errors):
+            if e is None:
+                valid.append((path, check))
+            else:
+                report.failed.append((path, 'Invalid check command: {}'.format(e)))
+        definitions = valid
+
+    for _, check in definitions:
+        check.setdefault('status', 'ACTIVE')
+
+    client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
+
+    with Action('Retrieving active check definitions ...'):
+        plan = plan_definitions(definitions, client.get_check_definitions(), check_definition_keys)
+
+    report.unchanged = [path for path, _ in plan['unchanged']]
+
+    if dry_run:
+        report.created = [path for path, _ in plan['created']]
+        report.updated = [path for path, _ in plan['updated']]
+        render_sync_report(report, outcomes=('created', 'updated', 'unchanged'))
+        return
+
+    concurrency = bulk_concurrency(client, obj.config, concurrency)
+
+    user = obj.get('user', 'unknown')
+    created = set(path for path, _ in plan['created'])
+
+    def update_check(item):
+        path, check = item
+        check['last_modified_by'] = user
+        return client.update_check_definition(check, skip_validation=True)
+
+    with Action('Updating {} check definitions ...'.format(len(plan['created']) + len(plan['updated'])), nl=True):
+        for res in run_bulk(update_check, plan['created'] + plan['updated'], concurrency=concurrency,
+                            adaptive=adaptive):
+            path = res.item[0]
+            if res.error is not None:
+                report.failed.append((path, res.error))
+            elif path in created:
+                report.created.append(path)
+            else:
+                report.updated.append(path)
+
+    render_sync_report(report, outcomes=('created', 'updated', 'unchanged'))
+
+    if report.failed:
+        fatal_error('Failed to apply {} check definitions!'.format(len(report.failed)))
+
+
+@check_definitions.command('load')
+@click.argument('checks', nargs=-1)
+@click.option('--limit', type=click.IntRange(min=0), help='Only show the N checks causing the highest load.')
+@click.option('--refresh', is_flag=True, help='Refresh the local entity cache.')
+@click.pass_obj
+@output_option
+@pretty_json
+def check_load(obj, checks, limit, refresh, output, pretty):
+    """
+    Estimate check invocations per second on the ZMON workers
+
+    CHECKS are check definition IDs, YAML files or directories of YAML files. Default is all active check definitions.
+    Every check runs once per interval for each entity matching its entities filter, e.g.:
+
+        zmon check-definitions load new-check.yaml 123 --limit 10
+    """
+    client = get_client(obj.config)
+    enable_entity_cache(client, obj.config, refresh=refresh)
+    enable_response_cache(client, obj.config)
+
+    with Output('Estimating check load ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_check_load) as act:
+        definitions = []
+        ids = []
+
+        def invalid_file(path, e):
+            act.error('{}: {}'.format(path, e))
+
+        for check in checks:
+            if check.isdigit():
+                ids.append(int(check))
+            elif os.path.isdir(check):
+                definitions.extend(d for _, d in load_definitions(check, invalid_file))
+            else:
+                with open(check, 'rb') as fd:
+                    definitions.append(yaml.safe_load(fd))
+
+        if ids or not checks:
+            active = client.get_check_definitions()
+            definitions.extend(c for c in active if not ids or c['id'] in ids)
+
+        estimator = CheckLoadEstimator(client.get_entities())
+        loads = sorted((estimator.estimate(c) for c in definitions), key=lambda load: -load.invocations_per_sec)
+
+        act.echo({
+            'total': sum(load.invocations_per_sec for load in loads),
+            'teams': team_load(loads),
+            'checks': [dict(load._asdict()) for load in loads[:limit]],
+        })
+
+
 @check_definitions.command('delete')
 @click.argument('check_id', type=int)
 @click.pass_obj
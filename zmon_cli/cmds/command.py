@@ -2,7 +2,7 @@ import click
 import logging
 import os
 
-from clickclick import AliasedGroup
+from clickclick import AliasedGroup, fatal_error, warning
 from easydict import EasyDict
 
 from zmon_cli import __version__
@@ -12,21 +12,42 @@ from zmon_cli.config import get_config_data, configure_logging, set_config_file
 
 from zmon_cli.output import Output, render_status
 
-from zmon_cli.client import Zmon
+from zmon_cli.client import Zmon, DEFAULT_POOL_MAXSIZE, DEFAULT_RETRIES
+from zmon_cli.cache import EntityCache, ResponseCache, DEFAULT_ENTITY_CACHE_TTL, DEFAULT_RESPONSE_CACHE_TTL
+from zmon_cli.filters import compile_filter, FilterSyntaxError
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
-output_option = click.option('-o', '--output', type=click.Choice(['text', 'json', 'yaml']), default='text',
+OUTPUT_FORMATS = ['text', 'json', 'yaml', 'ndjson']
+
+output_option = click.option('-o', '--output', type=click.Choice(OUTPUT_FORMATS), default='text',
                              help='Use alternative output format')
 
-yaml_output_option = click.option('-o', '--output', type=click.Choice(['text', 'json', 'yaml']), default='yaml',
+yaml_output_option = click.option('-o', '--output', type=click.Choice(OUTPUT_FORMATS), default='yaml',
                                   help='Use alternative output format. Default is YAML.')
 
+adaptive_option = click.option('--adaptive', is_flag=True,
+                               help='Adapt the number of parallel requests to ZMON capacity, up to --concurrency.')
+
 pretty_json = click.option('--pretty', is_flag=True,
                            help='Pretty print JSON output. Ignored if output format is not JSON')
 
 
+class AbbreviatedGroup(AliasedGroup):
+    """
+    Click group allowing abbreviated commands, which keeps resolving ``abbreviations`` of existing commands after new
+    commands with the same prefix are added.
+    """
+
+    def __init__(self, *args, abbreviations=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.abbreviations = abbreviations or {}
+
+    def get_command(self, ctx, cmd_name):
+        return super().get_command(ctx, self.abbreviations.get(cmd_name, cmd_name))
+
+
 def print_version(ctx, param, value):
     if not value or ctx.resilient_parsing:
         return
@@ -37,29 +58,87 @@ def print_version(ctx, param, value):
 def get_client(config):
     verify = config.get('verify', True)
 
+    kwargs = {
+        'verify': verify,
+        'timeout': config.get('timeout', DEFAULT_TIMEOUT),
+        'pool_maxsize': config.get('max_connections', DEFAULT_POOL_MAXSIZE),
+        'rate_limit': config.get('rate_limit'),
+        'retries': config.get('retries', DEFAULT_RETRIES),
+    }
+
     if 'user' in config and 'password' in config:
-        return Zmon(config['url'], username=config['user'], password=config['password'], verify=verify,
-                    timeout=config.get('timeout', DEFAULT_TIMEOUT))
+        return Zmon(config['url'], username=config['user'], password=config['password'], **kwargs)
     elif os.environ.get('ZMON_TOKEN'):
-        return Zmon(config['url'], token=os.environ.get('ZMON_TOKEN'), verify=verify,
-                    timeout=config.get('timeout', DEFAULT_TIMEOUT))
+        return Zmon(config['url'], token=os.environ.get('ZMON_TOKEN'), **kwargs)
     elif 'token' in config:
-        return Zmon(config['url'], token=config['token'], verify=verify, timeout=config.get('timeout', DEFAULT_TIMEOUT))
+        return Zmon(config['url'], token=config['token'], **kwargs)
 
     raise RuntimeError('Failed to intitialize ZMON client. Invalid configuration!')
 
 
+def bulk_concurrency(client, config, concurrency):
+    """
+    Return the concurrency of a bulk command, capped at the ``max_connections`` config or ``--max-connections``, and
+    grow the connection pool of ``client`` to it.
+    """
+    max_connections = config.get('max_connections')
+
+    if max_connections and concurrency > max_connections:
+        warning('Concurrency {} exceeds the maximum of {} connections, using {}.'.format(
+            concurrency, max_connections, max_connections), err=True)
+        concurrency = max_connections
+
+    client.ensure_pool_size(concurrency)
+
+    return concurrency
+
+
+def enable_entity_cache(client, config, refresh=False):
+    """Make ``client`` read entities through the local cache, with TTL from ``entity_cache_ttl`` config."""
+    ttl = 0 if refresh else config.get('entity_cache_ttl', DEFAULT_ENTITY_CACHE_TTL)
+    client.entity_cache = EntityCache(ttl=ttl)
+
+
+def enable_response_cache(client, config):
+    """
+    Make ``client`` read active check and alert definitions through the local response cache, with the TTL of
+    responses without validators from ``definitions_cache_ttl`` config.
+    """
+    client.response_cache = ResponseCache(ttl=config.get('definitions_cache_ttl', DEFAULT_RESPONSE_CACHE_TTL))
+
+
+def definition_filter(field, value, expression):
+    """Return a predicate for the ``filter`` commands, combining an exact FIELD VALUE match and a filter expression."""
+    if (field is None) != (value is None) or (field is None and not expression):
+        fatal_error('Either FIELD and VALUE or --expression is required!')
+
+    try:
+        match = compile_filter(expression) if expression else None
+    except FilterSyntaxError as e:
+        fatal_error('Invalid filter expression: {}'.format(e))
+
+    def predicate(d):
+        return (field is None or d.get(field) == value) and (match is None or match(d))
+
+    return predicate
+
+
 ########################################################################################################################
 # CLI
 ########################################################################################################################
 
-@click.group(cls=AliasedGroup, context_settings=CONTEXT_SETTINGS)
+@click.group(cls=AbbreviatedGroup, context_settings=CONTEXT_SETTINGS, abbreviations={'e': 'entities'})
 @click.option('-c', '--config-file', help='Use alternative config file', default=DEFAULT_CONFIG_FILE, metavar='PATH')
 @click.option('-v', '--verbose', help='Verbose logging', is_flag=True)
 @click.option('-V', '--version', is_flag=True, callback=print_version, expose_value=False, is_eager=True)
 @click.option('-t', '--timeout', help='timeout for calls', default=DEFAULT_TIMEOUT)
+@click.option('--max-connections', type=click.IntRange(min=1),
+              help='Maximum number of keep-alive connections to ZMON. Default is the max_connections config, or {}.'
+              .format(DEFAULT_POOL_MAXSIZE))
+@click.option('--rate-limit', type=click.FloatRange(min=0), metavar='RPS',
+              help='Maximum requests per second to ZMON, 0 for no limit. Default is the rate_limit config.')
 @click.pass_context
-def cli(ctx, config_file, verbose, timeout=DEFAULT_TIMEOUT):
+def cli(ctx, config_file, verbose, max_connections, rate_limit, timeout=DEFAULT_TIMEOUT):
     """
     ZMON command line interface
     """
@@ -73,6 +152,12 @@ def cli(ctx, config_file, verbose, timeout=DEFAULT_TIMEOUT):
 
     config['timeout'] = timeout
 
+    if max_connections:
+        config['max_connections'] = max_connections
+
+    if rate_limit is not None:
+        config['rate_limit'] = rate_limit
+
     ctx.obj = EasyDict(config=config)
 
 
@@ -1,27 +1,145 @@
+import re
+import fnmatch
+import functools
+
 import click
 
-from zmon_cli.cmds.command import cli, get_client, yaml_output_option, pretty_json
+from clickclick import fatal_error
+
+from zmon_cli.cmds.command import cli, get_client, enable_response_cache, yaml_output_option, pretty_json
+from zmon_cli.cmds.command import bulk_concurrency
 from zmon_cli.output import Output
+from zmon_cli.bulk import run_bulk
+
+
+ENTITY_MATCH_MODES = ('exact', 'glob', 'regex')
+
+
+def entity_id_matcher(entity_ids, mode='exact'):
+    """
+    Return a predicate matching entity IDs against ``entity_ids``, or ``None`` to match all entities.
+
+    Exact IDs are looked up in a set, glob and regex patterns are combined into a single compiled expression.
+
+    >>> match = entity_id_matcher(['app-*', 'db-1'], mode='glob')
+    >>> match('app-1'), match('db-1'), match('db-10')
+    (True, True, False)
+
+    :raises: re.error for invalid regular expressions.
+    """
+    if not entity_ids:
+        return None
+
+    if mode == 'exact':
+        return frozenset(entity_ids).__contains__
+
+    if mode == 'glob':
+        regex = re.compile('|'.join('(?:{})'.format(fnmatch.translate(p)) for p in entity_ids))
+        return lambda entity_id: regex.match(entity_id) is not None
+
+    regex = re.compile('|'.join('(?:{})'.format(p) for p in entity_ids))
+    return lambda entity_id: regex.search(entity_id) is not None
+
+
+def alert_values(rows, match=None, history=False):
+    """
+    Reduce alert data ``rows`` to the latest check value per entity, or to all ``results`` if ``history`` is set.
+
+    Rows are consumed one at a time, so a streamed response is never held in memory as a whole.
+
+    :param rows: Iterable of alert data rows, see :func:`zmon_cli.client.Zmon.iter_alert_data`.
+    :type rows: iterable
+
+    :param match: Predicate selecting entity IDs, see :func:`entity_id_matcher`. Default is all entities.
+    :type match: callable
+
+    :param history: Keep the full ``results`` list of every entity instead of the latest value.
+    :type history: bool
+
+    :rtype: dict
+    """
+    values = {}
+    for row in rows:
+        results = row['results']
+        if not results or (match is not None and not match(row['entity'])):
+            continue
+        values[row['entity']] = results if history else results[0]['value']
+
+    return values
+
+
+def fetch_alert_values(client, alert_id, match=None, history=False):
+    return alert_values(client.iter_alert_data(alert_id), match=match, history=history)
 
 
 @cli.command()
-@click.argument('alert_id')
+@click.argument('alert_id', required=False)
 @click.argument('entity_ids', nargs=-1)
+@click.option('--team', 'teams', multiple=True,
+              help='Retrieve data of all active alerts of a team, instead of ALERT_ID. Can be repeated.')
+@click.option('-m', '--match', 'match_mode', type=click.Choice(ENTITY_MATCH_MODES), default='exact',
+              show_default=True, help='How ENTITY_IDS are matched: exact IDs, glob or regular expression patterns.')
+@click.option('--history', is_flag=True, help='Include all check results per entity, not only the latest value.')
+@click.option('-n', '--concurrency', type=click.IntRange(min=1), default=4, show_default=True,
+              help='Number of alerts retrieved in parallel.')
 @click.pass_obj
 @yaml_output_option
 @pretty_json
-def data(obj, alert_id, entity_ids, output, pretty):
-    """Get check data for alert and entities"""
+def data(obj, alert_id, entity_ids, teams, match_mode, history, concurrency, output, pretty):
+    """
+    Get check data for alerts and entities
+
+    ALERT_ID can be a comma separated list of alert IDs. Data of many alerts is retrieved in parallel, NDJSON output
+    prints one line per alert as soon as its data is available, e.g.:
+
+        zmon data 1,2,3 -o ndjson
+
+        zmon data --team zmon -o ndjson
+
+    ENTITY_IDS restrict the data to the given entities, with --match glob or regex they are patterns, e.g.:
+
+        zmon data 1 'app-*' --match glob
+    """
+    if teams and alert_id:
+        # without an ALERT_ID, the first positional argument is an entity ID
+        entity_ids = (alert_id,) + entity_ids
+        alert_id = None
+
+    if not alert_id and not teams:
+        fatal_error('Either ALERT_ID or --team is required!')
+
+    try:
+        match = entity_id_matcher(entity_ids, match_mode)
+    except re.error as e:
+        fatal_error('Invalid entity ID pattern: {}'.format(e))
+
     client = get_client(obj.config)
 
-    with Output('Retrieving alert data ...', nl=True, output=output, pretty_json=pretty) as act:
-        data = client.get_alert_data(alert_id)
+    if alert_id and ',' not in alert_id:
+        with Output('Retrieving alert data ...', nl=True, output=output, pretty_json=pretty) as act:
+            act.echo(fetch_alert_values(client, alert_id, match, history))
+        return
+
+    if teams:
+        enable_response_cache(client, obj.config)
+        alert_ids = [a['id'] for a in client.get_alert_definitions()
+                     if a.get('team') in teams or a.get('responsible_team') in teams]
+    else:
+        alert_ids = [i.strip() for i in alert_id.split(',') if i.strip()]
+        if not all(i.isdigit() for i in alert_ids):
+            fatal_error('Invalid alert IDs: {}'.format(alert_id))
+        alert_ids = [int(i) for i in alert_ids]
 
-        if not entity_ids:
-            result = data
-        else:
-            result = [d for d in data if d['entity'] in entity_ids]
+    concurrency = bulk_concurrency(client, obj.config, concurrency)
 
-        values = {v['entity']: v['results'][0]['value'] for v in result if len(v['results'])}
+    def results():
+        fetch = functools.partial(fetch_alert_values, client, match=match, history=history)
+        for res in run_bulk(fetch, alert_ids, concurrency=concurrency):
+            if res.error is not None:
+                yield {'alert_id': res.item, 'error': str(res.error)}
+            else:
+                yield {'alert_id': res.item, 'values': res.result}
 
-        act.echo(values)
+    with Output('Retrieving data of {} alerts ...'.format(len(alert_ids)), nl=True, output=output,
+                pretty_json=pretty) as act:
+        act.echo(results())
@@ -1,28 +1,85 @@
 import os
 import json
+import functools
 import yaml
 
 import requests
 import click
 
-from clickclick import AliasedGroup, Action, action, ok, fatal_error
+from clickclick import AliasedGroup, Action, action, ok, info, fatal_error
 
-from zmon_cli.cmds.command import cli, get_client, output_option, yaml_output_option, pretty_json
-from zmon_cli.output import render_entities, Output, log_http_exception
+from zmon_cli.cmds.command import cli, get_client, output_option, yaml_output_option, pretty_json, adaptive_option
+from zmon_cli.cmds.command import bulk_concurrency, enable_entity_cache
+from zmon_cli.output import render_entities, render_bulk_summary, parse_last_modified, Output, log_http_exception
+from zmon_cli.output import ENTITY_SORT_KEYS, render_sync_report
+from zmon_cli.bulk import BulkSummary, run_bulk
+from zmon_cli.index import EntityIndex
+from zmon_cli.snapshot import write_snapshot
 
 from zmon_cli.client import ZmonArgumentError
 
-from calendar import timegm
-from time import strptime
+
+# output formats which are written while the entities are still being downloaded
+STREAMING_OUTPUTS = ('json', 'ndjson')
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+cached_option = click.option('--cached', is_flag=True,
+                             help='Read entities through the local entity cache, refreshing it once expired.')
+
+refresh_option = click.option('--refresh', is_flag=True, help='Refresh the local entity cache. Implies --cached.')
+
+
+def load_entities(entity):
+    """Load a list of entities from a JSON/YAML file path or a JSON string."""
+    if (entity.endswith('.json') or entity.endswith('.yaml')) and os.path.exists(entity):
+        with open(entity, 'rb') as fd:
+            data = yaml.safe_load(fd)
+    else:
+        data = json.loads(entity)
+
+    if not isinstance(data, list):
+        data = [data]
+
+    return data
+
+
+def iter_ndjson(fd, on_error):
+    """
+    Lazily yield entities from newline-delimited JSON.
+
+    Invalid lines are reported through ``on_error(name, exception)`` and skipped.
+    """
+    for line_no, line in enumerate(fd, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            on_error('line {}'.format(line_no), e)
 
 
 def entity_last_modified(e):
     try:
-        return timegm(strptime(e.get('last_modified'), '%Y-%m-%d %H:%M:%S.%f'))
+        return parse_last_modified(e.get('last_modified'))
     except Exception:
         return 0
 
 
+def table_options(f):
+    f = click.option('--limit', type=click.IntRange(min=0), help='Only show the first N entities of text output.')(f)
+    f = click.option('--sort', type=click.Choice(ENTITY_SORT_KEYS), default='last_modified', show_default=True,
+                     help='Sort text output by this attribute.')(f)
+    f = click.option('--reverse', is_flag=True, help='Reverse the sort order of text output.')(f)
+    return f
+
+
+def entities_printer(limit, sort, reverse):
+    return functools.partial(render_entities, limit=limit, sort=sort, reverse=reverse)
+
+
 ########################################################################################################################
 # ENTITIES
 ########################################################################################################################
@@ -31,13 +88,24 @@ def entity_last_modified(e):
 @click.pass_context
 @output_option
 @pretty_json
-def entities(ctx, output, pretty):
+@cached_option
+@refresh_option
+@table_options
+def entities(ctx, output, pretty, cached, refresh, limit, sort, reverse):
     """Manage entities"""
     if not ctx.invoked_subcommand:
         client = get_client(ctx.obj.config)
 
-        with Output('Retrieving all entities ...', output=output, printer=render_entities, pretty_json=pretty) as act:
-            entities = client.get_entities()
+        if cached or refresh:
+            enable_entity_cache(client, ctx.obj.config, refresh=refresh)
+
+        printer = entities_printer(limit, sort, reverse)
+
+        with Output('Retrieving all entities ...', output=output, printer=printer, pretty_json=pretty) as act:
+            if output in STREAMING_OUTPUTS and client.entity_cache is None:
+                entities = client.iter_entities()
+            else:
+                entities = client.get_entities()
             act.echo(entities)
 
 
@@ -57,73 +125,249 @@ def get_entity(obj, entity_id, output, pretty):
 
 @entities.command('filter')
 @click.argument('filters', nargs=-1)
+@click.option('--local', is_flag=True, help='Filter the locally cached entities instead of querying the backend.')
+@click.option('--prefix', 'prefixes', nargs=2, multiple=True, metavar='KEY PREFIX',
+              help='Match attribute values by prefix. Requires --local. Can be repeated.')
+@click.option('--regex', 'regexes', nargs=2, multiple=True, metavar='KEY REGEX',
+              help='Match attribute values by regular expression. Requires --local. Can be repeated.')
 @click.pass_obj
 @output_option
 @pretty_json
-def filter_entities(obj, filters, output, pretty):
+@cached_option
+@refresh_option
+@table_options
+def filter_entities(obj, filters, local, prefixes, regexes, output, pretty, cached, refresh, limit, sort, reverse):
     """
     List entities filtered by key values pairs
 
     E.g.:
         zmon entities filter type instance application_id my-app
+
+        zmon entities filter --local type instance --prefix id my-app- --regex team '^(zmon|stups)$'
+
+    JSON and NDJSON output is streamed in backend order, other formats are sorted by last modification.
     """
     client = get_client(obj.config)
 
     if len(filters) % 2:
         fatal_error('Invalid filters count: expected even number of args!')
 
-    with Output('Retrieving and filtering entities ...', nl=True, output=output, printer=render_entities,
-                pretty_json=pretty) as act:
+    if (prefixes or regexes) and not local:
+        fatal_error('--prefix and --regex require --local')
+
+    if cached or refresh or local:
+        enable_entity_cache(client, obj.config, refresh=refresh)
+
+    with Output('Retrieving and filtering entities ...', nl=True, output=output,
+                printer=entities_printer(limit, sort, reverse), pretty_json=pretty) as act:
 
         query = dict(zip(filters[0::2], filters[1::2]))
 
-        entities = client.get_entities(query=query)
-        entities = sorted(entities, key=entity_last_modified)
+        if local:
+            index = EntityIndex(client.get_entities())
+            entities = index.filter(query, prefix=dict(prefixes), regex=dict(regexes))
+        elif output in STREAMING_OUTPUTS and client.entity_cache is None:
+            entities = client.iter_entities(query=query)
+        else:
+            entities = client.get_entities(query=query)
+
+        # text output is sorted while rendering
+        if output != 'text' and isinstance(entities, list):
+            entities = sorted(entities, key=entity_last_modified)
 
         act.echo(entities)
 
 
+@entities.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('-f', '--filter', 'filters', nargs=2, multiple=True, metavar='KEY VALUE',
+              help='Only export matching entities. Can be repeated.')
+@click.option('--format', 'fmt', type=click.Choice(['snapshot', 'json']), default='snapshot', show_default=True,
+              help='Columnar snapshot, readable with zmon_cli.snapshot.EntitySnapshot, or a JSON list.')
+@click.pass_obj
+@cached_option
+@refresh_option
+def export_entities(obj, path, filters, fmt, cached, refresh):
+    """
+    Export entities to a file
+
+    E.g.:
+        zmon entities export entities.snapshot --filter type instance
+    """
+    client = get_client(obj.config)
+
+    if cached or refresh:
+        enable_entity_cache(client, obj.config, refresh=refresh)
+
+    with Action('Exporting entities to {} ...'.format(path)) as act:
+        entities = client.get_entities(query=dict(filters) or None)
+
+        if fmt == 'snapshot':
+            count = write_snapshot(entities, path)
+        else:
+            with open(path, 'w') as fd:
+                json.dump(entities, fd)
+            count = len(entities)
+
+        act.ok('{} entities'.format(count))
+
+
 @entities.command('push')
 @click.argument('entity')
+@click.option('-n', '--concurrency', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of entities pushed in parallel.')
+@adaptive_option
 @click.pass_obj
-def push_entity(obj, entity):
-    """Push one or more entities"""
+def push_entity(obj, entity, concurrency, adaptive):
+    """
+    Push one or more entities
+
+    ENTITY is a JSON string, a JSON/YAML file, or a newline-delimited JSON file (.ndjson, .jsonl). Use "-" to read
+    newline-delimited JSON from stdin, e.g.:
+
+        produce-entities | zmon entities push - --concurrency 8
+
+    Newline-delimited JSON is read lazily and pushed while reading.
+    """
     client = get_client(obj.config)
 
-    if (entity.endswith('.json') or entity.endswith('.yaml')) and os.path.exists(entity):
-        with open(entity, 'rb') as fd:
-            data = yaml.safe_load(fd)
-    else:
-        data = json.loads(entity)
+    concurrency = bulk_concurrency(client, obj.config, concurrency)
 
-    if not isinstance(data, list):
-        data = [data]
+    summary = BulkSummary()
 
     with Action('Creating new entities ...', nl=True) as act:
-        for e in data:
-            action('Creating entity {} ...'.format(e['id']))
-            try:
-                client.add_entity(e)
-                ok()
-            except ZmonArgumentError as e:
-                act.error(str(e))
-            except requests.HTTPError as e:
-                log_http_exception(e, act)
-            except Exception as e:
-                act.error('Failed: {}'.format(str(e)))
+
+        def invalid_line(name, e):
+            summary.add(name, e)
+            act.error('Invalid entity on {}: {}'.format(name, e))
+
+        fd = None
+        if entity == '-':
+            data = iter_ndjson(click.get_text_stream('stdin', encoding='utf-8'), invalid_line)
+        elif entity.endswith(NDJSON_EXTENSIONS) and os.path.exists(entity):
+            fd = open(entity, encoding='utf-8')
+            data = iter_ndjson(fd, invalid_line)
+        else:
+            data = load_entities(entity)
+
+        try:
+            for res in run_bulk(client.add_entity, data, concurrency=concurrency, adaptive=adaptive):
+                entity_id = res.item.get('id') if isinstance(res.item, dict) else res.item
+                summary.add(entity_id, res.error)
+
+                action('Creating entity {} ...'.format(entity_id))
+                if res.error is None:
+                    ok()
+                elif isinstance(res.error, ZmonArgumentError):
+                    act.error(str(res.error))
+                elif isinstance(res.error, requests.HTTPError):
+                    log_http_exception(res.error, act)
+                else:
+                    act.error('Failed: {}'.format(str(res.error)))
+        finally:
+            if fd is not None:
+                fd.close()
+
+    if summary.total > 1:
+        render_bulk_summary(summary, noun='entities')
+
+
+@entities.command('sync')
+@click.argument('entity')
+@click.option('--type', 'entity_type', required=True, help='Entity type to synchronize.')
+@click.option('-f', '--filter', 'filters', nargs=2, multiple=True, metavar='KEY VALUE',
+              help='Restrict synced remote entities, e.g. to an owning team. Can be repeated.')
+@click.option('--delete', is_flag=True, help='Delete remote entities which are not desired anymore.')
+@click.option('--dry-run', is_flag=True, help='Only report what would change.')
+@click.option('-n', '--concurrency', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of parallel requests.')
+@adaptive_option
+@click.pass_obj
+def sync_entities(obj, entity, entity_type, filters, delete, dry_run, concurrency, adaptive):
+    """
+    Sync entities of a type with a desired set
+
+    Only new or changed entities are pushed. E.g.:
+
+        zmon entities sync instances.yaml --type instance --filter team zmon --delete
+    """
+    client = get_client(obj.config)
+
+    data = load_entities(entity)
+
+    concurrency = bulk_concurrency(client, obj.config, concurrency)
+
+    msg = 'Syncing {} entities of type {}{} ...'.format(len(data), entity_type, ' (dry run)' if dry_run else '')
+    with Action(msg, nl=True) as act:
+        try:
+            report = client.sync_entities(data, entity_type, query=dict(filters), delete=delete, dry_run=dry_run,
+                                          concurrency=concurrency, adaptive=adaptive)
+        except ZmonArgumentError as e:
+            act.fatal_error(str(e))
+
+        render_sync_report(report, act)
 
 
 @entities.command('delete')
-@click.argument('entity_id')
+@click.argument('entity_id', required=False)
+@click.option('-f', '--filter', 'filters', nargs=2, multiple=True, metavar='KEY VALUE',
+              help='Delete all entities matching the filter instead of a single ID. Can be repeated.')
+@click.option('--dry-run', is_flag=True, help='Only list the entities matching the filter.')
+@click.option('-n', '--concurrency', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of entities deleted in parallel.')
+@adaptive_option
 @click.pass_obj
-def delete_entity(obj, entity_id):
-    """Delete a single entity by ID"""
+def delete_entity(obj, entity_id, filters, dry_run, concurrency, adaptive):
+    """
+    Delete a single entity by ID, or all entities matching a filter
+
+    E.g.:
+        zmon entities delete --filter type instance --filter application_id my-app --dry-run
+    """
+    if bool(entity_id) == bool(filters):
+        fatal_error('Either ENTITY_ID or --filter is required!')
+
     client = get_client(obj.config)
 
-    with Action('Deleting entity {} ...'.format(entity_id)) as act:
-        deleted = client.delete_entity(entity_id)
-        if not deleted:
-            act.error('Failed')
+    if entity_id:
+        with Action('Deleting entity {} ...'.format(entity_id)) as act:
+            deleted = client.delete_entity(entity_id)
+            if not deleted:
+                act.error('Failed')
+        return
+
+    query = dict(filters)
+
+    with Action('Retrieving matching entities ...'):
+        entity_ids = [e['id'] for e in client.get_entities(query=query, use_cache=False)]
+
+    if dry_run:
+        for e_id in entity_ids:
+            info(e_id)
+        info('{} entities would be deleted'.format(len(entity_ids)))
+        return
+
+    concurrency = bulk_concurrency(client, obj.config, concurrency)
+
+    summary = BulkSummary()
+
+    with Action('Deleting {} entities ...'.format(len(entity_ids)), nl=True) as act:
+        for res in run_bulk(client.delete_entity, entity_ids, concurrency=concurrency, adaptive=adaptive):
+            error = res.error
+            if error is None and not res.result:
+                error = 'Not deleted'
+
+            summary.add(res.item, error)
+
+            action('Deleting entity {} ...'.format(res.item))
+            if error is None:
+                ok()
+            elif isinstance(error, requests.HTTPError):
+                log_http_exception(error, act)
+            else:
+                act.error('Failed: {}'.format(error))
+
+    render_bulk_summary(summary, noun='entities')
 
 
 @entities.command('help')
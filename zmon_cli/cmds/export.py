@@ -0,0 +1,56 @@
+import os
+
+import click
+
+from clickclick import Action, error, fatal_error
+
+from zmon_cli.cmds.command import cli, get_client, bulk_concurrency, enable_response_cache
+from zmon_cli.output import render_sync_report
+from zmon_cli.bulk import run_bulk
+from zmon_cli.export import export_objects
+
+
+EXPORTS = ('check-definitions', 'alert-definitions', 'dashboards')
+
+
+@cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.pass_obj
+def export(obj, directory):
+    """
+    Export check definitions, alert definitions and dashboards to a directory
+
+    Writes one YAML file per object, e.g. DIRECTORY/check-definitions/123.yaml. Unchanged files are not rewritten and
+    files of deleted objects are removed, so the directory can be committed to git after each export.
+    """
+    client = get_client(obj.config)
+    enable_response_cache(client, obj.config)
+
+    concurrency = bulk_concurrency(client, obj.config, len(EXPORTS))
+
+    fetch = {
+        'check-definitions': client.get_check_definitions,
+        'alert-definitions': client.get_alert_definitions,
+        'dashboards': client.get_dashboards,
+    }
+
+    failed = False
+
+    with Action('Retrieving definitions and dashboards ...'):
+        results = {res.item: res for res in run_bulk(lambda kind: fetch[kind](), EXPORTS, concurrency=concurrency)}
+
+    for kind in EXPORTS:
+        res = results[kind]
+        if res.error is not None:
+            failed = True
+            error('Failed to retrieve {}: {}'.format(kind, res.error))
+            continue
+
+        with Action('Exporting {} {} ...'.format(len(res.result), kind), nl=True):
+            report = export_objects(os.path.join(directory, kind), res.result)
+            render_sync_report(report, outcomes=('updated', 'deleted'))
+
+        failed = failed or bool(report.failed)
+
+    if failed:
+        fatal_error('Export incomplete!')
@@ -0,0 +1,316 @@
+"""
+Offline evaluation of ZMON alert conditions.
+
+An alert condition is a Python expression over the check ``value``. Conditions starting with a comparison operator,
+like ``>100``, compare the value itself, the same as the ZMON worker does.
+
+Conditions only built from ``value``, numbers, arithmetic (``+``, ``-``, ``*``), comparisons and ``and``/``or``/``not``
+are evaluated over all numeric values at once with numpy, if installed. All other conditions and values are evaluated
+one by one.
+
+Conditions come from the server, so powers and shifts by large or computed amounts are rejected, and every single
+evaluation is aborted after a time limit.
+"""
+import ast
+import contextlib
+import re
+import signal
+import sys
+import threading
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class ConditionError(ValueError):
+    """Invalid alert condition."""
+    pass
+
+
+class ConditionTimeout(ConditionError):
+    """Evaluation of an alert condition exceeded its time limit."""
+    pass
+
+
+OPERATOR_PREFIX_RE = re.compile(r'^\s*(==|!=|<=|>=|<|>)')
+
+SAFE_BUILTINS = {
+    f.__name__: f for f in (abs, all, any, bool, float, int, len, max, min, round, sorted, str, sum)
+}
+SAFE_BUILTINS.update({'True': True, 'False': False, 'None': None})
+
+# floats represent integers exactly up to 2^53, larger values are compared one by one
+MAX_EXACT_FLOAT_INT = 2 ** 53
+
+# largest constant exponent of ``**`` and shift of ``<<``, larger results take unbounded time and memory
+MAX_EXPONENT = 128
+
+DEFAULT_TIME_LIMIT = 1.0
+
+_NUMBER_NODE = ast.Constant if sys.version_info >= (3, 8) else ast.Num
+
+
+def condition_expression(condition: str) -> str:
+    """
+    Return the Python expression of an alert ``condition``.
+
+    >>> condition_expression('>100')
+    'value >100'
+    >>> condition_expression("value['errors'] > 0")
+    "value['errors'] > 0"
+    """
+    condition = condition.strip()
+    return 'value ' + condition if OPERATOR_PREFIX_RE.match(condition) else condition
+
+
+def _constant_int(node):
+    # value of an integer constant, optionally negated, or None
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _constant_int(node.operand)
+        return None if value is None else -value if isinstance(node.op, ast.USub) else value
+
+    if isinstance(node, _NUMBER_NODE):
+        value = getattr(node, 'value', getattr(node, 'n', None))
+        return value if type(value) is int else None
+
+    return None
+
+
+def _check_cost(condition, tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+            raise ConditionError('Invalid condition {}: private attribute {}'.format(condition, node.attr))
+
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Pow, ast.LShift)):
+            exponent = _constant_int(node.right)
+            if exponent is None or abs(exponent) > MAX_EXPONENT:
+                raise ConditionError('Invalid condition {}: exponent or shift must be an integer constant up to {}'
+                                     .format(condition, MAX_EXPONENT))
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """
+    Raise :class:`ConditionTimeout` in the block after ``seconds``.
+
+    The limit relies on ``SIGALRM``, so it only applies in the main thread on platforms supporting it.
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def timeout(signum, frame):
+        raise ConditionTimeout('Condition evaluation exceeded {}s'.format(seconds))
+
+    previous = signal.signal(signal.SIGALRM, timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _number(node):
+    value = getattr(node, 'value', getattr(node, 'n', None))
+    return value if type(value) in (int, float) and abs(value) < MAX_EXACT_FLOAT_INT else None
+
+
+_COMPARISONS = {
+    ast.Eq: 'equal',
+    ast.NotEq: 'not_equal',
+    ast.Lt: 'less',
+    ast.LtE: 'less_equal',
+    ast.Gt: 'greater',
+    ast.GtE: 'greater_equal',
+}
+
+_ARITHMETIC = {
+    ast.Add: 'add',
+    ast.Sub: 'subtract',
+    ast.Mult: 'multiply',
+}
+
+
+def _vectorize(node):
+    # translate a condition AST into a function of a numpy array, or None if the condition uses anything else
+    if isinstance(node, ast.Name):
+        return (lambda a: a) if node.id == 'value' else None
+
+    if isinstance(node, _NUMBER_NODE):
+        number = _number(node)
+        return None if number is None else (lambda a: number)
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _vectorize(node.operand)
+        if operand is None:
+            return None
+        if isinstance(node.op, ast.Not):
+            return lambda a: numpy.logical_not(operand(a))
+        if isinstance(node.op, ast.USub):
+            return lambda a: numpy.negative(operand(a))
+        return None
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        left, right = _vectorize(node.left), _vectorize(node.right)
+        if left is None or right is None:
+            return None
+        op = getattr(numpy, _ARITHMETIC[type(node.op)])
+        return lambda a: op(left(a), right(a))
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_vectorize(v) for v in node.values]
+        if any(o is None for o in operands):
+            return None
+        op = numpy.logical_and if isinstance(node.op, ast.And) else numpy.logical_or
+        return lambda a: op.reduce([numpy.broadcast_to(o(a), a.shape) for o in operands])
+
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARISONS for op in node.ops):
+        operands = [_vectorize(v) for v in [node.left] + node.comparators]
+        if any(o is None for o in operands):
+            return None
+        ops = [getattr(numpy, _COMPARISONS[type(op)]) for op in node.ops]
+
+        def compare(a):
+            values = [o(a) for o in operands]
+            result = numpy.ones(a.shape, dtype=bool)
+            for op, left, right in zip(ops, values, values[1:]):
+                result &= op(left, right)
+            return result
+        return compare
+
+    return None
+
+
+def _is_number(value):
+    return type(value) in (int, float) and abs(value) < MAX_EXACT_FLOAT_INT
+
+
+class Condition:
+    """
+    Alert condition compiled once for evaluation over many check values.
+
+    >>> condition = Condition('>100')
+    >>> condition(250), condition.evaluate([50, 150, 'n/a'])
+    (True, [False, True, None])
+
+    :param condition: Alert condition, e.g. ``>100``.
+    :type condition: str
+
+    :param time_limit: Maximum seconds of evaluating the condition for a single value. Default is 1.
+    :type time_limit: float
+
+    :raises: ConditionError
+    """
+
+    def __init__(self, condition: str, time_limit=DEFAULT_TIME_LIMIT):
+        self.condition = condition
+        self.time_limit = time_limit
+
+        try:
+            tree = ast.parse(condition_expression(condition), mode='eval')
+        except SyntaxError as e:
+            raise ConditionError('Invalid condition {}: {}'.format(condition, e))
+
+        _check_cost(condition, tree)
+
+        self._code = compile(tree, '<condition>', 'eval')
+        self._vectorized = _vectorize(tree.body) if numpy is not None else None
+
+    @property
+    def vectorized(self) -> bool:
+        """Whether numeric values are evaluated as a numpy array."""
+        return self._vectorized is not None
+
+    def __call__(self, value) -> bool:
+        """
+        Evaluate the condition for a single check ``value``.
+
+        :raises: ConditionTimeout, or any exception raised by the condition, e.g. ``TypeError`` for values of
+                 incompatible types.
+        """
+        with time_limit(self.time_limit):
+            return bool(eval(self._code, {'__builtins__': SAFE_BUILTINS}, {'value': value}))
+
+    def evaluate(self, values) -> list:
+        """
+        Evaluate the condition for all ``values`` in one batch.
+
+        :param values: Sequence of check values.
+        :type values: list
+
+        :return: List of ``True`` or ``False`` per value, or ``None`` where the condition raised an error.
+        :rtype: list
+        """
+        results = [None] * len(values)
+        scalar = range(len(values))
+
+        if self._vectorized is not None:
+            if values and set(map(type, values)) <= {int, float}:
+                # common case of numeric check values only, checked without a Python level loop
+                array = numpy.array(values, dtype=float)
+                if numpy.abs(array).max() < MAX_EXACT_FLOAT_INT:
+                    return numpy.broadcast_to(numpy.asarray(self._vectorized(array), dtype=bool),
+                                              (len(values),)).tolist()
+
+            numeric = [i for i, v in enumerate(values) if _is_number(v)]
+
+            if numeric:
+                fired = self._vectorized(numpy.array([values[i] for i in numeric], dtype=float))
+                fired = numpy.broadcast_to(numpy.asarray(fired, dtype=bool), (len(numeric),))
+                for i, f in zip(numeric, fired.tolist()):
+                    results[i] = f
+
+                numeric = set(numeric)
+                scalar = [i for i in scalar if i not in numeric]
+
+        for i in scalar:
+            try:
+                results[i] = self(values[i])
+            except Exception:
+                pass
+
+        return results
+
+
+def what_if(values: dict, condition: str, new_condition: str) -> dict:
+    """
+    Compare which entities fire under alert ``condition`` and under ``new_condition``.
+
+    >>> report = what_if({'e-1': 120, 'e-2': 300, 'e-3': 'n/a'}, '>100', '>250')
+    >>> report['firing'], report['new_firing'], report['resolved'], report['errors']
+    (2, 1, ['e-1'], 1)
+
+    :param values: Latest check value per entity ID, see :func:`zmon_cli.cmds.data.alert_values`.
+    :type values: dict
+
+    :param condition: Current alert condition.
+    :type condition: str
+
+    :param new_condition: Alert condition to compare with.
+    :type new_condition: str
+
+    :return: Dict of ``entities`` count, ``firing`` and ``new_firing`` counts, sorted entity IDs of ``started`` and
+             ``resolved`` alerts, and the number of entities either condition failed to evaluate (``errors``).
+    :rtype: dict
+
+    :raises: ConditionError
+    """
+    entity_ids = list(values)
+    data = [values[e] for e in entity_ids]
+
+    old = Condition(condition).evaluate(data)
+    new = Condition(new_condition).evaluate(data)
+
+    return {
+        'condition': condition,
+        'new_condition': new_condition,
+        'entities': len(entity_ids),
+        'firing': sum(1 for f in old if f),
+        'new_firing': sum(1 for f in new if f),
+        'started': sorted(e for e, o, n in zip(entity_ids, old, new) if n and not o),
+        'resolved': sorted(e for e, o, n in zip(entity_ids, old, new) if o and not n),
+        'errors': sum(1 for o, n in zip(old, new) if o is None or n is None),
+    }
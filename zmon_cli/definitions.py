@@ -0,0 +1,130 @@
+import os
+
+import yaml
+
+
+DEFINITION_EXTENSIONS = ('.yaml', '.yml')
+
+# attributes set by ZMON on every update, exported files carry them but they are never applied
+SERVER_MANAGED_FIELDS = ('created_by', 'last_modified', 'last_modified_by')
+
+# libyaml based loader if PyYAML was built with it, parsing is then an order of magnitude faster
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def iter_definition_files(directory):
+    """Yield paths of all YAML files below ``directory``, in a stable order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(DEFINITION_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def load_definitions(directory, on_error) -> list:
+    """
+    Load one definition per YAML file below ``directory``.
+
+    Unreadable files and files not holding a single mapping are reported through ``on_error(path, exception)`` and
+    skipped.
+
+    :param directory: Directory of YAML definition files.
+    :type directory: str
+
+    :param on_error: Callable receiving the path and exception of invalid files.
+    :type on_error: callable
+
+    :return: List of ``(path, definition)`` tuples.
+    :rtype: list
+    """
+    definitions = []
+
+    for path in iter_definition_files(directory):
+        try:
+            with open(path, 'rb') as fd:
+                definition = yaml.load(fd, Loader=SafeLoader)
+
+            if not isinstance(definition, dict):
+                raise ValueError('Expected a single definition mapping')
+        except Exception as e:
+            on_error(path, e)
+            continue
+
+        definitions.append((path, definition))
+
+    return definitions
+
+
+def check_definition_keys(check) -> list:
+    """
+    Return identity keys of a check definition: its ID if set, and its name within the owning team, which is how the
+    ZMON backend matches check definitions posted without an ID.
+    """
+    keys = []
+    if check.get('id') is not None:
+        keys.append(('id', check['id']))
+    if check.get('name') is not None:
+        keys.append(('name', check.get('owning_team'), check['name']))
+    return keys
+
+
+def alert_definition_keys(alert) -> list:
+    """
+    Return identity keys of an alert definition: its ID if set, and its name within the team and check definition, so
+    re-applying an alert definition file without an ID does not create a duplicate.
+    """
+    keys = []
+    if alert.get('id') is not None:
+        keys.append(('id', alert['id']))
+    if alert.get('name') is not None:
+        keys.append(('name', alert.get('team'), str(alert.get('check_definition_id')), alert['name']))
+    return keys
+
+
+def definition_changed(local, remote, ignore=SERVER_MANAGED_FIELDS) -> bool:
+    """
+    Return ``True`` if any attribute set in the ``local`` definition differs from the ``remote`` definition.
+
+    Server managed attributes (``ignore``) are not compared, so exported files stay unchanged after being applied.
+    """
+    return any(k not in remote or remote[k] != v for k, v in local.items() if k not in ignore)
+
+
+def plan_definitions(definitions, remote, keys) -> dict:
+    """
+    Sort local definitions by what applying them would do to the ``remote`` definitions.
+
+    :param definitions: List of ``(path, definition)`` tuples, see :func:`load_definitions`.
+    :type definitions: list
+
+    :param remote: List of current definitions fetched from ZMON.
+    :type remote: list
+
+    :param keys: Callable returning the identity keys of a definition, e.g. :func:`check_definition_keys`.
+    :type keys: callable
+
+    :return: Dict of ``created``, ``updated`` and ``unchanged`` lists of ``(path, definition)`` tuples, and
+             ``matches`` mapping paths of updated and unchanged definitions to their remote definition.
+    :rtype: dict
+    """
+    index = {}
+    for definition in remote:
+        for key in keys(definition):
+            index.setdefault(key, definition)
+
+    plan = {'created': [], 'updated': [], 'unchanged': [], 'matches': {}}
+
+    for path, definition in definitions:
+        current = next((index[key] for key in keys(definition) if key in index), None)
+
+        if current is None:
+            plan['created'].append((path, definition))
+            continue
+
+        plan['matches'][path] = current
+        if definition_changed(definition, current):
+            plan['updated'].append((path, definition))
+        else:
+            plan['unchanged'].append((path, definition))
+
+    return plan
@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import logging
+
+from zmon_cli.cache import write_atomic
+from zmon_cli.client import SyncReport
+from zmon_cli.output import dump_yaml
+
+
+EXPORT_MANIFEST = '.manifest.json'
+
+# bump to rewrite all exported files, e.g. after changing the YAML layout
+EXPORT_FORMAT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def object_fingerprint(obj) -> str:
+    """Return a content hash of a JSON object, independent of key order."""
+    data = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1('{}\n{}'.format(EXPORT_FORMAT_VERSION, data).encode('utf-8')).hexdigest()
+
+
+def _load_manifest(directory):
+    try:
+        with open(os.path.join(directory, EXPORT_MANIFEST), 'rb') as f:
+            return json.loads(f.read().decode('utf-8'))
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logger.exception('Failed to read export manifest of {}'.format(directory))
+        return {}
+
+
+def _file_mode():
+    # mode of files created by open(), exported files are shared, e.g. in a git repository
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def export_objects(directory, objects, file_name=lambda obj: '{}.yaml'.format(obj['id'])) -> SyncReport:
+    """
+    Write one YAML file per object to ``directory`` and remove YAML files of objects which do not exist anymore.
+
+    Content hashes of the exported objects are kept in a manifest file, so unchanged objects are neither emitted as YAML
+    nor written again.
+
+    :param directory: Export directory, holding only exported objects of one kind.
+    :type directory: str
+
+    :param objects: Iterable of objects, e.g. check definitions.
+    :type objects: iterable
+
+    :param file_name: Callable returning the file name of an object. Default is ``<id>.yaml``.
+    :type file_name: callable
+
+    :return: Report of created, updated, unchanged and deleted file names.
+    :rtype: :class:`zmon_cli.client.SyncReport`
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    mode = _file_mode()
+    previous = _load_manifest(directory)
+    manifest = {}
+    names = set()
+    report = SyncReport()
+
+    for obj in objects:
+        name = file_name(obj)
+        path = os.path.join(directory, name)
+        names.add(name)
+
+        fingerprint = object_fingerprint(obj)
+        manifest[name] = fingerprint
+
+        exists = os.path.exists(path)
+        if exists and previous.get(name) == fingerprint:
+            report.unchanged.append(name)
+            continue
+
+        try:
+            # same as check-definitions get, dump_yaml fails on None values of literal fields
+            data = dump_yaml({k: v for k, v in obj.items() if v is not None}).encode('utf-8')
+
+            if exists:
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        report.unchanged.append(name)
+                        continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, data, mode=mode)
+        except Exception as e:
+            manifest.pop(name)
+            report.failed.append((name, e))
+            continue
+
+        (report.updated if exists else report.created).append(name)
+
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.yaml') and name not in names:
+            os.unlink(os.path.join(directory, name))
+            report.deleted.append(name)
+
+    write_atomic(os.path.join(directory, EXPORT_MANIFEST), json.dumps(manifest, sort_keys=True).encode('utf-8'),
+                 mode=mode)
+
+    return report
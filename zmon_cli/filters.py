@@ -0,0 +1,342 @@
+"""
+Filter expressions for check and alert definitions.
+
+An expression is compiled once into a Python predicate accepting a definition dict, e.g.::
+
+    team == 'zmon' and (priority <= 2 or 'critical' in tags)
+    name =~ '^Kubernetes' and not status == 'INACTIVE'
+    'instance' in entities.type and interval >= 60
+
+Supported are the comparisons ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=``, membership ``in`` and ``not in``, regular
+expression search ``=~`` and ``!~``, and the boolean operators ``and``, ``or`` and ``not`` with parentheses. Operands
+are dotted field paths, string, number, ``true``, ``false`` and ``null`` literals, and lists of literals. A bare field
+path is true if its value is truthy.
+
+Missing fields evaluate to ``null``. A field path crossing a list, like ``entities.type``, yields the values of all list
+items, and a comparison is true if it is true for any of them. Comparisons of incompatible types are false.
+
+String literals are raw, a backslash only escapes the enclosing quote and itself, so regular expressions like
+``name =~ '\\bnodes\\b'`` need no double escaping.
+
+``in`` tests list membership, dict keys, and substrings of a string. On a field path crossing a list it tests
+membership among the yielded values, so ``'inst' in entities.type`` does not match the type ``instance``.
+"""
+import re
+import functools
+import operator
+
+
+class FilterSyntaxError(ValueError):
+    """Invalid filter expression."""
+    pass
+
+
+TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+      | (?P<op>==|!=|<=|>=|=~|!~|<|>)
+      | (?P<punct>[()\[\],])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z0-9_]+)*)
+    )''', re.VERBOSE)
+
+STRING_ESCAPE_RE = re.compile(r'\\([\\\'"])')
+
+KEYWORDS = {'and', 'or', 'not', 'in'}
+CONSTANTS = {'true': True, 'false': False, 'null': None}
+
+
+def json_key(value):
+    """
+    Return a key of ``value`` which is equal for equal JSON values, and hashable for hashable ``value``.
+
+    JSON booleans never equal numbers, unlike Python's ``True == 1``.
+    """
+    return type(value) is bool, value
+
+
+def json_equal(a, b):
+    """
+    Compare two JSON values, see :func:`zmon_cli.filters.json_key`.
+
+    >>> json_equal(1, 1.0), json_equal(True, 1)
+    (True, False)
+    """
+    return json_key(a) == json_key(b)
+
+
+COMPARISONS = {
+    '==': json_equal,
+    '!=': lambda a, b: not json_equal(a, b),
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+_MISSING = object()
+
+
+def _decode_string(literal):
+    # raw string, only the enclosing quote and the backslash are escaped, e.g. regex escapes like \b are kept
+    quote = literal[0]
+    return STRING_ESCAPE_RE.sub(lambda m: m.group(1) if m.group(1) in (quote, '\\') else m.group(), literal[1:-1])
+
+
+def tokenize(expression):
+    """
+    Split ``expression`` into ``(kind, value)`` tokens.
+
+    >>> tokenize("team == 'zmon'")
+    [('name', 'team'), ('op', '=='), ('string', 'zmon')]
+    """
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+
+    while pos < len(expression):
+        m = TOKEN_RE.match(expression, pos)
+        if not m:
+            raise FilterSyntaxError('Unexpected character at position {}: {}'.format(pos, expression[pos:]))
+
+        kind = m.lastgroup
+        value = m.group(kind)
+
+        if kind == 'string':
+            value = _decode_string(value)
+        elif kind == 'number':
+            value = float(value) if any(c in value for c in '.eE') else int(value)
+        elif kind == 'name' and value in KEYWORDS:
+            kind = value
+        elif kind == 'name' and value in CONSTANTS:
+            kind, value = 'constant', CONSTANTS[value]
+
+        tokens.append((kind, value))
+        pos = m.end()
+
+    return tokens
+
+
+def _resolve_fanned(obj, path):
+    # field values of a dotted path, fanning out over lists, and whether the path crossed a list
+    values = [obj]
+    fanned = False
+    for key in path:
+        resolved = []
+        for value in values:
+            if isinstance(value, dict):
+                resolved.append(value.get(key, _MISSING))
+            elif isinstance(value, list) and not key.isdigit():
+                fanned = True
+                resolved.extend(v.get(key, _MISSING) if isinstance(v, dict) else _MISSING for v in value)
+            elif isinstance(value, list) and int(key) < len(value):
+                resolved.append(value[int(key)])
+            else:
+                resolved.append(_MISSING)
+        values = resolved
+
+    return [None if v is _MISSING else v for v in values] or [None], fanned
+
+
+def _resolve(obj, path):
+    return _resolve_fanned(obj, path)[0]
+
+
+def _safe(op):
+    def compare(a, b):
+        try:
+            return bool(op(a, b))
+        except TypeError:
+            return False
+    return compare
+
+
+def _contains(item, container, substring=True):
+    if isinstance(container, str):
+        if not substring:
+            return json_equal(item, container)
+        return isinstance(item, str) and item in container
+    if isinstance(container, list):
+        return any(json_equal(item, v) for v in container)
+    if isinstance(container, dict):
+        return isinstance(item, str) and item in container
+    return False
+
+
+class _Parser:
+
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value is not None and token[1] != value):
+            expected = value or kind or 'operand'
+            raise FilterSyntaxError('Expected {} but got {}'.format(expected, token[1] if token[0] else 'end'))
+        self.pos += 1
+        return token
+
+    def parse(self):
+        predicate = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise FilterSyntaxError('Unexpected token: {}'.format(self.peek()[1]))
+        return predicate
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek()[0] == 'or':
+            self.take()
+            operands.append(self.parse_and())
+
+        if len(operands) == 1:
+            return operands[0]
+        return lambda d: any(p(d) for p in operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek()[0] == 'and':
+            self.take()
+            operands.append(self.parse_not())
+
+        if len(operands) == 1:
+            return operands[0]
+        return lambda d: all(p(d) for p in operands)
+
+    def parse_not(self):
+        if self.peek()[0] == 'not':
+            self.take()
+            operand = self.parse_not()
+            return lambda d: not operand(d)
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        if self.peek() == ('punct', '('):
+            self.take()
+            predicate = self.parse_or()
+            self.take('punct', ')')
+            return predicate
+
+        left = self.parse_operand()
+
+        kind, value = self.peek()
+        if kind == 'op':
+            self.take()
+            if value in ('=~', '!~'):
+                return self.regex(left, negate=value == '!~')
+            compare = _safe(COMPARISONS[value])
+        elif kind == 'in' or (kind == 'not' and self.tokens[self.pos + 1:self.pos + 2] == [('in', 'in')]):
+            self.take()
+            negate = kind == 'not'
+            if negate:
+                self.take('in')
+            compare = (lambda a, b: not _contains(a, b)) if negate else _contains
+
+            if self.peek()[0] == 'name':
+                return self.membership(left, compare, negate)
+        else:
+            return lambda d: any(bool(v) for v in left(d))
+
+        right = self.parse_operand()
+
+        return lambda d: any(compare(a, b) for a in left(d) for b in right(d))
+
+    def membership(self, left, compare, negate=False):
+        _, value = self.take('name')
+        path = value.split('.')
+
+        def contains(d):
+            values, fanned = _resolve_fanned(d, path)
+            if not fanned:
+                return any(compare(a, b) for a in left(d) for b in values)
+
+            # member of the values yielded by a path crossing a list, never a substring of one of them
+            member = any(_contains(a, b, substring=False) for a in left(d) for b in values)
+            return member is not negate
+        return contains
+
+    def regex(self, left, negate=False):
+        _, pattern = self.take('string')
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            raise FilterSyntaxError('Invalid regular expression {}: {}'.format(pattern, e))
+
+        def match(d):
+            matched = any(isinstance(v, str) and regex.search(v) is not None for v in left(d))
+            return matched is not negate
+        return match
+
+    def parse_operand(self):
+        kind, value = self.peek()
+
+        if kind == 'name':
+            self.take()
+            path = value.split('.')
+            return lambda d: _resolve(d, path)
+
+        if kind == 'punct' and value == '[':
+            literal = self.parse_list()
+            return lambda d: [literal]
+
+        kind, value = self.take()
+        if kind not in ('string', 'number', 'constant'):
+            raise FilterSyntaxError('Expected operand but got {}'.format(value))
+        return lambda d: [value]
+
+    def parse_list(self):
+        self.take('punct', '[')
+        items = []
+        while self.peek() != ('punct', ']'):
+            kind, value = self.take()
+            if kind not in ('string', 'number', 'constant'):
+                raise FilterSyntaxError('Expected literal in list but got {}'.format(value))
+            items.append(value)
+            if self.peek() != ('punct', ']'):
+                self.take('punct', ',')
+        self.take('punct', ']')
+        return items
+
+
+@functools.lru_cache(maxsize=128)
+def compile_filter(expression: str):
+    """
+    Compile a filter ``expression`` into a predicate accepting a definition dict.
+
+    Compiled predicates are cached by expression.
+
+    >>> match = compile_filter("team == 'zmon' and priority <= 2")
+    >>> match({'team': 'zmon', 'priority': 1}), match({'team': 'zmon'})
+    (True, False)
+
+    :param expression: Filter expression, see :mod:`zmon_cli.filters`.
+    :type expression: str
+
+    :return: Predicate function.
+    :rtype: callable
+
+    :raises: FilterSyntaxError
+    """
+    if not expression or not expression.strip():
+        raise FilterSyntaxError('Empty filter expression')
+
+    return _Parser(expression).parse()
+
+
+def filter_definitions(definitions, expression):
+    """
+    Lazily yield the definitions matching filter ``expression``, in a single pass.
+
+    :param definitions: Iterable of definition dicts.
+    :type definitions: iterable
+
+    :param expression: Filter expression string, or a compiled predicate.
+    :type expression: str
+
+    :rtype: generator
+    """
+    predicate = compile_filter(expression) if isinstance(expression, str) else expression
+    return (d for d in definitions if predicate(d))
@@ -0,0 +1,142 @@
+import re
+import bisect
+
+from zmon_cli.client import entity_matches
+from zmon_cli.filters import json_key
+
+
+class EntityIndex:
+    """
+    In-memory inverted index over a list of entities, for repeated local filtering of one entity snapshot.
+
+    Posting lists are kept per (attribute, value) for top-level attributes with scalar values, including the scalar
+    elements of list values. Equality filters are answered by posting list intersection, using the same JSON
+    containment semantics as the ZMON backend (see :func:`zmon_cli.client.entity_matches`).
+
+    :param entities: List of entities.
+    :type entities: list
+
+    Example:
+
+    .. code-block:: python
+
+        index = EntityIndex(zmon.get_entities())
+        index.filter({'type': 'instance', 'application_id': 'my-app'})
+        index.filter({'type': 'instance'}, prefix={'id': 'my-app-'}, regex={'team': '^(zmon|stups)$'})
+    """
+
+    def __init__(self, entities):
+        self.entities = list(entities)
+
+        self._postings = {}
+
+        for pos, entity in enumerate(self.entities):
+            for attr, value in entity.items():
+                values = value if isinstance(value, list) else (value,)
+
+                for v in values:
+                    if isinstance(v, (dict, list)):
+                        continue
+
+                    postings = self._postings.setdefault(attr, {}).setdefault(json_key(v), [])
+                    # the same value can be repeated in a list attribute
+                    if not postings or postings[-1] != pos:
+                        postings.append(pos)
+
+        self._sorted_values = {}
+
+    def __len__(self):
+        return len(self.entities)
+
+    @property
+    def attributes(self) -> list:
+        """Indexed attribute names."""
+        return sorted(self._postings)
+
+    def values(self, attr) -> list:
+        """Distinct indexed values of ``attr``."""
+        return [v for _, v in self._postings.get(attr, {})]
+
+    def _string_values(self, attr):
+        if attr not in self._sorted_values:
+            self._sorted_values[attr] = sorted(v for v in self.values(attr) if isinstance(v, str))
+        return self._sorted_values[attr]
+
+    def _lookup(self, attr, value):
+        try:
+            return set(self._postings.get(attr, {}).get(json_key(value), ()))
+        except TypeError:
+            # unhashable value, cannot be answered by the index
+            return None
+
+    def _lookup_prefix(self, attr, prefix):
+        values = self._string_values(attr)
+        postings = self._postings.get(attr, {})
+
+        result = set()
+        for v in values[bisect.bisect_left(values, prefix):]:
+            if not v.startswith(prefix):
+                break
+            result.update(postings[json_key(v)])
+
+        return result
+
+    def _lookup_regex(self, attr, pattern):
+        regex = re.compile(pattern)
+        postings = self._postings.get(attr, {})
+
+        result = set()
+        for v in self._string_values(attr):
+            if regex.search(v):
+                result.update(postings[json_key(v)])
+
+        return result
+
+    def positions(self, query=None, prefix=None, regex=None) -> list:
+        """
+        Return snapshot positions of entities matching all given filters, see :meth:`filter`.
+
+        :rtype: list
+        """
+        candidates = []
+        unindexed = {}
+
+        for attr, value in (query or {}).items():
+            postings = self._lookup(attr, value)
+            if postings is None:
+                unindexed[attr] = value
+            else:
+                candidates.append(postings)
+
+        candidates.extend(self._lookup_prefix(attr, p) for attr, p in (prefix or {}).items())
+        candidates.extend(self._lookup_regex(attr, r) for attr, r in (regex or {}).items())
+
+        if candidates:
+            candidates.sort(key=len)
+            positions = sorted(candidates[0].intersection(*candidates[1:]))
+        else:
+            positions = list(range(len(self.entities)))
+
+        if unindexed:
+            positions = [pos for pos in positions if entity_matches(self.entities[pos], unindexed)]
+
+        return positions
+
+    def filter(self, query=None, prefix=None, regex=None) -> list:
+        """
+        Return entities matching all given filters, in snapshot order.
+
+        :param query: Equality filter, e.g. ``{'type': 'instance', 'application_id': 'my-app'}``.
+        :type query: dict
+
+        :param prefix: Attribute value prefixes, e.g. ``{'id': 'my-app-'}``. Only string values match.
+        :type prefix: dict
+
+        :param regex: Regular expressions searched in attribute values, e.g. ``{'team': '^zmon'}``. Only string
+                      values match.
+        :type regex: dict
+
+        :return: List of entities.
+        :rtype: list
+        """
+        return [self.entities[pos] for pos in self.positions(query, prefix=prefix, regex=regex)]
@@ -0,0 +1,77 @@
+import json
+
+from collections import namedtuple
+
+from zmon_cli.index import EntityIndex
+
+
+GLOBAL_ENTITY_TYPE = 'GLOBAL'
+
+CheckLoad = namedtuple('CheckLoad', 'id name owning_team interval entities invocations_per_sec')
+
+
+class CheckLoadEstimator:
+    """
+    Estimate the check invocations per second caused by check definitions on the ZMON workers.
+
+    A check is scheduled once per ``interval`` for every entity matching any of its ``entities`` filters. Filters on
+    the ``GLOBAL`` entity type match the single global entity even if it is missing from the entity list.
+
+    Matching uses an :class:`zmon_cli.index.EntityIndex`, and results are shared by checks with identical filters.
+
+    :param entities: List of entities, or an :class:`zmon_cli.index.EntityIndex`.
+    :type entities: list
+    """
+
+    def __init__(self, entities):
+        self.index = entities if isinstance(entities, EntityIndex) else EntityIndex(entities)
+        self._matches = {}
+
+    def _match(self, entity_filter):
+        key = json.dumps(entity_filter, sort_keys=True)
+        if key not in self._matches:
+            self._matches[key] = self.index.positions(entity_filter)
+        return self._matches[key]
+
+    def matching_entities(self, check) -> int:
+        """Return the number of entities ``check`` is executed for."""
+        filters = [f for f in check.get('entities') or [] if isinstance(f, dict)]
+
+        if len(filters) == 1:
+            count = len(self._match(filters[0]))
+        else:
+            count = len(set().union(*(self._match(f) for f in filters)))
+
+        if not count and any(f.get('type') == GLOBAL_ENTITY_TYPE for f in filters):
+            count = 1
+
+        return count
+
+    def estimate(self, check) -> CheckLoad:
+        """Return the estimated load of a single check definition."""
+        interval = check.get('interval') or 0
+        count = self.matching_entities(check)
+
+        return CheckLoad(check.get('id'), check.get('name'), check.get('owning_team'), interval, count,
+                         count / interval if interval > 0 else 0.0)
+
+
+def team_load(loads) -> list:
+    """
+    Aggregate check loads per owning team, highest load first.
+
+    :param loads: Iterable of :class:`CheckLoad`.
+    :type loads: iterable
+
+    :return: List of dicts with ``owning_team``, ``checks``, ``entities`` and ``invocations_per_sec``.
+    :rtype: list
+    """
+    teams = {}
+    for load in loads:
+        team = teams.setdefault(load.owning_team, {'owning_team': load.owning_team, 'checks': 0, 'entities': 0,
+                                                   'invocations_per_sec': 0.0})
+        team['checks'] += 1
+        team['entities'] += load.entities
+        team['invocations_per_sec'] += load.invocations_per_sec
+
+    return sorted(teams.values(), key=lambda t: -t['invocations_per_sec'])
@@ -1,10 +1,16 @@
+import sys
 import json
 import time
+import heapq
+import textwrap
+import functools
 
 import yaml
 import calendar
 
-from clickclick import print_table, OutputFormat, action, secho, error, ok, info
+from collections.abc import Iterator
+
+from clickclick import print_table, OutputFormat, action, secho, error, ok, info, warning
 
 
 # fields to dump as literal blocks
@@ -18,6 +24,8 @@ FIELD_SORT_INDEX = {k: chr(i) for i, k in enumerate(FIELD_ORDER)}
 
 LAST_MODIFIED_FMT = '%Y-%m-%d %H:%M:%S.%f'
 
+ENTITY_SORT_KEYS = ['last_modified', 'id', 'type']
+
 
 class literal_unicode(str):
     '''Empty class to serialize value as literal YAML block'''
@@ -56,6 +64,30 @@ def dump_yaml(data):
 yaml.add_representer(literal_unicode, literal_unicode_representer)
 
 
+@functools.lru_cache(maxsize=64 * 1024)
+def _timegm_seconds(value):
+    # "YYYY-MM-DD HH:MM:SS" prefix of LAST_MODIFIED_FMT, the fraction does not affect the epoch seconds
+    if len(value) != 19 or value[4] != '-' or value[7] != '-' or value[10] != ' ' or value[13] != ':' or \
+            value[16] != ':':
+        raise ValueError('Unexpected timestamp format: {}'.format(value))
+
+    return calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), int(value[14:16]), int(value[17:19])))
+
+
+def parse_last_modified(value: str) -> int:
+    """
+    Return UTC epoch seconds of an entity ``last_modified`` timestamp in ``LAST_MODIFIED_FMT``.
+
+    >>> parse_last_modified('2017-01-01 01:01:01.000')
+    1483232461
+    """
+    try:
+        return _timegm_seconds(value[:19])
+    except ValueError:
+        return calendar.timegm(time.strptime(value, LAST_MODIFIED_FMT))
+
+
 def log_http_exception(e, act=None):
     err = act.error if act else error
     try:
@@ -103,6 +135,16 @@ class Output:
         self.errors.append(msg)
 
     def echo(self, out):
+        if self.output == 'json' and isinstance(out, Iterator):
+            self._echo_json_stream(out)
+            return
+        elif self.output == 'ndjson':
+            self._echo_ndjson(out)
+            return
+
+        if isinstance(out, Iterator):
+            out = list(out)
+
         if self.output == 'yaml':
             print(dump_yaml(out))
         elif self.output == 'json':
@@ -112,33 +154,94 @@ class Output:
         else:
             print(out)
 
+    def _echo_json_stream(self, items):
+        # Same output as ``json.dumps(list(items))``, without holding all items in memory.
+        if self.indent:
+            sep, prefix, suffix = ',\n', '[\n', '\n]'
+        else:
+            sep, prefix, suffix = ', ', '[', ']'
 
-def render_entities(entities, output):
-    rows = []
-    for e in entities:
-        row = e
-        s = sorted(e.keys())
+        first = True
+        for item in items:
+            dumped = json.dumps(item, indent=self.indent)
+            if self.indent:
+                dumped = textwrap.indent(dumped, ' ' * self.indent)
 
-        key_values = []
+            sys.stdout.write((prefix if first else sep) + dumped)
+            first = False
 
-        for k in s:
-            if k not in ('id', 'type'):
-                if k == 'last_modified':
-                    row['last_modified_time'] = (
-                        calendar.timegm(time.strptime(row.pop('last_modified'), LAST_MODIFIED_FMT)))
-                else:
-                    key_values.append('{}={}'.format(k, e[k]))
+        sys.stdout.write('[]\n' if first else suffix + '\n')
 
-        row['data'] = ' '.join(key_values)
-        rows.append(row)
+    def _echo_ndjson(self, out):
+        items = out if isinstance(out, (list, tuple, Iterator)) else [out]
+
+        for item in items:
+            sys.stdout.write(json.dumps(item) + '\n')
+            # show each line as soon as it is available, also when piped
+            sys.stdout.flush()
+
+
+def _entity_sort_key(sort):
+    if sort == 'last_modified':
+        def key(e):
+            last_modified = e.get('last_modified')
+            return parse_last_modified(last_modified) if last_modified else 0, e['id'], e['type']
+    elif sort == 'id':
+        def key(e):
+            return e['id'], e['type']
+    else:
+        def key(e):
+            return e[sort], e['id']
+
+    return key
+
+
+def render_entities(entities, output, limit=None, sort='last_modified', reverse=False):
+    key = _entity_sort_key(sort)
 
-    rows.sort(key=lambda r: (r['last_modified_time'], r['id'], r['type']))
+    # top-N selection only orders the displayed entities
+    if limit is not None:
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        entities = select(limit, entities, key=key)
+    else:
+        entities = sorted(entities, key=key, reverse=reverse)
+
+    rows = []
+    for e in entities:
+        last_modified = e.get('last_modified')
+        rows.append({
+            'id': e['id'],
+            'type': e['type'],
+            'last_modified_time': parse_last_modified(last_modified) if last_modified else None,
+            'data': ' '.join('{}={}'.format(k, e[k]) for k in sorted(e) if k not in ('id', 'type', 'last_modified')),
+        })
 
     with OutputFormat(output):
         print_table('id type last_modified_time data'.split(),
                     rows, titles={'last_modified_time': 'Modified'})
 
 
+def render_bulk_summary(summary, noun='items'):
+    info('Processed {} {} in {:.2f}s ({:.1f}/s): {} succeeded, {} failed'.format(
+        summary.total, noun, summary.elapsed, summary.throughput, summary.succeeded, len(summary.failures)))
+
+    for name, e in summary.failures:
+        error(' {}: {}'.format(name, e))
+
+
+def render_sync_report(report, act=None, outcomes=('created', 'updated', 'deleted')):
+    for outcome in outcomes:
+        for name in getattr(report, outcome):
+            info('{} {}'.format(outcome.title(), name))
+
+    err = act.error if act else error
+    for name, e in report.failed:
+        err('{}: {}'.format(name, e))
+
+    info('Unchanged: {unchanged}, created: {created}, updated: {updated}, deleted: {deleted}, '
+         'failed: {failed}'.format(**report.counts))
+
+
 def render_status(status, output=None):
     secho('Alerts active: {}'.format(status.get('alerts_active')))
 
@@ -187,7 +290,36 @@ def render_checks(checks, output=None):
                 titles={'last_modified_time': 'Modified', 'last_modified_by': 'Modified by'}, styles=check_styles)
 
 
-def render_alerts(alerts, output=None):
+def render_check_load(load, output=None):
+    rows = [dict(row, invocations_per_sec=round(row['invocations_per_sec'], 3)) for row in load['checks']]
+
+    print_table(['id', 'name', 'owning_team', 'interval', 'entities', 'invocations_per_sec'], rows,
+                titles={'invocations_per_sec': 'Invocations/s'})
+
+    info('Teams:')
+    rows = [dict(row, invocations_per_sec=round(row['invocations_per_sec'], 3)) for row in load['teams']]
+
+    print_table(['owning_team', 'checks', 'entities', 'invocations_per_sec'], rows,
+                titles={'invocations_per_sec': 'Invocations/s'})
+
+    info('Total: {:.3f} check invocations/s'.format(load['total']))
+
+
+def render_what_if(report, output=None, limit=20):
+    info('{condition}: {firing} of {entities} entities firing'.format(**report))
+    info('{new_condition}: {new_firing} of {entities} entities firing'.format(**report))
+
+    for title, key in (('Started firing', 'started'), ('Stopped firing', 'resolved')):
+        entity_ids = report[key]
+        if entity_ids:
+            more = ' ... and {} more'.format(len(entity_ids) - limit) if len(entity_ids) > limit else ''
+            info('{} ({}): {}{}'.format(title, len(entity_ids), ', '.join(entity_ids[:limit]), more))
+
+    if report['errors']:
+        warning('Failed to evaluate conditions for {} entities'.format(report['errors']))
+
+
+def render_alerts(alerts, output=None, with_checks=False):
     rows = []
 
     for alert in alerts:
@@ -219,12 +351,24 @@ def render_alerts(alerts, output=None):
         'last_modified_time': 'Modified',
         'last_modified_by': 'Modified by',
         'check_definition_id': 'Check ID',
+        'check_name': 'Check',
+        'check_owning_team': 'Check team',
+        'check_interval': 'Interval',
     }
 
-    headers = [
-        'id', 'name', 'check_definition_id', 'responsible_team', 'team', 'priority', 'last_modified_time',
-        'last_modified_by', 'status', 'link',
-    ]
+    if with_checks:
+        for row in rows:
+            row['check_name'] = (row['check_name'] or '')[:60]
+
+        headers = [
+            'id', 'name', 'check_definition_id', 'check_name', 'check_owning_team', 'check_interval',
+            'responsible_team', 'priority', 'status', 'link',
+        ]
+    else:
+        headers = [
+            'id', 'name', 'check_definition_id', 'responsible_team', 'team', 'priority', 'last_modified_time',
+            'last_modified_by', 'status', 'link',
+        ]
 
     print_table(headers, rows, titles=titles, styles=check_styles)
 
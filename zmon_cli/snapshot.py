@@ -0,0 +1,337 @@
+import sys
+import json
+import mmap
+import array
+import bisect
+import struct
+
+from zmon_cli.cache import write_atomic
+from zmon_cli.client import entity_matches
+
+
+SNAPSHOT_MAGIC = b'ZMONSNP1'
+
+# magic, entity count, string count, column count, string index, string data, column directory, record index,
+# record data offsets
+_HEADER = struct.Struct('<8sIIIxxxxQQQQQ')
+_COLUMN_ENTRY = struct.Struct('<IxxxxQ')
+
+# column arrays hold string ids shifted by one, 0 marks a missing attribute
+MISSING = 0
+
+
+def _encode_value(value) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _equal_encodings(value) -> set:
+    # canonical JSON of all values equal to ``value``, numbers are equal to integral floats as in entity_matches()
+    encodings = {_encode_value(value)}
+
+    if type(value) is int:
+        try:
+            if float(value) == value:
+                encodings.add(_encode_value(float(value)))
+        except OverflowError:
+            pass
+    elif type(value) is float and value.is_integer():
+        encodings.add(_encode_value(int(value)))
+
+    return encodings
+
+
+def _pad(buf):
+    buf.extend(b'\0' * (-len(buf) % 8))
+
+
+def _little_endian(arr):
+    if sys.byteorder != 'little':
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def write_snapshot(entities, path):
+    """
+    Write ``entities`` to ``path`` in the columnar snapshot format read by :class:`EntitySnapshot`.
+
+    The file holds a sorted table of interned strings (attribute names and canonical JSON of attribute values), one
+    array of string ids per top-level attribute, and the JSON of every entity addressed by an offset index.
+
+    :param entities: Iterable of entities.
+    :type entities: iterable
+
+    :param path: Snapshot file path.
+    :type path: str
+
+    :return: Number of written entities.
+    :rtype: int
+    """
+    records = []
+    rows = []
+    strings = set()
+
+    for entity in entities:
+        records.append(json.dumps(entity, separators=(',', ':')).encode('utf-8'))
+
+        row = {}
+        for attr, value in entity.items():
+            encoded = _encode_value(value)
+            row[attr] = encoded
+            strings.add(attr.encode('utf-8'))
+            strings.add(encoded)
+        rows.append(row)
+
+    table = sorted(strings)
+    string_ids = {s: i for i, s in enumerate(table)}
+
+    attributes = sorted({attr for row in rows for attr in row})
+
+    buf = bytearray(_HEADER.size)
+
+    string_index = len(buf)
+    offsets = array.array('Q', [0])
+    for s in table:
+        offsets.append(offsets[-1] + len(s))
+    buf.extend(_little_endian(offsets))
+
+    string_data = len(buf)
+    buf.extend(b''.join(table))
+    _pad(buf)
+
+    columns = []
+    for attr in attributes:
+        columns.append((string_ids[attr.encode('utf-8')], len(buf)))
+        column = array.array('I', (string_ids[row[attr]] + 1 if attr in row else MISSING for row in rows))
+        buf.extend(_little_endian(column))
+        _pad(buf)
+
+    column_dir = len(buf)
+    for name_id, offset in columns:
+        buf.extend(_COLUMN_ENTRY.pack(name_id, offset))
+
+    record_index = len(buf)
+    offsets = array.array('Q', [0])
+    for r in records:
+        offsets.append(offsets[-1] + len(r))
+    buf.extend(_little_endian(offsets))
+
+    record_data = len(buf)
+    buf.extend(b''.join(records))
+
+    _HEADER.pack_into(buf, 0, SNAPSHOT_MAGIC, len(records), len(table), len(columns), string_index, string_data,
+                      column_dir, record_index, record_data)
+
+    write_atomic(path, bytes(buf))
+
+    return len(records)
+
+
+class EntitySnapshot:
+    """
+    Memory-mapped reader of an entity snapshot written by :func:`write_snapshot`.
+
+    Attribute lookups and filters only touch the string table and the columns of the queried attributes, entities
+    are deserialized only when returned.
+
+    :param path: Snapshot file path.
+    :type path: str
+
+    Example:
+
+    .. code-block:: python
+
+        with EntitySnapshot('entities.snapshot') as snapshot:
+            snapshot.values('team')
+            snapshot.filter({'type': 'instance', 'team': 'zmon'})
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._view = memoryview(self._mmap)
+        # views into the mapping handed out by _array(), released before the mapping is closed
+        self._arrays = []
+        self._column_arrays = {}
+
+        try:
+            (magic, self._count, self._string_count, column_count, string_index, self._string_data, column_dir,
+             record_index, self._record_data) = _HEADER.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic = None
+
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError('Not an entity snapshot: {}'.format(path))
+
+        self._string_offsets = self._array('Q', string_index, self._string_count + 1)
+        self._record_offsets = self._array('Q', record_index, self._count + 1)
+
+        self._columns = {}
+        for i in range(column_count):
+            name_id, offset = _COLUMN_ENTRY.unpack_from(self._mmap, column_dir + i * _COLUMN_ENTRY.size)
+            self._columns[self._string(name_id).decode('utf-8')] = offset
+
+    def _array(self, typecode, offset, count):
+        size = array.array(typecode).itemsize * count
+        if sys.byteorder == 'little':
+            view = self._view[offset:offset + size].cast(typecode)
+            self._arrays.append(view)
+            return view
+
+        arr = array.array(typecode, self._view[offset:offset + size])
+        arr.byteswap()
+        return arr
+
+    def close(self):
+        """
+        Unmap the snapshot. Columns returned before are released, and raise ``ValueError`` on access.
+
+        :raises: BufferError if other views of the mapping are still in use.
+        """
+        self._string_offsets = self._record_offsets = None
+        self._column_arrays = {}
+
+        for view in self._arrays:
+            view.release()
+        self._arrays = []
+
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.close()
+        except BufferError:
+            # never hide the exception raised in the block
+            if exc_type is None:
+                raise
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self.entity(pos) for pos in range(self._count))
+
+    def _string(self, string_id) -> bytes:
+        start = self._string_data + self._string_offsets[string_id]
+        end = self._string_data + self._string_offsets[string_id + 1]
+        return self._mmap[start:end]
+
+    def _find_string(self, s: bytes):
+        i = bisect.bisect_left(_StringTable(self), s)
+        return i if i < self._string_count and self._string(i) == s else None
+
+    def _column(self, attr):
+        offset = self._columns.get(attr)
+        if offset is None:
+            return None
+
+        if attr not in self._column_arrays:
+            self._column_arrays[attr] = self._array('I', offset, self._count)
+        return self._column_arrays[attr]
+
+    def _container_ids(self):
+        # canonical JSON of lists and dicts starts with "[" or "{", a contiguous range each in the sorted table
+        table = _StringTable(self)
+        ids = set()
+        for first, last in ((b'[', b'\\'), (b'{', b'|')):
+            ids.update(range(bisect.bisect_left(table, first) + 1, bisect.bisect_left(table, last) + 1))
+        return ids
+
+    @property
+    def attributes(self) -> list:
+        """Top-level attribute names present in the snapshot."""
+        return sorted(self._columns)
+
+    def entity(self, pos) -> dict:
+        """Deserialize the entity at position ``pos``."""
+        if not 0 <= pos < self._count:
+            raise IndexError('Entity position out of range: {}'.format(pos))
+
+        start = self._record_data + self._record_offsets[pos]
+        end = self._record_data + self._record_offsets[pos + 1]
+        return json.loads(self._mmap[start:end].decode('utf-8'))
+
+    def get(self, pos, attr, default=None):
+        """Return attribute ``attr`` of the entity at position ``pos`` without deserializing the entity."""
+        column = self._column(attr)
+        if column is None:
+            return default
+
+        value_id = column[pos]
+        return default if value_id == MISSING else json.loads(self._string(value_id - 1).decode('utf-8'))
+
+    def values(self, attr) -> list:
+        """Distinct values of attribute ``attr``."""
+        column = self._column(attr)
+        if column is None:
+            return []
+
+        return [json.loads(self._string(i - 1).decode('utf-8')) for i in sorted(set(column) - {MISSING})]
+
+    def positions(self, query=None) -> list:
+        """
+        Return positions of entities matching ``query``, using the same JSON containment semantics as the ZMON
+        backend (see :func:`zmon_cli.client.entity_matches`).
+
+        :param query: Equality filter, e.g. ``{'type': 'instance', 'team': 'zmon'}``.
+        :type query: dict
+
+        :rtype: list
+        """
+        candidates = range(self._count)
+        containers = None
+        unverified = set()
+
+        for attr, value in (query or {}).items():
+            column = self._column(attr)
+            if column is None:
+                return []
+
+            if containers is None:
+                containers = self._container_ids()
+
+            exact = set()
+            for encoded in _equal_encodings(value):
+                value_id = self._find_string(encoded)
+                if value_id is not None:
+                    exact.add(value_id + 1)
+
+            wanted = containers | exact
+
+            matched = []
+            for pos in candidates:
+                v = column[pos]
+                if v in wanted:
+                    matched.append(pos)
+                    if v not in exact:
+                        # list or dict attribute value, containment is checked on the entity
+                        unverified.add(pos)
+            candidates = matched
+
+        if not unverified:
+            return list(candidates)
+
+        return [pos for pos in candidates if pos not in unverified or entity_matches(self.entity(pos), query)]
+
+    def filter(self, query=None) -> list:
+        """Return entities matching ``query``, see :meth:`positions`."""
+        return [self.entity(pos) for pos in self.positions(query)]
+
+
+class _StringTable:
+    """Sequence view of the snapshot string table for :mod:`bisect`."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return self._snapshot._string_count
+
+    def __getitem__(self, i):
+        return self._snapshot._string(i)